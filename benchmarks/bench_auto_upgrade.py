@@ -0,0 +1,153 @@
+"""
+Scheduled auto upgrade against a local fake catalogue server: a set of installed plugins gets new releases, and the
+auto upgrader is ticked at fixed times with players joining and leaving
+
+Checks that nothing is changed outside the maintenance window, while players are online, before the server has been
+idle long enough or for denied plugins, that a player joining during the download cancels the upgrade without touching
+the plugin directory, and that the retry in the same window upgrades everything with a single reload.
+Reports the download and reload durations of the upgrade. Exits with 1 if any check fails
+
+Usage (from the repository root):
+    python -m benchmarks.bench_auto_upgrade --plugins 20 --latency 0.05 --output result.json
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, List
+
+from benchmarks import stub, catalogue
+from benchmarks.fake_server import FakeCatalogueServer, FaultConfig
+from benchmarks.harness import environment, dump
+
+server = stub.install()
+
+from mcdreforged_plugin_manager.config import config  # noqa: E402
+from mcdreforged_plugin_manager.storage.cache import cache  # noqa: E402
+from mcdreforged_plugin_manager.task.auto_upgrade import AutoUpgrader  # noqa: E402
+from mcdreforged_plugin_manager.task.install_task import PluginInstaller  # noqa: E402
+
+IN_WINDOW = datetime(2024, 1, 2, 4, 0)
+OUTSIDE_WINDOW = datetime(2024, 1, 2, 15, 0)
+
+
+class ReplyCollector:
+    def __init__(self):
+        self.replies: List[str] = []
+
+    def reply(self, text):
+        self.replies.append(text.to_plain_text() if hasattr(text, 'to_plain_text') else str(text))
+
+
+def refresh_catalogue():
+    if not cache.refresh():
+        raise RuntimeError('Failed to load the catalogue from the fake server')
+
+
+def snapshot() -> Dict[str, int]:
+    return {file_name: os.stat(os.path.join(server.plugin_directory, file_name)).st_mtime_ns
+            for file_name in os.listdir(server.plugin_directory)}
+
+
+def make_idle(upgrader: AutoUpgrader, minutes: float):
+    upgrader.players.players.clear()
+    upgrader.players.idle_since = time.time() - minutes * 60
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalogue-size', type=int, default=200)
+    parser.add_argument('--plugins', type=int, default=20, help='amount of installed plugins to be upgraded')
+    parser.add_argument('--latency', type=float, default=0.05, help='delay before each response (unit: second)')
+    parser.add_argument('--max-asset-size', type=int, default=256 * 1024,
+                        help='upper bound of asset sizes (unit: byte)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    base = catalogue.generate(args.catalogue_size, args.seed, requirements=False)
+    standalone = [plugin_id for plugin_id, plugin in base['plugins'].items()
+                  if all(dep == 'mcdreforged' for dep in plugin['meta']['dependencies'])]
+    plugin_ids = standalone[:args.plugins]
+    bumped = catalogue.bump(base, seed=args.seed)
+    denied = plugin_ids[0]
+
+    server.plugin_directory = config.install_path = tempfile.mkdtemp(prefix='mpm_bench_plugins_')
+    config.auto_upgrade.enabled = True
+    config.auto_upgrade.windows = ['03:00-06:00']
+    config.auto_upgrade.idle_minutes = 10
+    config.auto_upgrade.deny = [denied]
+    checks: Dict[str, bool] = {}
+    results: Dict[str, Any] = {}
+    with FakeCatalogueServer(base, FaultConfig(), args.max_asset_size) as fake:
+        config.source = fake.source
+        refresh_catalogue()
+        installer = PluginInstaller(list(plugin_ids), ReplyCollector())
+        installer.init()
+        installer.run.original(installer)
+        server.refresh_changed_plugins()
+        fake.set_catalogue(bumped)
+        refresh_catalogue()
+        fake.faults = FaultConfig(latency=args.latency)
+
+        server.server_running = True
+        server.online_players = 2
+        upgrader = AutoUpgrader()
+        upgrader.players.reset()
+        checks['unknown_players_not_idle'] = not upgrader.players.known and upgrader.tick(IN_WINDOW) is None
+        server.online_players = 0
+        upgrader.players.reset()
+        checks['rcon_reports_empty'] = upgrader.players.known
+
+        before = snapshot()
+        make_idle(upgrader, 60)
+        checks['outside_window'] = upgrader.tick(OUTSIDE_WINDOW) is None
+        upgrader.players.on_joined('Steve')
+        checks['player_online'] = upgrader.tick(IN_WINDOW) is None
+        upgrader.players.on_left('Steve')
+        checks['not_idle_long_enough'] = upgrader.tick(IN_WINDOW) is None
+        checks['nothing_changed'] = snapshot() == before
+
+        make_idle(upgrader, 60)
+        joiner = threading.Timer(args.latency / 2, upgrader.players.on_joined, args=('Alex',))
+        joiner.start()
+        cancelled = upgrader.tick(IN_WINDOW)
+        joiner.join()
+        checks['cancelled_by_join'] = cancelled is not None and not cancelled.success and snapshot() == before
+
+        upgrader.players.on_left('Alex')
+        make_idle(upgrader, 60)
+        upgrade_start = time.perf_counter()
+        result = upgrader.tick(IN_WINDOW)
+        duration = time.perf_counter() - upgrade_start
+        checks['upgraded'] = result is not None and result.success and all(
+            server.installed[plugin_id] == bumped['plugins'][plugin_id]['meta']['version']
+            for plugin_id in plugin_ids if plugin_id != denied
+        )
+        checks['deny_list'] = server.installed[denied] == base['plugins'][denied]['meta']['version']
+        checks['no_temp_files'] = not any(name.endswith('.temp') for name in os.listdir(server.plugin_directory))
+        checks['once_per_window'] = upgrader.tick(IN_WINDOW) is None
+        if result is not None:
+            results = {
+                'plugins': len(result.plugins),
+                'download_duration': result.download_duration,
+                'reload_duration': result.reload_duration,
+                'total_duration': duration,
+            }
+            print('upgraded {} plugins: download {:.3f}s, reload {:.3f}s, total {:.3f}s'.format(
+                len(result.plugins), result.download_duration, result.reload_duration, duration
+            ))
+    shutil.rmtree(server.plugin_directory, ignore_errors=True)
+
+    print('checks: {}'.format(', '.join('{}={}'.format(key, value) for key, value in checks.items())))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results, 'checks': checks}, args.output)
+    if not all(checks.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark catalogue loading, searching, listing, rendering and dependency planning on synthetic catalogues
+
+Usage (from the repository root):
+    python -m benchmarks.bench_catalogue --sizes 100 1000 10000 --output result.json
+    python -m benchmarks.bench_catalogue --compare baseline.json
+"""
+import argparse
+import json
+import os
+import random
+
+from benchmarks import stub, catalogue
+from benchmarks.harness import measure, environment, dump, print_table, compare
+
+server = stub.install()
+
+from mcdreforged_plugin_manager.constants import SORT_ORDERS  # noqa: E402
+from mcdreforged_plugin_manager.dependency_checker import DependencyOperation  # noqa: E402
+from mcdreforged_plugin_manager.storage.cache import cache  # noqa: E402
+from mcdreforged_plugin_manager.task.install_task import get_operations  # noqa: E402
+
+LABEL_QUERIES = [None, 'tool', ['information', 'api'], ['management']]
+
+
+def load():
+    cache._Cache__load()
+    if not cache.loaded:
+        raise RuntimeError('Failed to load the synthetic catalogue')
+
+
+def run(size: int, seed: int, scale: float):
+    data = catalogue.generate(size, seed)
+    with open(cache.CACHE_PATH, 'w', encoding='utf8') as f:
+        json.dump(data, f)
+    server.installed = catalogue.pick_installed(data, seed=seed)
+    load()
+
+    rnd = random.Random(seed)
+    plugin_ids = cache.get_plugin_ids()
+    sample_ids = [rnd.choice(plugin_ids) for _ in range(100)]
+    # truncated words of plugin ids, used as search keywords and misspelled ids
+    queries = [plugin_id.split('_')[rnd.randint(0, 1)][:rnd.randint(2, 5)] for plugin_id in sample_ids]
+
+    def iterations(amount: int) -> int:
+        return max(3, int(amount * scale))
+
+    return {
+        'load': measure(lambda i: load(), iterations(max(3, 5000 // size))),
+        'search': measure(lambda i: list(cache.search(queries[i % len(queries)])), iterations(max(10, 100000 // size))),
+        'list': measure(lambda i: list(cache.get_plugins_by_labels(LABEL_QUERIES[i % len(LABEL_QUERIES)])),
+                        iterations(max(10, 100000 // size))),
+        'list_sorted': measure(lambda i: list(cache.get_plugins_by_labels(None, SORT_ORDERS[i % len(SORT_ORDERS)])),
+                               iterations(max(10, 100000 // size))),
+        'brief': measure(lambda i: cache.get_plugin_by_id(sample_ids[i % len(sample_ids)]).meta.brief,
+                         iterations(1000)),
+        'detail': measure(lambda i: cache.get_plugin_by_id(sample_ids[i % len(sample_ids)]).meta.detail,
+                          iterations(300)),
+        'fuzzy': measure(lambda i: cache.suggestions.fuzzy.search(queries[i % len(queries)] + 'x'),
+                         iterations(1000)),
+        'plan': measure(lambda i: get_operations(sample_ids[i % len(sample_ids)], DependencyOperation.INSTALL),
+                        iterations(300)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='catalogue sizes')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic catalogues')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier of the iteration amounts')
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    parser.add_argument('--compare', help='a previous json result to compare with')
+    args = parser.parse_args()
+
+    results = {str(size): run(size, args.seed, args.scale) for size in args.sizes}
+    result = {'environment': environment(), 'seed': args.seed, 'results': results}
+    print_table(results)
+    if args.compare is not None and os.path.isfile(args.compare):
+        with open(args.compare, 'r', encoding='utf8') as f:
+            compare(json.load(f), result)
+    dump(result, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Stress test of catalogue reads during refreshes: reader threads list, search and look up plugins while a writer
+thread keeps publishing alternating catalogue generations
+
+Every read must see exactly one complete generation, without exceptions. The in-place refill used before the
+generation swap is run as well for comparison. Exits with 1 if any read of the generation swap is inconsistent
+
+Usage (from the repository root):
+    python -m benchmarks.bench_concurrency --size 1000 --readers 4 --duration 5 --output result.json
+"""
+import argparse
+import sys
+import threading
+import time
+from typing import Dict, List, Any, Iterable, Optional
+
+from benchmarks import stub, catalogue
+from benchmarks.harness import percentile, environment, dump
+
+stub.install()
+
+from mcdreforged_plugin_manager.storage.plugin import Plugin, PluginStorage, PluginGeneration  # noqa: E402
+
+
+class LegacyStorage:
+    """
+    The previous storage, which cleared and refilled a single dict in place on each refresh
+    """
+    def __init__(self):
+        self.plugins: Dict[str, Plugin] = {}
+
+    def publish(self, plugins: Dict[str, Plugin]):
+        self.plugins.clear()
+        for plugin_id, plugin in plugins.items():
+            self.plugins[plugin_id] = plugin
+
+    def get_plugins_by_labels(self, labels: Optional[List[str]] = None) -> Iterable[Plugin]:
+        labels = labels if labels is not None else catalogue.LABELS
+        for plugin in self.plugins.values():
+            if any([label in labels for label in plugin.meta.labels]):
+                yield plugin
+
+    def search(self, query: str) -> Iterable[Plugin]:
+        for plugin in self.plugins.values():
+            if query in plugin.meta.name or query in plugin.meta.id or query in plugin.meta.description:
+                yield plugin
+
+    def get_plugin_ids(self) -> List[str]:
+        return list(self.plugins.keys())
+
+
+class GenerationStorage(PluginStorage):
+    def publish(self, plugins: Dict[str, Plugin]):
+        self.generation = PluginGeneration(plugins)
+
+
+def create_generations(size: int, seed: int) -> List[Dict[str, Plugin]]:
+    """
+    Two catalogues of different sizes, so a partial or mixed read can be told from a complete one
+    """
+    data = catalogue.generate(size, seed)
+    first = {plugin_id: Plugin.create(plugin) for plugin_id, plugin in data['plugins'].items()}
+    second = dict(list(first.items())[:size * 3 // 4])
+    return [first, second]
+
+
+def run(storage, generations: List[Dict[str, Plugin]], readers: int, duration: float) -> Dict[str, Any]:
+    id_amounts = {len(plugins) for plugins in generations}
+    tool_amounts = {sum(1 for plugin in plugins.values() if 'tool' in plugin.meta.labels) for plugins in generations}
+    storage.publish(generations[0])
+    stop = threading.Event()
+    publishes = 0
+    results: List[Dict[str, Any]] = []
+
+    def writer():
+        nonlocal publishes
+        while not stop.is_set():
+            storage.publish(generations[publishes % 2])
+            publishes += 1
+            time.sleep(0)
+
+    def reader():
+        result = {'reads': 0, 'inconsistent': 0, 'errors': 0, 'latencies': []}
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                amounts = [
+                    (len(storage.get_plugin_ids()), id_amounts),
+                    (len(list(storage.search(''))), id_amounts),
+                    (len(list(storage.get_plugins_by_labels(['tool']))), tool_amounts),
+                ]
+            except RuntimeError:  # dictionary changed size during iteration
+                result['errors'] += 1
+            else:
+                result['inconsistent'] += sum(1 for amount, expected in amounts if amount not in expected)
+            result['latencies'].append(time.perf_counter() - start)
+            result['reads'] += 1
+        results.append(result)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies = [latency for result in results for latency in result['latencies']]
+    return {
+        'publishes': publishes,
+        'reads': sum(result['reads'] for result in results),
+        'inconsistent': sum(result['inconsistent'] for result in results),
+        'errors': sum(result['errors'] for result in results),
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies, default=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000, help='amount of plugins in the catalogue')
+    parser.add_argument('--readers', type=int, default=4, help='amount of reader threads')
+    parser.add_argument('--duration', type=float, default=5, help='duration of each run (unit: second)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    sys.setswitchinterval(0.0001)  # switch threads often, so races show up in a short run
+    generations = create_generations(args.size, args.seed)
+    results = {
+        'legacy': run(LegacyStorage(), generations, args.readers, args.duration),
+        'generation': run(GenerationStorage(), generations, args.readers, args.duration),
+    }
+    for name, result in results.items():
+        print('{:<10} {} publishes, {} reads, {} inconsistent, {} errors, p99 {:.3f}ms, max {:.3f}ms'.format(
+            name, result['publishes'], result['reads'], result['inconsistent'], result['errors'],
+            result['p99'] * 1000, result['max'] * 1000
+        ))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results}, args.output)
+    if results['generation']['inconsistent'] > 0 or results['generation']['errors'] > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
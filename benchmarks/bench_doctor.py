@@ -0,0 +1,90 @@
+"""
+Duration of !!mpm doctor on a large plugin directory: the first check hashes every plugin file, later checks only
+hash the files changed since the previous check
+
+The directory is seeded with known problems: installed files changed afterwards, files replaced without a reload,
+leftover temp files and plugins present in two files. Exits with 1 if any of them is not reported
+
+Usage (from the repository root):
+    python -m benchmarks.bench_doctor --plugins 2000 --size 256 --changes 20 --output result.json
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from benchmarks import stub
+from benchmarks.fake_server import pack_plugin
+from benchmarks.harness import environment, dump
+
+server = stub.install()
+
+from mcdreforged_plugin_manager.config import config  # noqa: E402
+from mcdreforged_plugin_manager.storage.file_index import file_index  # noqa: E402
+
+
+def write_plugin(path: str, plugin_id: str, version: str, size: int):
+    with open(path, 'wb') as f:
+        f.write(pack_plugin({'id': plugin_id, 'version': version}, size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--plugins', type=int, default=2000, help='amount of plugin files')
+    parser.add_argument('--size', type=int, default=256, help='size of each plugin file (unit: KiB)')
+    parser.add_argument('--changes', type=int, default=20, help='amount of files changed between checks')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    folder = config.install_path = os.path.join(server.get_data_folder(), 'plugins')
+    os.makedirs(folder)
+    plugin_ids = ['bench_plugin_{}'.format(i) for i in range(args.plugins)]
+    for plugin_id in plugin_ids:
+        path = os.path.join(folder, plugin_id + '.mcdr')
+        write_plugin(path, plugin_id, '1.0.0', args.size * 1024)
+        server.installed[plugin_id] = '1.0.0'
+        server.plugin_files[plugin_id] = path
+    for plugin_id in plugin_ids[:args.plugins // 2]:
+        file_index.record_install(plugin_id, server.plugin_files[plugin_id], '1.0.0')
+
+    # seeded problems
+    modified, not_reloaded, duplicated = rnd.sample(plugin_ids[:args.plugins // 2], 3)
+    with open(server.plugin_files[modified], 'ab') as f:
+        f.write(b'\0')
+    write_plugin(server.plugin_files[not_reloaded], not_reloaded, '1.1.0', args.size * 1024)
+    write_plugin(os.path.join(folder, duplicated + '-old.mcdr'), duplicated, '0.9.0', args.size * 1024)
+    with open(os.path.join(folder, 'interrupted.mcdr.temp'), 'wb') as f:
+        f.write(os.urandom(1024))
+
+    results = {}
+    for name in ('cold', 'warm', 'changed'):
+        if name == 'changed':
+            for plugin_id in rnd.sample(plugin_ids[args.plugins // 2:], args.changes):
+                path = server.plugin_files[plugin_id]
+                write_plugin(path, plugin_id, '1.0.0', args.size * 1024)
+                os.utime(path, ns=(time.time_ns(), time.time_ns() + 1000))
+        report = file_index.diagnose()
+        results[name] = {'files': report.files, 'hashed': report.hashed, 'duration': report.duration}
+        print('{:<8} {} files, {} hashed, {:.3f}s'.format(name, report.files, report.hashed, report.duration))
+
+    drift = {(plugin_id, reason) for plugin_id, reason, _ in report.drift}
+    found = {
+        'modified': (modified, 'modified') in drift,
+        'not_reloaded': (not_reloaded, 'not_reloaded') in drift,
+        'duplicated': duplicated in report.duplicates,
+        'temp_file': len(report.temp_files) == 1,
+        # the file replaced without a reload is also changed since installed, so it's reported twice
+        'no_false_positive': {plugin_id for plugin_id, _, _ in report.drift} == {modified, not_reloaded}
+        and len(report.duplicates) == 1,
+    }
+    print('problems found: {}'.format(', '.join('{}={}'.format(key, value) for key, value in found.items())))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results, 'found': found}, args.output)
+    if not all(found.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
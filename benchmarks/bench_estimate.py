@@ -0,0 +1,117 @@
+"""
+Accuracy of the download estimate in the install confirm screen against a local fake catalogue server with a
+per-connection bandwidth and latency
+
+For each set size, plans an install, takes the estimated size and download time, then downloads the assets and
+compares. Also checks that assets in the shared cache directory are reported as cached and cost nothing
+
+Usage (from the repository root):
+    python -m benchmarks.bench_estimate --set-sizes 1 5 20 --bandwidth 1048576 --latency 0.05 --output result.json
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, Any, List
+
+from benchmarks import stub, catalogue
+from benchmarks.fake_server import FakeCatalogueServer, FaultConfig
+from benchmarks.harness import environment, dump
+
+server = stub.install()
+
+from mcdreforged_plugin_manager.config import config  # noqa: E402
+from mcdreforged_plugin_manager.storage.cache import cache  # noqa: E402
+from mcdreforged_plugin_manager.task.install_task import PluginInstaller  # noqa: E402
+
+
+class ReplyCollector:
+    def __init__(self):
+        self.replies: List[str] = []
+
+    def reply(self, text):
+        self.replies.append(text.to_plain_text() if hasattr(text, 'to_plain_text') else str(text))
+
+
+def plan(plugin_ids: List[str]) -> PluginInstaller:
+    installer = PluginInstaller(list(plugin_ids), ReplyCollector())
+    if not installer.plan():
+        raise RuntimeError('Nothing to install')
+    return installer
+
+
+def download(fake: FakeCatalogueServer, installer: PluginInstaller) -> Dict[str, Any]:
+    sent_before = fake.bytes_sent
+    start = time.perf_counter()
+    if not installer.download_plugins():
+        raise RuntimeError('Failed to download the assets')
+    duration = time.perf_counter() - start
+    installer.discard_downloads()
+    return {'duration': duration, 'bytes': fake.bytes_sent - sent_before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalogue-size', type=int, default=200)
+    parser.add_argument('--set-sizes', type=int, nargs='+', default=[1, 5, 20], help='amounts of plugins to install')
+    parser.add_argument('--latency', type=float, default=0.05, help='delay before each response (unit: second)')
+    parser.add_argument('--bandwidth', type=int, default=1024 * 1024,
+                        help='transfer speed of each response (unit: byte/s)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    base = catalogue.generate(args.catalogue_size, args.seed, requirements=False)
+    standalone = [plugin_id for plugin_id, plugin in base['plugins'].items()
+                  if all(dep == 'mcdreforged' for dep in plugin['meta']['dependencies'])]
+    random.Random(args.seed).shuffle(standalone)
+    max_size = max(plugin['release']['releases'][0]['asset']['size'] for plugin in base['plugins'].values())
+
+    server.plugin_directory = config.install_path = tempfile.mkdtemp(prefix='mpm_bench_plugins_')
+    shared_cache = tempfile.mkdtemp(prefix='mpm_bench_shared_')
+    checks: Dict[str, bool] = {}
+    results: Dict[str, Any] = {}
+    with FakeCatalogueServer(base, FaultConfig(), max_size) as fake:
+        config.source = fake.source
+        if not cache.refresh():
+            raise RuntimeError('Failed to load the catalogue from the fake server')
+        fake.faults = FaultConfig(latency=args.latency, bandwidth=args.bandwidth)
+
+        # loading the catalogue isn't measured, nothing is known before the first asset download
+        checks['unknown_before_download'] = plan(standalone[:1]).estimate_download().duration is None
+        download(fake, plan(standalone[:1]))
+        offset = 1
+        for set_size in args.set_sizes:
+            plugin_ids = standalone[offset:offset + set_size]
+            offset += set_size
+            installer = plan(plugin_ids)
+            estimate = installer.estimate_download()
+            actual = download(fake, installer)
+            results[str(set_size)] = {
+                'estimated_bytes': estimate.total,
+                'actual_bytes': actual['bytes'],
+                'estimated_duration': estimate.duration,
+                'actual_duration': actual['duration'],
+                'ratio': estimate.duration / actual['duration'],
+            }
+            print('{:>3} plugins: {:.0f} KiB estimated, {:.0f} KiB sent, {:.2f}s estimated, {:.2f}s actual'.format(
+                set_size, estimate.total / 1024, actual['bytes'] / 1024, estimate.duration, actual['duration']
+            ))
+
+        config.shared_cache = shared_cache
+        plugin_ids = standalone[offset:offset + 5]
+        download(fake, plan(plugin_ids))
+        estimate = plan(plugin_ids).estimate_download()
+        checks['shared_cache_cached'] = estimate.cached == estimate.total > 0 and estimate.duration == 0
+        config.shared_cache = None
+    shutil.rmtree(server.plugin_directory, ignore_errors=True)
+    shutil.rmtree(shared_cache, ignore_errors=True)
+
+    checks['sizes_match'] = all(result['estimated_bytes'] <= result['actual_bytes'] for result in results.values())
+    print('checks: {}'.format(', '.join('{}={}'.format(key, value) for key, value in checks.items())))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results, 'checks': checks}, args.output)
+
+
+if __name__ == '__main__':
+    main()
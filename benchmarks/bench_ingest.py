@@ -0,0 +1,97 @@
+"""
+Peak memory and duration of converting the catalogue file into plugins: decoding the whole document with json.load
+first, as before, against streaming the plugin entries one by one
+
+Peak memory is the tracemalloc peak above the memory before the ingestion, measured in a separate run
+
+Usage (from the repository root):
+    python -m benchmarks.bench_ingest --sizes 1000 5000 10000 --output result.json
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, Callable, Any
+
+from benchmarks import stub, catalogue
+from benchmarks.harness import environment, dump
+
+stub.install()
+
+from mcdreforged_plugin_manager.storage.plugin import Plugin  # noqa: E402
+from mcdreforged_plugin_manager.util.file_util import open_text, gzip_file  # noqa: E402
+from mcdreforged_plugin_manager.util.json_util import iter_object_items  # noqa: E402
+
+
+def legacy_ingest(path: str) -> Dict[str, Plugin]:
+    plugins = {}
+    with open_text(path) as f:
+        data = json.load(f)
+    for plugin in data['plugins'].values():
+        plugin = Plugin.create(plugin)
+        plugins[plugin.meta.id] = plugin
+    return plugins
+
+
+def streaming_ingest(path: str) -> Dict[str, Plugin]:
+    plugins = {}
+    with open_text(path) as f:
+        for _, plugin in iter_object_items(f, 'plugins'):
+            plugin = Plugin.create(plugin)
+            plugins[plugin.meta.id] = plugin
+    return plugins
+
+
+def measure_ingest(func: Callable[[str], Dict[str, Plugin]], path: str) -> Dict[str, Any]:
+    gc.collect()
+    start = time.perf_counter()
+    amount = len(func(path))
+    duration = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        plugins = func(path)
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del plugins
+    return {'plugins': amount, 'duration': duration, 'peak': peak - before, 'retained': retained - before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000], help='catalogue sizes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix='mpm_bench_ingest_')
+    results = {}
+    print('{:>6} {:<10} {:>10} {:>12} {:>14} {:>14}'.format(
+        'size', 'method', 'file (KB)', 'duration (s)', 'peak (MiB)', 'retained (MiB)'
+    ))
+    for size in args.sizes:
+        path = os.path.join(folder, 'everything.json')
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(catalogue.generate(size, args.seed), f)
+        gzip_file(path, path + '.gz')
+        results[str(size)] = {'file_size': os.path.getsize(path), 'gzip_size': os.path.getsize(path + '.gz')}
+        for name, func in (('legacy', legacy_ingest), ('streaming', streaming_ingest)):
+            result = results[str(size)][name] = measure_ingest(func, path + '.gz')
+            print('{:>6} {:<10} {:>10} {:>12.2f} {:>14.1f} {:>14.1f}'.format(
+                size, name, os.path.getsize(path) // 1024, result['duration'],
+                result['peak'] / 1024 / 1024, result['retained'] / 1024 / 1024
+            ))
+        os.remove(path)
+        os.remove(path + '.gz')
+    os.rmdir(folder)
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""
+End-to-end benchmark of install, upgrade and uninstall against a local fake catalogue server
+
+Usage (from the repository root):
+    python -m benchmarks.bench_install --set-sizes 1 5 20 --depths 0 2 --latency 0.05 --bandwidth 1048576
+    python -m benchmarks.bench_install --failure-rate 0.2 --truncate-rate 0.1 --output result.json
+    python -m benchmarks.bench_install --mislabel-rate 0.2
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any
+
+from benchmarks import stub, catalogue
+from benchmarks.fake_server import FakeCatalogueServer, FaultConfig
+from benchmarks.harness import percentile, environment, dump
+
+server = stub.install()
+
+from mcdreforged_plugin_manager.config import config  # noqa: E402
+from mcdreforged_plugin_manager.storage.cache import cache  # noqa: E402
+from mcdreforged_plugin_manager.task.install_task import PluginInstaller  # noqa: E402
+from mcdreforged_plugin_manager.task.uninstall_task import PluginUninstaller  # noqa: E402
+from mcdreforged_plugin_manager.util.network_util import download_file  # noqa: E402
+
+
+class ReplyCollector:
+    def __init__(self):
+        self.replies: List[str] = []
+
+    def reply(self, text):
+        self.replies.append(text.to_plain_text() if hasattr(text, 'to_plain_text') else str(text))
+
+    def contains(self, key: str) -> bool:
+        return any(key in reply for reply in self.replies)
+
+
+def get_depths(data: Dict[str, Any]) -> Dict[str, int]:
+    """
+    :return: plugin id -> the length of the longest dependency chain below the plugin
+    """
+    depths: Dict[str, int] = {}
+
+    def depth(plugin_id: str) -> int:
+        if plugin_id not in depths:
+            dependencies = [dep for dep in data['plugins'][plugin_id]['meta']['dependencies'] if dep != 'mcdreforged']
+            depths[plugin_id] = max([depth(dep) + 1 for dep in dependencies], default=0)
+        return depths[plugin_id]
+
+    for plugin_id in data['plugins']:
+        depth(plugin_id)
+    return depths
+
+
+def inspect_plugin_directory(path: str) -> Dict[str, int]:
+    result = {'plugins': 0, 'temp_files': 0, 'broken_files': 0}
+    for file_name in os.listdir(path):
+        if file_name.endswith('.temp'):
+            result['temp_files'] += 1
+            continue
+        try:
+            with zipfile.ZipFile(os.path.join(path, file_name)) as zip_file:
+                plugin_meta = json.loads(zip_file.read('mcdreforged.plugin.json'))
+            if plugin_meta['version'].endswith('-mislabeled'):
+                raise ValueError()
+        except (zipfile.BadZipFile, KeyError, ValueError):
+            result['broken_files'] += 1
+        else:
+            result['plugins'] += 1
+    return result
+
+
+def refresh_catalogue():
+    if not cache.refresh():
+        raise RuntimeError('Failed to load the catalogue from the fake server')
+
+
+def install(plugin_ids: List[str], upgrade: bool) -> Dict[str, Any]:
+    source = ReplyCollector()
+    installer = PluginInstaller(list(plugin_ids), source, upgrade=upgrade)
+    start = time.perf_counter()
+    installer.init()
+    planned = time.perf_counter()
+    installer.run.original(installer)
+    end = time.perf_counter()
+    return {
+        'success': source.contains('install.result.success'),
+        'operations': len(installer.operations),
+        'planning': planned - start,
+        'duration': end - start,
+    }
+
+
+def uninstall(plugin_ids: List[str]) -> Dict[str, Any]:
+    source = ReplyCollector()
+    uninstaller = PluginUninstaller(list(plugin_ids), source)
+    start = time.perf_counter()
+    uninstaller.init()
+    uninstaller.run.original(uninstaller)
+    return {'success': source.contains('uninstall.result.success'), 'duration': time.perf_counter() - start}
+
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    durations = [sample['duration'] for sample in samples]
+    return {
+        'runs': len(samples),
+        'successes': sum(1 for sample in samples if sample['success']),
+        'operations': max(sample.get('operations', 0) for sample in samples),
+        'mean': sum(durations) / len(durations),
+        'p50': percentile(durations, 50),
+        'p95': percentile(durations, 95),
+        'max': max(durations),
+    }
+
+
+def run_scenario(fake: FakeCatalogueServer, base: Dict[str, Any], bumped: Dict[str, Any], plugin_ids: List[str],
+                 repeat: int, faults: FaultConfig) -> Dict[str, Any]:
+    results: Dict[str, List[Dict[str, Any]]] = {'install': [], 'upgrade': [], 'uninstall': []}
+    recovery = []
+    for _ in range(repeat):
+        shutil.rmtree(server.plugin_directory)
+        os.makedirs(server.plugin_directory)
+        server.scan_plugin_directory()
+        fake.faults = FaultConfig()
+        fake.set_catalogue(base)
+        refresh_catalogue()
+
+        fake.faults = faults
+        results['install'].append(install(plugin_ids, upgrade=False))
+        state = {'success': results['install'][-1]['success'], **inspect_plugin_directory(server.plugin_directory)}
+        fake.faults = FaultConfig()
+        if faults.failure_rate > 0 or faults.truncate_rate > 0 or faults.mislabel_rate > 0:
+            # retry without faults to see whether the plugin directory recovers
+            server.refresh_changed_plugins()
+            retry = install(plugin_ids, upgrade=False)
+            recovery.append({**state, 'retry_success': retry['success'],
+                             'after_retry': inspect_plugin_directory(server.plugin_directory)})
+
+        installed = [plugin_id for plugin_id in server.get_plugin_list()]
+        fake.set_catalogue(bumped)
+        refresh_catalogue()
+        fake.faults = faults
+        results['upgrade'].append(install(installed, upgrade=True))
+        fake.faults = FaultConfig()
+        if len(recovery) > 0:
+            recovery[-1]['upgrade_success'] = results['upgrade'][-1]['success']
+            recovery[-1]['after_upgrade'] = inspect_plugin_directory(server.plugin_directory)
+        server.refresh_changed_plugins()
+
+        results['uninstall'].append(uninstall(server.get_plugin_list()))
+    return {
+        **{key: summarize(samples) for key, samples in results.items()},
+        'recovery': recovery,
+    }
+
+
+def run_downloads(fake: FakeCatalogueServer, base: Dict[str, Any], amount: int, workers: List[int]) -> Dict[str, Any]:
+    """
+    Download the same set of assets with different amounts of concurrent workers
+    """
+    fake.faults = FaultConfig(latency=fake.faults.latency, bandwidth=fake.faults.bandwidth)
+    fake.set_catalogue(base)
+    urls = [plugin['release']['releases'][0]['asset']['browser_download_url']
+            for plugin in list(base['plugins'].values())[:amount]]
+    folder = tempfile.mkdtemp(prefix='mpm_bench_download_')
+    result = {}
+    try:
+        for worker in workers:
+            sent_before = fake.bytes_sent
+            start = time.perf_counter()
+            with ThreadPoolExecutor(worker) as executor:
+                list(executor.map(lambda item: download_file(item[1], os.path.join(folder, str(item[0]))),
+                                  enumerate(urls)))
+            duration = time.perf_counter() - start
+            transferred = fake.bytes_sent - sent_before
+            result[str(worker)] = {'files': len(urls), 'bytes': transferred, 'duration': duration,
+                                   'throughput': transferred / duration}
+    finally:
+        shutil.rmtree(folder)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--catalogue-size', type=int, default=200)
+    parser.add_argument('--set-sizes', type=int, nargs='+', default=[1, 5, 20], help='amounts of plugins to install')
+    parser.add_argument('--depths', type=int, nargs='+', default=[0, 2], help='dependency depths of the plugins')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help='delay before each response (unit: second)')
+    parser.add_argument('--bandwidth', type=int, default=None, help='transfer speed of each response (unit: byte/s)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='chance of responding 503')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='chance of cutting a response body')
+    parser.add_argument('--mislabel-rate', type=float, default=0.0,
+                        help='chance of serving a plugin with a version not matching the catalogue')
+    parser.add_argument('--max-asset-size', type=int, default=256 * 1024, help='upper bound of asset sizes (unit: byte)')
+    parser.add_argument('--download-workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    base = catalogue.generate(args.catalogue_size, args.seed, requirements=False)
+    bumped = catalogue.bump(base, seed=args.seed)
+    depths = get_depths(base)
+    faults = FaultConfig(args.latency, args.bandwidth, args.failure_rate, args.truncate_rate, args.seed,
+                         args.mislabel_rate)
+
+    server.plugin_directory = tempfile.mkdtemp(prefix='mpm_bench_plugins_')
+    config.install_path = server.plugin_directory
+    rnd = random.Random(args.seed)
+    results: Dict[str, Any] = {}
+    with FakeCatalogueServer(base, FaultConfig(args.latency, args.bandwidth), args.max_asset_size) as fake:
+        config.source = fake.source
+        for depth in args.depths:
+            candidates = [plugin_id for plugin_id, value in depths.items() if value == depth]
+            for set_size in args.set_sizes:
+                if len(candidates) < set_size:
+                    print('Skipping {} plugins of depth {}: only {} candidates'.format(set_size, depth, len(candidates)))
+                    continue
+                plugin_ids = rnd.sample(candidates, set_size)
+                name = 'size{}_depth{}'.format(set_size, depth)
+                results[name] = run_scenario(fake, base, bumped, plugin_ids, args.repeat, faults)
+                print('{:<16} install {:.3f}s upgrade {:.3f}s uninstall {:.3f}s ({} operations)'.format(
+                    name, results[name]['install']['p50'], results[name]['upgrade']['p50'],
+                    results[name]['uninstall']['p50'], results[name]['install']['operations']
+                ))
+        results['downloads'] = run_downloads(fake, base, 20, args.download_workers)
+        for worker, value in results['downloads'].items():
+            print('{:>2} workers: {:.1f} KB/s'.format(int(worker), value['throughput'] / 1024))
+    shutil.rmtree(server.plugin_directory, ignore_errors=True)
+
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark of the markdown renderer on the descriptions of a synthetic catalogue
+
+Usage (from the repository root):
+    python -m benchmarks.bench_markdown --size 1000 --output result.json
+"""
+import argparse
+import re
+from typing import List
+
+from benchmarks import stub, catalogue
+from benchmarks.harness import measure, environment, dump, print_table
+
+stub.install()
+
+from mcdreforged.api.all import RTextBase, RTextList  # noqa: E402
+
+from mcdreforged_plugin_manager.util.text_util import parse_markdown, tokenize_markdown, link, bold, italic  # noqa: E402
+
+
+def legacy_parse_markdown(text: str) -> RTextList:
+    """
+    The previous six-pass implementation, kept for comparison
+    """
+    components: List[RTextBase] = []
+
+    pos = -1
+
+    def next_pos(_):
+        nonlocal pos
+        pos += 1
+        return '{' + str(pos) + '}'
+
+    [components.append(item) for item in map(lambda x: link(*x), re.findall(r'\[(.*?)]\((.*?)\)', text))]
+    text = re.sub(r'\[(.*?)]\((.*?)\)', next_pos, text)
+
+    [components.append(item) for item in map(bold, re.findall(r'\*\*(.*)\*\*', text))]
+    text = re.sub(r'\*\*(.*)\*\*', next_pos, text)
+
+    [components.append(item) for item in map(italic, re.findall(r'\*(.*)\*', text))]
+    text = re.sub(r'\*(.*)\*', next_pos, text)
+
+    pointer = 0
+    ret = RTextList()
+    for item in re.finditer(r'{(\d)}', text):
+        index = int(item.group(1))
+        start, end = item.span()
+        ret.append(text[pointer:start])
+        ret.append(components[index])
+        pointer = end
+    ret.append(text[pointer:len(text)])
+
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=1000, help='amount of plugins in the catalogue')
+    parser.add_argument('--rounds', type=int, default=5, help='times to render the whole catalogue')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    data = catalogue.generate(args.size, args.seed)
+    descriptions = [text for plugin in data['plugins'].values() for text in plugin['meta']['description'].values()]
+    iterations = len(descriptions) * args.rounds
+
+    def cold(i: int):
+        tokenize_markdown.cache_clear()
+        parse_markdown(descriptions[i % len(descriptions)])
+
+    results = {'markdown': {
+        'legacy': measure(lambda i: legacy_parse_markdown(descriptions[i % len(descriptions)]), iterations),
+        'uncached': measure(cold, iterations),
+        'cached': measure(lambda i: parse_markdown(descriptions[i % len(descriptions)]), iterations),
+    }}
+    print_table(results)
+
+    many_links = ' '.join('[link{0}](https://example.com/{0})'.format(i) for i in range(12))
+    correct = parse_markdown(many_links).to_plain_text() == ' '.join('link{}'.format(i) for i in range(12))
+    print('12 links rendered correctly: {}'.format(correct))
+
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results,
+          'many_links_correct': correct}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Catalogue refreshes with the whole catalogue as the source against the sharded source, where only an index of plugin
+versions is downloaded on refresh and the metadata of each plugin is fetched when needed
+
+Each mode runs a cold start (first refresh and the check of installed plugins), a refresh after a part of the
+plugins publish new releases, then info lookups of plugins not fetched yet and of fetched ones
+
+Usage (from the repository root):
+    python -m benchmarks.bench_sharded --sizes 1000 5000 --bump-ratio 0.01 --output result.json
+"""
+import argparse
+import random
+import shutil
+import time
+from typing import Dict, Any
+
+from benchmarks import stub, catalogue
+from benchmarks.fake_server import FakeCatalogueServer, FaultConfig
+from benchmarks.harness import environment, dump, percentile
+
+server = stub.install()
+
+from mcdreforged_plugin_manager.config import config  # noqa: E402
+from mcdreforged_plugin_manager.storage.cache import Cache  # noqa: E402
+from mcdreforged_plugin_manager.storage.shard import shards  # noqa: E402
+
+
+def step(fake: FakeCatalogueServer, func) -> Dict[str, Any]:
+    requests_before, bytes_before = fake.requests, fake.bytes_sent
+    start = time.perf_counter()
+    func()
+    return {
+        'duration': time.perf_counter() - start,
+        'requests': fake.requests - requests_before,
+        'bytes': fake.bytes_sent - bytes_before,
+    }
+
+
+def run(fake: FakeCatalogueServer, data: Dict[str, Any], sharded: bool, bump_ratio: float, lookups: int,
+        seed: int) -> Dict[str, Any]:
+    shutil.rmtree(shards.get_folder(), ignore_errors=True)
+    fake.set_catalogue(data)
+    config.sharded_source.enabled = sharded
+    cache = Cache()
+    result = {'cold': step(fake, cache.refresh)}
+    fake.set_catalogue(catalogue.bump(data, bump_ratio, seed))
+    result['refresh'] = step(fake, cache.refresh)
+
+    rnd = random.Random(seed)
+    sample_ids = rnd.sample(cache.get_plugin_ids(), lookups)
+    for name in ('info_cold', 'info_warm'):
+        latencies = []
+        requests_before, bytes_before = fake.requests, fake.bytes_sent
+        for plugin_id in sample_ids:
+            start = time.perf_counter()
+            if cache.get_plugin_by_id(plugin_id) is None:
+                raise RuntimeError('Failed to get plugin {}'.format(plugin_id))
+            latencies.append(time.perf_counter() - start)
+        result[name] = {
+            'p50': percentile(latencies, 50), 'max': max(latencies),
+            'requests': fake.requests - requests_before, 'bytes': fake.bytes_sent - bytes_before,
+        }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000], help='catalogue sizes')
+    parser.add_argument('--bump-ratio', type=float, default=0.01, help='ratio of plugins publishing a new release')
+    parser.add_argument('--lookups', type=int, default=20, help='amount of plugins looked up by info')
+    parser.add_argument('--latency', type=float, default=0.02, help='delay before each response (unit: second)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    results = {}
+    print('{:>6} {:<9} {:>22} {:>22} {:>16} {:>16}'.format(
+        'size', 'mode', 'cold start', 'refresh', 'info (cold)', 'info (warm)'
+    ))
+    for size in args.sizes:
+        data = catalogue.generate(size, args.seed)
+        server.installed = catalogue.pick_installed(data, seed=args.seed)
+        results[str(size)] = {}
+        with FakeCatalogueServer(data, FaultConfig(latency=args.latency)) as fake:
+            config.source = fake.source
+            config.sharded_source.index = fake.index
+            config.sharded_source.plugin = fake.plugin_template
+            for mode in ('everything', 'sharded'):
+                result = results[str(size)][mode] = run(
+                    fake, data, mode == 'sharded', args.bump_ratio, args.lookups, args.seed
+                )
+                print('{:>6} {:<9} {:>22} {:>22} {:>16} {:>16}'.format(size, mode, *[
+                    '{:.2f}s {:>4}r {:>6.0f}KiB'.format(
+                        result[key]['duration'], result[key]['requests'], result[key]['bytes'] / 1024
+                    ) for key in ('cold', 'refresh')
+                ], *[
+                    '{:.1f}ms {:>4}r'.format(result[key]['p50'] * 1000, result[key]['requests'])
+                    for key in ('info_cold', 'info_warm')
+                ]))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
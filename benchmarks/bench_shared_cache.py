@@ -0,0 +1,107 @@
+"""
+Several MCDR instances on one host refreshing the catalogue and installing the same plugins at the same time,
+with and without a shared cache directory. Counts the requests reaching the catalogue server
+
+Each instance is a separate process with its own data folder and plugin directory
+
+Usage (from the repository root):
+    python -m benchmarks.bench_shared_cache --instances 8 --catalogue-size 1000 --plugins 5 --output result.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Any, Optional
+
+from benchmarks import catalogue
+from benchmarks.fake_server import FakeCatalogueServer, FaultConfig
+from benchmarks.harness import environment, dump
+
+INSTANCE_SCRIPT = '''
+import json, os, sys, time
+from benchmarks import stub
+server = stub.install(sys.argv[1])
+server.plugin_directory = os.path.join(sys.argv[1], 'plugins')
+os.makedirs(server.plugin_directory)
+
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.storage.cache import cache
+from mcdreforged_plugin_manager.task.install_task import PluginInstaller
+config.source = sys.argv[2]
+config.shared_cache = sys.argv[3] or None
+config.install_path = server.plugin_directory
+
+class Source:
+    def __init__(self):
+        self.replies = []
+    def reply(self, text):
+        self.replies.append(text.to_plain_text() if hasattr(text, 'to_plain_text') else str(text))
+
+result = {}
+start = time.perf_counter()
+result['refresh'] = cache.refresh()
+result['refresh_duration'] = time.perf_counter() - start
+source = Source()
+installer = PluginInstaller(sys.argv[4].split(','), source)
+start = time.perf_counter()
+installer.init()
+installer.run.original(installer)
+result['install'] = any('install.result.success' in reply for reply in source.replies)
+result['install_duration'] = time.perf_counter() - start
+print(json.dumps(result))
+'''
+
+
+def run(fake: FakeCatalogueServer, instances: int, plugin_ids: str, shared_cache: Optional[str]) -> Dict[str, Any]:
+    requests_before, bytes_before = fake.requests, fake.bytes_sent
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            [sys.executable, '-c', INSTANCE_SCRIPT, tempfile.mkdtemp(prefix='mpm_bench_instance_'), fake.source,
+             shared_cache or '', plugin_ids],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        for _ in range(instances)
+    ]
+    results = [json.loads(process.communicate()[0].decode('utf8').strip().splitlines()[-1]) for process in processes]
+    return {
+        'duration': time.perf_counter() - start,
+        'requests': fake.requests - requests_before,
+        'bytes': fake.bytes_sent - bytes_before,
+        'refreshed': sum(1 for result in results if result['refresh']),
+        'installed': sum(1 for result in results if result['install']),
+        'refresh_max': max(result['refresh_duration'] for result in results),
+        'install_max': max(result['install_duration'] for result in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--instances', type=int, default=8, help='amount of MCDR instances')
+    parser.add_argument('--catalogue-size', type=int, default=1000)
+    parser.add_argument('--plugins', type=int, default=5, help='amount of plugins each instance installs')
+    parser.add_argument('--latency', type=float, default=0.05, help='delay before each response (unit: second)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    data = catalogue.generate(args.catalogue_size, args.seed, requirements=False)
+    # plugins without dependencies, so each install downloads exactly the given amount of files
+    plugin_ids = [plugin_id for plugin_id, plugin in data['plugins'].items()
+                  if list(plugin['meta']['dependencies']) == ['mcdreforged']][:args.plugins]
+    results = {}
+    with FakeCatalogueServer(data, FaultConfig(latency=args.latency)) as fake:
+        results['separate'] = run(fake, args.instances, ','.join(plugin_ids), None)
+        results['shared'] = run(fake, args.instances, ','.join(plugin_ids), tempfile.mkdtemp(prefix='mpm_bench_shared_'))
+    for name, result in results.items():
+        print('{:<9} {} requests, {:.0f} KiB, {}/{} refreshed, {}/{} installed in {:.2f}s'.format(
+            name, result['requests'], result['bytes'] / 1024, result['refreshed'], args.instances,
+            result['installed'], args.instances, result['duration']
+        ))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Startup cost of MPM: importing the entry module, on_load, and the time until the catalogue is ready,
+for a cold start and for a hot reload with the catalogue of the previous instance still on disk
+
+Each sample runs in a fresh interpreter. MCDR itself, and so mcdreforged.api, is imported before the measurement,
+like it is in a running MCDR. The exit code is 1 if the import or on_load exceeds the budget
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup --samples 10 --import-budget 50 --on-load-budget 20
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from typing import Dict, Any, List
+
+from benchmarks.harness import percentile, environment, dump
+
+SAMPLE_SCRIPT = '''
+import json, os, sys, time
+from benchmarks import stub, catalogue
+from benchmarks.fake_server import FakeCatalogueServer
+server = stub.install(sys.argv[1])
+import mcdreforged.api.all  # loaded by MCDR before any plugin
+
+def wait_loaded(cache, timeout=60):
+    start = time.perf_counter()
+    while not cache.loaded and time.perf_counter() - start < timeout:
+        time.sleep(0.001)
+
+with FakeCatalogueServer(catalogue.generate(int(sys.argv[2]))) as fake:
+    result = {}
+    start = time.perf_counter()
+    import mcdreforged_plugin_manager.entry as entry
+    result['import'] = time.perf_counter() - start
+    result['modules'] = len([name for name in sys.modules if name.startswith('mcdreforged_plugin_manager')])
+    result['requests_imported'] = 'requests' in sys.modules
+
+    from mcdreforged_plugin_manager.config import config
+    from mcdreforged_plugin_manager.storage.cache import cache
+    config.source = fake.source
+    start = time.perf_counter()
+    entry.on_load(server, None)
+    result['on_load'] = time.perf_counter() - start
+    wait_loaded(cache)
+    result['ready'] = time.perf_counter() - start
+    requests_before = fake.requests
+
+    # hot reload: a fresh copy of the package, with the previous entry module as old
+    entry.on_unload(server)
+    for name in [name for name in sys.modules if name.startswith('mcdreforged_plugin_manager')]:
+        del sys.modules[name]
+    start = time.perf_counter()
+    import mcdreforged_plugin_manager.entry as new_entry
+    from mcdreforged_plugin_manager.config import config
+    from mcdreforged_plugin_manager.storage.cache import cache
+    config.source = fake.source
+    new_entry.on_load(server, entry)
+    result['reload_on_load'] = time.perf_counter() - start
+    wait_loaded(cache)
+    result['reload_ready'] = time.perf_counter() - start
+    result['reload_downloads'] = fake.requests - requests_before
+    new_entry.on_unload(server)
+print(json.dumps(result))
+'''
+
+
+def run_sample(catalogue_size: int) -> Dict[str, Any]:
+    output = subprocess.check_output(
+        [sys.executable, '-c', SAMPLE_SCRIPT, tempfile.mkdtemp(prefix='mpm_bench_startup_'), str(catalogue_size)],
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode('utf8').strip().splitlines()[-1])
+
+
+def summarize(samples: List[Dict[str, Any]], key: str) -> Dict[str, float]:
+    values = [sample[key] for sample in samples]
+    return {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'max': max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=5)
+    parser.add_argument('--catalogue-size', type=int, default=200)
+    parser.add_argument('--import-budget', type=float, default=50, help='budget of p50 import time (unit: ms)')
+    parser.add_argument('--on-load-budget', type=float, default=20, help='budget of p50 on_load time (unit: ms)')
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+
+    samples = [run_sample(args.catalogue_size) for _ in range(args.samples)]
+    results = {key: summarize(samples, key) for key in
+               ('import', 'on_load', 'ready', 'reload_on_load', 'reload_ready', 'reload_downloads')}
+    results['modules'] = samples[0]['modules']
+    results['requests_imported'] = samples[0]['requests_imported']
+    for key, value in results.items():
+        if isinstance(value, dict):
+            unit, scale = ('', 1) if key == 'reload_downloads' else ('ms', 1000)
+            print('{:<18} p50 {:>9.2f}{unit} p95 {:>9.2f}{unit} max {:>9.2f}{unit}'.format(
+                key, *[value[k] * scale for k in ('p50', 'p95', 'max')], unit=unit
+            ))
+    print('{} modules imported, requests imported: {}'.format(results['modules'], results['requests_imported']))
+
+    failures = []
+    if results['import']['p50'] * 1000 > args.import_budget:
+        failures.append('import {:.2f}ms > {}ms'.format(results['import']['p50'] * 1000, args.import_budget))
+    if results['on_load']['p50'] * 1000 > args.on_load_budget:
+        failures.append('on_load {:.2f}ms > {}ms'.format(results['on_load']['p50'] * 1000, args.on_load_budget))
+    print('Budget exceeded: ' + ', '.join(failures) if failures else 'Within budget')
+
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results, 'failures': failures},
+         args.output)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""
+Python requirement installs with and without the local wheelhouse, against a local package index with latency
+
+Each round installs a package with a chain of dependencies, then uninstalls them all, like reinstalling a plugin or
+installing it on another MCDR instance. Counts the requests reaching the package index, then checks that the
+wheelhouse installs the package with the index offline
+
+pip installs into a temporary virtual environment, created with the system site packages so MPM can be imported,
+and the script re-runs itself in it
+
+Usage (from the repository root):
+    python -m benchmarks.bench_wheelhouse --rounds 3 --depth 4 --output result.json
+"""
+import argparse
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from base64 import urlsafe_b64encode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Any
+
+
+def build_wheel(name: str, version: str, requires: List[str], size: int) -> bytes:
+    """
+    A pure python wheel of a package with the given dependencies, padded with incompressible bytes
+    """
+    module = name.replace('-', '_')
+    dist_info = '{}-{}.dist-info'.format(module, version)
+    files = {
+        '{}/__init__.py'.format(module): b'',
+        '{}/padding.bin'.format(module): os.urandom(size),
+        dist_info + '/METADATA': ''.join([
+            'Metadata-Version: 2.1\nName: {}\nVersion: {}\n'.format(name, version),
+            *['Requires-Dist: {}\n'.format(requirement) for requirement in requires]
+        ]).encode('utf8'),
+        dist_info + '/WHEEL': b'Wheel-Version: 1.0\nGenerator: bench\nRoot-Is-Purelib: true\nTag: py3-none-any\n',
+    }
+    record = []
+    for path, data in files.items():
+        digest = urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode()
+        record.append('{},sha256={},{}'.format(path, digest, len(data)))
+    record.append(dist_info + '/RECORD,,')
+    files[dist_info + '/RECORD'] = '\n'.join(record).encode('utf8')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+        for path, data in files.items():
+            zip_file.writestr(path, data)
+    return buffer.getvalue()
+
+
+class FakePackageIndex:
+    """
+    A PEP 503 simple repository serving generated wheels
+    """
+    def __init__(self, wheels: Dict[str, Dict[str, bytes]], latency: float):
+        """
+        :param wheels: project name -> file name -> wheel
+        """
+        self.wheels = wheels
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self.__httpd = ThreadingHTTPServer(('127.0.0.1', 0), self.__create_handler())
+        self.__httpd.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return 'http://{}:{}/simple/'.format(host, port)
+
+    def __create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(server.latency)
+                parts = [part for part in self.path.split('/') if part]
+                body, content_type = None, 'text/html'
+                if len(parts) == 2 and parts[0] == 'simple' and parts[1] in server.wheels:
+                    body = ''.join(
+                        '<a href="/files/{0}/{1}">{1}</a>\n'.format(parts[1], file_name)
+                        for file_name in server.wheels[parts[1]].keys()
+                    ).encode('utf8')
+                elif len(parts) == 3 and parts[0] == 'files':
+                    body = server.wheels.get(parts[1], {}).get(parts[2])
+                    content_type = 'application/octet-stream'
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server.bytes_sent += len(body)
+
+        return Handler
+
+    def __enter__(self):
+        self.__thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+
+def ensure_venv():
+    """
+    Re-run this script in a temporary virtual environment, so the current interpreter is left untouched
+    """
+    if sys.prefix != sys.base_prefix:
+        return
+    folder = tempfile.mkdtemp(prefix='mpm_bench_venv_')
+    subprocess.check_call([sys.executable, '-m', 'venv', '--system-site-packages', folder])
+    python = os.path.join(folder, 'Scripts' if sys.platform == 'win32' else 'bin', 'python')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))}
+    try:
+        code = subprocess.call([python, '-m', 'benchmarks.bench_wheelhouse', *sys.argv[1:]], env=env, cwd=root)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    sys.exit(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=3, help='amount of installs of the package')
+    parser.add_argument('--depth', type=int, default=4, help='length of the dependency chain of the package')
+    parser.add_argument('--size', type=int, default=256, help='size of each wheel (unit: KiB)')
+    parser.add_argument('--latency', type=float, default=0.1, help='delay before each response (unit: second)')
+    parser.add_argument('--output', help='write the json result to this file instead of stdout')
+    args = parser.parse_args()
+    ensure_venv()
+
+    from benchmarks import stub
+    from benchmarks.harness import environment, dump
+    stub.install()
+    from mcdreforged_plugin_manager.config import config
+    from mcdreforged_plugin_manager.storage.wheelhouse import wheelhouse
+
+    names = ['mpm-bench-package-{}'.format(i) for i in range(args.depth + 1)]
+    wheels = {
+        name: {'{}-1.0.0-py3-none-any.whl'.format(name.replace('-', '_')): build_wheel(
+            name, '1.0.0', names[i + 1:i + 2], args.size * 1024
+        )}
+        for i, name in enumerate(names)
+    }
+    pip = [sys.executable, '-m', 'pip', '--disable-pip-version-check', '--no-cache-dir', '-q']
+    quiet = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+    results: Dict[str, Any] = {}
+    with FakePackageIndex(wheels, args.latency) as index:
+        os.environ.update(PIP_INDEX_URL=index.url, PIP_DISABLE_PIP_VERSION_CHECK='1', PIP_NO_CACHE_DIR='1')
+        for mode in ('legacy', 'wheelhouse'):
+            config.wheelhouse.enabled = mode == 'wheelhouse'
+            durations = []
+            requests_before, bytes_before = index.requests, index.bytes_sent
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                if config.wheelhouse.enabled:
+                    wheelhouse.install(names[0])
+                else:
+                    subprocess.check_call([*pip, 'install', names[0]], **quiet)
+                durations.append(time.perf_counter() - start)
+                subprocess.check_call([*pip, 'uninstall', '-y', *names], **quiet)
+            results[mode] = {
+                'durations': durations,
+                'requests': index.requests - requests_before,
+                'bytes': index.bytes_sent - bytes_before,
+            }
+    # the index is down from here on
+    for path in wheelhouse.get_wheels().keys():
+        os.utime(path, (0, 0))
+    start = time.perf_counter()
+    try:
+        results['offline'] = {'installed': wheelhouse.install(names[0])}
+    except subprocess.CalledProcessError:
+        results['offline'] = {'installed': False}
+    results['offline']['duration'] = time.perf_counter() - start
+    # the wheels of the dependencies are used as well, none of them may look unused to the eviction
+    results['offline']['all_wheels_touched'] = all(stat.st_mtime > 0 for stat in wheelhouse.get_wheels().values())
+    subprocess.call([*pip, 'uninstall', '-y', *names], **quiet)
+
+    for mode in ('legacy', 'wheelhouse'):
+        result = results[mode]
+        print('{:<10} {} requests, {:.0f} KiB, first install {:.2f}s, later installs {}'.format(
+            mode, result['requests'], result['bytes'] / 1024, result['durations'][0],
+            ', '.join('{:.2f}s'.format(duration) for duration in result['durations'][1:])
+        ))
+    print('offline    installed: {}, {:.2f}s, all wheels touched: {}'.format(
+        results['offline']['installed'], results['offline']['duration'], results['offline']['all_wheels_touched']
+    ))
+    dump({'environment': environment(), 'arguments': vars(args), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
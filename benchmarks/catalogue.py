@@ -0,0 +1,176 @@
+"""
+Synthetic plugin catalogues in the schema of everything.json from the PluginCatalogue meta branch
+"""
+import copy
+import datetime
+import random
+from typing import Dict, List, Any
+
+LABELS = ['information', 'tool', 'management', 'api']
+WORDS = ['quick', 'backup', 'where', 'is', 'chat', 'bridge', 'stats', 'helper', 'bot', 'world', 'edit', 'map',
+         'player', 'info', 'manager', 'auto', 'restart', 'permission', 'lib', 'api', 'logger', 'command', 'timer']
+REQUIREMENTS = ['mpm_bench_requests', 'mpm_bench_yaml', 'mpm_bench_psutil', 'mpm_bench_numpy', 'mpm_bench_pillow']
+
+
+def get_version(index: int) -> str:
+    return '{}.{}.{}'.format(index // 20, index // 5 % 4, index % 5)
+
+
+def get_description(rnd: random.Random, plugin_id: str) -> str:
+    parts = ['A plugin', 'for', '**MCDReforged**', 'to']
+    for _ in range(rnd.randint(3, 12)):
+        word = rnd.choice(WORDS)
+        roll = rnd.random()
+        if roll < 0.1:
+            word = '[{}](https://github.com/example/{})'.format(word, plugin_id)
+        elif roll < 0.2:
+            word = '*{}*'.format(word)
+        elif roll < 0.25:
+            word = '**{}**'.format(word)
+        parts.append(word)
+    return ' '.join(parts)
+
+
+def generate(amount: int, seed: int = 0, requirements: bool = True) -> Dict[str, Any]:
+    """
+    Generate a catalogue with {amount} plugins, release histories and an acyclic dependency graph
+
+    Plugin i may only depend on plugins with smaller indexes, so the dependency graph has no cycle
+    :param requirements: whether plugins require python packages
+    """
+    rnd = random.Random(seed)
+    plugin_ids: List[str] = []
+    plugins: Dict[str, Any] = {}
+    start = datetime.datetime(2021, 1, 1)
+    for index in range(amount):
+        plugin_id = '{}_{}_{}'.format(rnd.choice(WORDS), rnd.choice(WORDS), index)
+        name = ''.join(word.capitalize() for word in plugin_id.split('_')[:-1]) + str(index)
+        release_amount = rnd.choice([1, 1, 2, 3, 5, 8, 13, 30])
+        dependencies = {'mcdreforged': '>=2.0.0'}
+        if len(plugin_ids) > 0:
+            for dep_id in rnd.sample(plugin_ids, min(len(plugin_ids), rnd.choice([0, 0, 0, 1, 1, 2, 3]))):
+                dependencies[dep_id] = '>={}'.format(get_version(0))
+        python_requirements = rnd.sample(REQUIREMENTS, rnd.choice([0, 0, 0, 1, 2])) if requirements else []
+        labels = rnd.sample(LABELS, rnd.randint(1, 2))
+        description = {'en_us': get_description(rnd, plugin_id), 'zh_cn': get_description(rnd, plugin_id)}
+        repository = 'https://github.com/example/{}'.format(plugin_id)
+
+        releases = []
+        created_at = start + datetime.timedelta(days=rnd.randint(0, 600))
+        for release_index in range(release_amount):
+            version = get_version(release_index)
+            created_at += datetime.timedelta(days=rnd.randint(1, 30), seconds=rnd.randint(0, 86400))
+            timestamp = created_at.strftime('%Y-%m-%dT%H:%M:%SZ')
+            asset_name = '{}-v{}.mcdr'.format(name, version)
+            releases.append({
+                'url': '{}/releases/tag/v{}'.format(repository, version),
+                'name': 'v{}'.format(version),
+                'tag_name': 'v{}'.format(version),
+                'created_at': timestamp,
+                'description': 'Release v{}'.format(version),
+                'prerelease': False,
+                'asset': {
+                    'id': rnd.randint(10 ** 7, 10 ** 8),
+                    'name': asset_name,
+                    'size': rnd.randint(5 * 1024, 2 * 1024 * 1024),
+                    'download_count': rnd.randint(0, 5000),
+                    'created_at': timestamp,
+                    'browser_download_url': '{}/releases/download/v{}/{}'.format(repository, version, asset_name),
+                },
+                'meta': {
+                    'schema_version': 1,
+                    'id': plugin_id,
+                    'name': name,
+                    'version': version,
+                    'dependencies': dependencies,
+                    'requirements': python_requirements,
+                },
+            })
+        releases.reverse()  # the newest release comes first, like the GitHub api
+
+        plugins[plugin_id] = {
+            'meta': {
+                'schema_version': 1,
+                'id': plugin_id,
+                'name': name,
+                'version': get_version(release_amount - 1),
+                'link': repository,
+                'authors': ['author{}'.format(rnd.randint(0, amount // 10 + 1))],
+                'dependencies': dependencies,
+                'requirements': python_requirements,
+                'description': description,
+            },
+            'plugin': {
+                'schema_version': 1,
+                'id': plugin_id,
+                'authors': [],
+                'repository': repository,
+                'branch': 'master',
+                'related_path': '.',
+                'labels': labels,
+                'introduction': {},
+            },
+            'repository': {
+                'url': repository,
+                'name': plugin_id,
+                'full_name': 'example/{}'.format(plugin_id),
+                'html_url': repository,
+                'description': description['en_us'],
+                'archived': False,
+                'stargazers_count': rnd.randint(0, 500),
+                'watchers_count': rnd.randint(0, 50),
+                'forks_count': rnd.randint(0, 50),
+            },
+            'release': {
+                'schema_version': 1,
+                'id': plugin_id,
+                'latest_version': get_version(release_amount - 1),
+                'latest_version_index': 0,
+                'releases': releases,
+            },
+        }
+        plugin_ids.append(plugin_id)
+    return {'timestamp': int(start.timestamp()), 'authors': {'amount': 0, 'authors': {}}, 'plugins': plugins}
+
+
+def pick_installed(catalogue: Dict[str, Any], ratio: float = 0.1, outdated_ratio: float = 0.5,
+                   seed: int = 0) -> Dict[str, str]:
+    """
+    Pick a set of installed plugins from the catalogue, some of which are outdated
+    :return: plugin id -> installed version
+    """
+    rnd = random.Random(seed)
+    installed = {}
+    for plugin_id, plugin in catalogue['plugins'].items():
+        if rnd.random() < ratio:
+            releases = plugin['release']['releases']
+            if len(releases) > 1 and rnd.random() < outdated_ratio:
+                installed[plugin_id] = releases[-1]['meta']['version']
+            else:
+                installed[plugin_id] = releases[0]['meta']['version']
+    return installed
+
+
+def bump(catalogue: Dict[str, Any], ratio: float = 1.0, seed: int = 0) -> Dict[str, Any]:
+    """
+    Create the next generation of the catalogue, where a part of the plugins publish a new release
+    """
+    rnd = random.Random(seed)
+    catalogue = copy.deepcopy(catalogue)
+    for plugin in catalogue['plugins'].values():
+        if rnd.random() >= ratio:
+            continue
+        releases = plugin['release']['releases']
+        release = copy.deepcopy(releases[0])
+        old_version = release['meta']['version']
+        version = get_version(len(releases))
+        for key in ('url', 'name', 'tag_name', 'description'):
+            release[key] = release[key].replace(old_version, version)
+        release['asset']['name'] = release['asset']['name'].replace(old_version, version)
+        release['asset']['browser_download_url'] = release['asset']['browser_download_url'].replace(old_version, version)
+        release['asset']['download_count'] = 0
+        release['meta']['version'] = version
+        releases.insert(0, release)
+        plugin['meta']['version'] = version
+        plugin['release']['latest_version'] = version
+    return catalogue
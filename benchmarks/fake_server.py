@@ -0,0 +1,233 @@
+"""
+A local stand-in of the catalogue source and GitHub release downloads, with injectable latency, bandwidth and failures
+
+    /everything.json                      the catalogue, with every download url pointing to this server,
+                                          gzip encoded if the client accepts it and gzip_catalogue is set
+    /everything.json.gz                   the pre-compressed catalogue
+    /everything.json.xz
+    /assets/<plugin id>/<version>/<name>  a packed plugin generated from the catalogue entry
+    /index.json                           the plugin index of the sharded source, with the version of each plugin,
+                                          gzip encoded like the catalogue
+    /<plugin id>/<file>.json              the meta, plugin, release or repository part of a catalogue entry,
+                                          gzip encoded like the catalogue
+"""
+import gzip
+import io
+import json
+import lzma
+import random
+import threading
+import time
+import zipfile
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, Tuple
+
+
+class FaultConfig:
+    def __init__(self, latency: float = 0.0, bandwidth: Optional[int] = None, failure_rate: float = 0.0,
+                 truncate_rate: float = 0.0, seed: int = 0, mislabel_rate: float = 0.0):
+        """
+        :param latency: the delay before each response (unit: second)
+        :param bandwidth: the transfer speed limit of each response (unit: byte/s), None for unlimited
+        :param failure_rate: the chance of responding 503 to a request
+        :param truncate_rate: the chance of closing the connection halfway through a response body
+        :param mislabel_rate: the chance of serving a packed plugin whose version doesn't match the catalogue
+        """
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.truncate_rate = truncate_rate
+        self.mislabel_rate = mislabel_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self, rate: float) -> bool:
+        with self.lock:
+            return self.random.random() < rate
+
+
+def pack_plugin(meta: Dict[str, Any], size: int) -> bytes:
+    """
+    Create a packed plugin (.mcdr) with the given meta, padded with incompressible bytes to roughly the given size
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr('mcdreforged.plugin.json', json.dumps({
+            'id': meta['id'],
+            'version': meta['version'],
+            'name': meta.get('name', meta['id']),
+            'dependencies': meta.get('dependencies', {}),
+        }))
+        zip_file.writestr('{}/__init__.py'.format(meta['id']), '')
+        zip_file.writestr('{}/padding.bin'.format(meta['id']), random.Random(meta['id']).randbytes(size))
+    return buffer.getvalue()
+
+
+def mislabel_plugin(body: bytes) -> bytes:
+    """
+    Repack a packed plugin with a version in mcdreforged.plugin.json that is not in the catalogue
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(body)) as source, zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as target:
+        for info in source.infolist():
+            data = source.read(info)
+            if info.filename == 'mcdreforged.plugin.json':
+                data = json.dumps({**json.loads(data), 'version': '0.0.0-mislabeled'})
+            target.writestr(info, data)
+    return buffer.getvalue()
+
+
+class FakeCatalogueServer:
+    def __init__(self, catalogue: Dict[str, Any], faults: Optional[FaultConfig] = None, max_asset_size: int = 256 * 1024,
+                 host: str = '127.0.0.1', port: int = 0, gzip_catalogue: bool = True):
+        """
+        :param max_asset_size: the upper bound of the generated asset size, the catalogue sizes are used below it
+        :param gzip_catalogue: whether to negotiate gzip content encoding of the catalogue, like GitHub does
+        """
+        self.gzip_catalogue = gzip_catalogue
+        self.faults = faults if faults is not None else FaultConfig()
+        self.max_asset_size = max_asset_size
+        self.requests = 0
+        self.bytes_sent = 0
+        self.__assets: Dict[Tuple[str, str], bytes] = {}
+        self.__assets_lock = threading.Lock()
+        self.__httpd = ThreadingHTTPServer((host, port), self.__create_handler())
+        self.__httpd.daemon_threads = True
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever, name='FakeCatalogueServer', daemon=True)
+        self.catalogue: Dict[str, Any] = {}
+        self.catalogue_bytes = b''
+        self.set_catalogue(catalogue)
+
+    @property
+    def url(self) -> str:
+        host, port = self.__httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def source(self) -> str:
+        return self.url + '/everything.json'
+
+    @property
+    def index(self) -> str:
+        return self.url + '/index.json'
+
+    @property
+    def plugin_template(self) -> str:
+        return self.url + '/{id}/{file}.json'
+
+    def set_catalogue(self, catalogue: Dict[str, Any]):
+        """
+        Serve a new catalogue generation, download urls are rewritten to point to this server
+        """
+        for plugin_id, plugin in catalogue['plugins'].items():
+            for release in plugin['release']['releases']:
+                release['asset']['browser_download_url'] = '{}/assets/{}/{}/{}'.format(
+                    self.url, plugin_id, release['meta']['version'], release['asset']['name']
+                )
+        self.catalogue = catalogue
+        self.catalogue_bytes = json.dumps(catalogue).encode('utf8')
+        self.catalogue_gzip = gzip.compress(self.catalogue_bytes, 6)
+        self.catalogue_xz = lzma.compress(self.catalogue_bytes)
+        self.index_bytes = json.dumps({'plugins': {
+            plugin_id: {'version': plugin['meta']['version']} for plugin_id, plugin in catalogue['plugins'].items()
+        }}).encode('utf8')
+        self.index_gzip = gzip.compress(self.index_bytes, 6)
+
+    def get_asset(self, plugin_id: str, version: str) -> Optional[bytes]:
+        with self.__assets_lock:
+            key = (plugin_id, version)
+            if key not in self.__assets:
+                plugin = self.catalogue['plugins'].get(plugin_id)
+                if plugin is None:
+                    return None
+                for release in plugin['release']['releases']:
+                    if release['meta']['version'] == version:
+                        size = min(release['asset']['size'], self.max_asset_size)
+                        self.__assets[key] = pack_plugin(release['meta'], size)
+                        break
+                else:
+                    return None
+            return self.__assets[key]
+
+    def __create_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests += 1
+                faults = server.faults
+                if faults.latency > 0:
+                    time.sleep(faults.latency)
+                if faults.roll(faults.failure_rate):
+                    self.send_error(503)
+                    return
+                encoding = None
+                if self.path == '/everything.json':
+                    body = server.catalogue_bytes
+                    if server.gzip_catalogue and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                        body, encoding = server.catalogue_gzip, 'gzip'
+                elif self.path == '/everything.json.gz':
+                    body = server.catalogue_gzip
+                elif self.path == '/everything.json.xz':
+                    body = server.catalogue_xz
+                elif self.path == '/index.json':
+                    body = server.index_bytes
+                    if server.gzip_catalogue and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                        body, encoding = server.index_gzip, 'gzip'
+                elif self.path.count('/') == 2 and self.path.endswith('.json'):
+                    _, plugin_id, file_name = self.path.split('/')
+                    entry = server.catalogue['plugins'].get(plugin_id, {}).get(file_name[:-len('.json')])
+                    body = json.dumps(entry).encode('utf8') if entry is not None else None
+                    if body is not None and server.gzip_catalogue and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                        body, encoding = gzip.compress(body, 6), 'gzip'
+                elif self.path.startswith('/assets/'):
+                    parts = self.path.split('/')
+                    body = server.get_asset(parts[2], parts[3]) if len(parts) == 5 else None
+                    if body is not None and faults.roll(faults.mislabel_rate):
+                        body = mislabel_plugin(body)
+                else:
+                    body = None
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                if encoding is not None:
+                    self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                limit = len(body) // 2 if faults.roll(faults.truncate_rate) else len(body)
+                self.__send(body[:limit], faults.bandwidth)
+                if limit < len(body):
+                    self.close_connection = True
+
+            def __send(self, body: bytes, bandwidth: Optional[int]):
+                chunk_size = 16 * 1024
+                start = time.monotonic()
+                for offset in range(0, len(body), chunk_size):
+                    chunk = body[offset:offset + chunk_size]
+                    self.wfile.write(chunk)
+                    server.bytes_sent += len(chunk)
+                    if bandwidth is not None:
+                        expected = (offset + len(chunk)) / bandwidth
+                        delay = expected - (time.monotonic() - start)
+                        if delay > 0:
+                            time.sleep(delay)
+
+        return Handler
+
+    def start(self) -> 'FakeCatalogueServer':
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
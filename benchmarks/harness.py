@@ -0,0 +1,105 @@
+"""
+Measurement helpers shared by the benchmarks
+"""
+import gc
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, List, Dict, Any, Optional
+
+
+def percentile(samples: List[float], percent: float) -> float:
+    if len(samples) == 0:
+        return 0.0
+    samples = sorted(samples)
+    return samples[max(0, math.ceil(len(samples) * percent / 100) - 1)]
+
+
+def measure(func: Callable[[int], Any], iterations: int, warmup: int = 1, memory: bool = True) -> Dict[str, Any]:
+    """
+    Call func(i) for each iteration and report throughput, latency percentiles and peak memory
+
+    Peak memory is measured in a separate traced run, so tracemalloc does not affect the timing
+    :param func: the operation to measure, receives the iteration index
+    """
+    for i in range(warmup):
+        func(i)
+    gc.collect()
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        begin = time.perf_counter()
+        func(i)
+        latencies.append(time.perf_counter() - begin)
+    total = time.perf_counter() - start
+
+    peak_memory: Optional[int] = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func(0)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'total': total,
+        'ops_per_second': iterations / total if total > 0 else None,
+        'mean': total / iterations,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'max': max(latencies),
+        'peak_memory': peak_memory,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'time': time.time(),
+    }
+
+
+def dump(result: Dict[str, Any], path: Optional[str]):
+    text = json.dumps(result, indent=4)
+    if path is None:
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf8') as f:
+            f.write(text)
+
+
+def print_table(results: Dict[str, Dict[str, Dict[str, Any]]]):
+    """
+    :param results: group -> operation -> measure() result
+    """
+    print('{:<10} {:<20} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+        'group', 'operation', 'ops/s', 'p50 (ms)', 'p95 (ms)', 'p99 (ms)', 'peak (KB)'
+    ))
+    for group, operations in results.items():
+        for operation, result in operations.items():
+            print('{:<10} {:<20} {:>12.1f} {:>12.3f} {:>12.3f} {:>12.3f} {:>12}'.format(
+                group, operation, result['ops_per_second'] or 0,
+                result['p50'] * 1000, result['p95'] * 1000, result['p99'] * 1000,
+                '-' if result['peak_memory'] is None else result['peak_memory'] // 1024
+            ))
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], key: str = 'p50'):
+    """
+    Print the relative change of each operation between two benchmark results
+    """
+    for group, operations in current['results'].items():
+        for operation, result in operations.items():
+            old = baseline.get('results', {}).get(group, {}).get(operation)
+            if old is None or not old.get(key):
+                continue
+            change = (result[key] - old[key]) / old[key] * 100
+            print('{:<10} {:<20} {}: {:+.1f}%'.format(group, operation, key, change))
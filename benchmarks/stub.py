@@ -0,0 +1,126 @@
+"""
+A stand-in of the MCDR server interface, so the plugin can be imported and benchmarked without a running MCDR
+
+Call install() before importing anything from mcdreforged_plugin_manager
+"""
+import json
+import logging
+import os
+import tempfile
+import zipfile
+from typing import Dict, Optional
+
+from mcdreforged.api.all import ServerInterface, RText
+from mcdreforged.plugin.meta.version import Version
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class StubMetadata:
+    def __init__(self, plugin_id: str, version: str, name: Optional[str] = None):
+        self.id = plugin_id
+        self.name = name or plugin_id
+        self.version = Version(version)
+
+
+class StubServerInterface:
+    """
+    Implements the subset of PluginServerInterface used by MPM. Installed plugins are kept in a dict
+    """
+    def __init__(self, data_folder: str):
+        self.data_folder = data_folder
+        self.logger = logging.getLogger('MPM')
+        self.installed: Dict[str, str] = {}  # plugin id -> version
+        self.plugin_files: Dict[str, str] = {}  # plugin id -> file path
+        self.plugin_directory: Optional[str] = None  # if set, installed plugins are scanned from this directory
+        self.server_running = False
+        self.online_players = 0  # reported by the rcon list query, if the server is running
+
+    def as_plugin_server_interface(self):
+        return self
+
+    def get_self_metadata(self):
+        return StubMetadata('mcdreforged_plugin_manager', '2.2.0', 'MCDReforged Plugin Manager')
+
+    def get_data_folder(self) -> str:
+        return self.data_folder
+
+    def open_bundled_file(self, path: str):
+        return open(os.path.join(REPO_ROOT, path), 'rb')
+
+    def rtr(self, key: str, *args, **kwargs):
+        return RText(' '.join([key, *map(str, args), *map(str, kwargs.values())]))
+
+    def get_mcdr_language(self) -> str:
+        return 'en_us'
+
+    def get_plugin_list(self):
+        return list(self.installed.keys())
+
+    def get_plugin_metadata(self, plugin_id: str):
+        if plugin_id == 'mcdreforged':
+            return StubMetadata(plugin_id, '2.16.0')
+        if plugin_id not in self.installed:
+            return None
+        return StubMetadata(plugin_id, self.installed[plugin_id])
+
+    def get_plugin_file_path(self, plugin_id: str) -> Optional[str]:
+        return self.plugin_files.get(plugin_id)
+
+    def scan_plugin_directory(self):
+        """
+        Rebuild the installed plugins from the packed plugins in the plugin directory, like MCDR does on reload
+        """
+        self.installed.clear()
+        self.plugin_files.clear()
+        for file_name in os.listdir(self.plugin_directory):
+            path = os.path.join(self.plugin_directory, file_name)
+            if not file_name.endswith('.mcdr') or not os.path.isfile(path):
+                continue
+            try:
+                with zipfile.ZipFile(path) as zip_file:
+                    meta = json.loads(zip_file.read('mcdreforged.plugin.json'))
+            except (zipfile.BadZipFile, KeyError, ValueError):
+                self.logger.warning('Failed to load plugin file {}'.format(path))
+                continue
+            self.installed[meta['id']] = meta['version']
+            self.plugin_files[meta['id']] = path
+
+    def refresh_changed_plugins(self):
+        if self.plugin_directory is not None:
+            self.scan_plugin_directory()
+
+    def is_server_running(self) -> bool:
+        return self.server_running
+
+    def is_rcon_running(self) -> bool:
+        return self.server_running
+
+    def rcon_query(self, command: str) -> Optional[str]:
+        if command == 'list':
+            return 'There are {} of a max of 20 players online:'.format(self.online_players)
+        return None
+
+    def unload_plugin(self, plugin_id: str):
+        self.installed.pop(plugin_id, None)
+
+    def say(self, text):
+        self.logger.info(text)
+
+    def dispatch_event(self, event, args):
+        pass
+
+    def register_command(self, node):
+        pass
+
+    def register_help_message(self, prefix: str, message):
+        pass
+
+
+def install(data_folder: Optional[str] = None) -> StubServerInterface:
+    if data_folder is None:
+        data_folder = tempfile.mkdtemp(prefix='mpm_bench_')
+    os.makedirs(data_folder, exist_ok=True)
+    server = StubServerInterface(data_folder)
+    setattr(ServerInterface, '_ServerInterface__global_instance', server)
+    return server
@@ -1,16 +1,22 @@
 import functools
+import os
 from typing import Callable, List, Union, Optional
 
 from mcdreforged.api.all import *
 
-from mcdreforged_plugin_manager.constants import meta, PREFIX
-from mcdreforged_plugin_manager.storage.cache import cache
-from mcdreforged_plugin_manager.task.install_task import PluginInstaller
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.constants import meta, PREFIX, psi, SORT_ORDERS
+from mcdreforged_plugin_manager.storage.cache import cache, CacheClock
 from mcdreforged_plugin_manager.task.task_manager import task_manager
-from mcdreforged_plugin_manager.task.uninstall_task import PluginUninstaller
 from mcdreforged_plugin_manager.util.mcdr_util import is_plugin_loaded
+from mcdreforged_plugin_manager.util.misc_util import parse_plugin_spec
+from mcdreforged_plugin_manager.util.stats_util import stats
+from mcdreforged_plugin_manager.util.text_util import timestamp, command_run, insert_between, indented
 from mcdreforged_plugin_manager.util.translation_util import tr
-from mcdreforged_plugin_manager.util.upgrade_helper import show_check_update_result
+
+# the installer, uninstaller and lockfile subsystems are imported on first use, so loading MPM stays cheap
+# commands that look plugins up run in a worker thread, since a sharded source fetches them over the network, and
+# reply from there. The validating decorators stay outside, they only read the local index
 
 
 def ensure_cache_loaded(func: Callable):
@@ -26,18 +32,44 @@ def ensure_cache_loaded(func: Callable):
     return wrapper
 
 
-def ensure_plugin_id(func: Callable):
+def ensure_plugin_id(func: Optional[Callable] = None, *, fallback: bool = True):
     """
     A decorator that ensures the plugin id(s) in the function parameter is present in the cache
+    Unknown ids are replaced with the closest plugin id if config.fuzzy_fallback is enabled and the match is clear,
+    otherwise similar plugin ids are suggested, which run the same command with the id replaced when clicked
+    :param fallback: whether the replacement is allowed, e.g. not in upgrade, where the typed id is an installed
+    plugin and replacing it would install a different plugin
     """
+    if func is None:
+        return functools.partial(ensure_plugin_id, fallback=fallback)
+
     @functools.wraps(func)
     def wrapper(source: CommandSource, plugin_id_input: Union[str, List[str]], *args, **kwargs):
-        plugin_ids = [plugin_id_input] if isinstance(plugin_id_input, str) else plugin_id_input
-        for plugin_id in plugin_ids:
-            if not cache.is_plugin_present(plugin_id):
-                source.reply(tr('plugin.not_found', plugin_id))
-                return
-        func(source, plugin_id_input, *args, **kwargs)
+        plugin_ids = [plugin_id_input] if isinstance(plugin_id_input, str) else list(plugin_id_input)
+        for index, spec in enumerate(plugin_ids):
+            plugin_id, version = parse_plugin_spec(spec)
+            if cache.is_plugin_present(plugin_id):
+                continue
+            resolved = cache.suggestions.fuzzy.resolve(plugin_id) if fallback and config.fuzzy_fallback else None
+            if resolved is not None:
+                source.reply(tr('plugin.fuzzy_fallback', plugin_id, resolved))
+                plugin_ids[index] = resolved if version is None else '{}@{}'.format(resolved, version)
+                continue
+            source.reply(tr('plugin.not_found', plugin_id))
+            candidates = cache.suggestions.fuzzy.search(plugin_id)
+            if len(candidates) > 0:
+                source.reply(RTextList(tr('plugin.did_you_mean'), ' ', insert_between([
+                    command_run(
+                        RText(candidate).set_color(RColor.aqua),
+                        '{} {} {}'.format(PREFIX, func.__name__, ' '.join(
+                            [*plugin_ids[:index], candidate if version is None else '{}@{}'.format(candidate, version),
+                             *plugin_ids[index + 1:]]
+                        )),
+                        tr('plugin.did_you_mean_hover', candidate)
+                    ) for candidate, _ in candidates
+                ], RText(', '))))
+            return
+        func(source, plugin_ids[0] if isinstance(plugin_id_input, str) else plugin_ids, *args, **kwargs)
 
     return wrapper
 
@@ -49,7 +81,7 @@ def ensure_plugin_installed(func: Callable):
     @functools.wraps(func)
     def wrapper(source: CommandSource, plugin_id_input: Union[str, List[str]], *args, **kwargs):
         plugin_ids = [plugin_id_input] if isinstance(plugin_id_input, str) else plugin_id_input
-        for plugin_id in plugin_ids:
+        for plugin_id, _ in map(parse_plugin_spec, plugin_ids):
             if not is_plugin_loaded(plugin_id):
                 source.reply(tr('plugin.not_installed', plugin_id))
                 return
@@ -58,13 +90,32 @@ def ensure_plugin_installed(func: Callable):
     return wrapper
 
 
+def ensure_stats_enabled(func: Callable):
+    """
+    A decorator that ensures the instrumentation is enabled
+    """
+    @functools.wraps(func)
+    def wrapper(source: CommandSource, *args, **kwargs):
+        if not stats.enabled:
+            source.reply(tr('stats.disabled'))
+            return
+        func(source, *args, **kwargs)
+
+    return wrapper
+
+
 def show_help_message(source: CommandSource):
     source.reply(tr('help_message', prefix=PREFIX, name=meta.name, version=meta.version))
 
 
 @ensure_cache_loaded
-def list_plugins(source: CommandSource, labels: Optional[Union[None, str, List[str]]] = None):
-    plugins = list(cache.get_plugins_by_labels(labels))
+@new_thread('MPMCommand')
+def list_plugins(source: CommandSource, labels: Optional[Union[None, str, List[str]]] = None,
+                 sort: Optional[str] = None):
+    if sort is not None and sort not in SORT_ORDERS:
+        source.reply(tr('list.unknown_sort', sort, ', '.join(SORT_ORDERS)))
+        return
+    plugins = list(cache.get_plugins_by_labels(labels, sort))
     for plugin in plugins:
         source.reply(plugin.meta.brief)
         source.reply('')
@@ -73,6 +124,7 @@ def list_plugins(source: CommandSource, labels: Optional[Union[None, str, List[s
 
 
 @ensure_cache_loaded
+@new_thread('MPMCommand')
 def search(source: CommandSource, query: str):
     plugins = list(cache.search(query))
     for plugin in plugins:
@@ -84,32 +136,207 @@ def search(source: CommandSource, query: str):
 
 @ensure_cache_loaded
 @ensure_plugin_id
+@new_thread('MPMCommand')
 def info(source: CommandSource, plugin_id: str):
-    source.reply(cache.get_plugin_by_id(plugin_id).meta.detail)
+    plugin = cache.get_plugin_by_id(plugin_id)
+    if plugin is None:
+        source.reply(tr('cache.shard.unavailable', plugin_id))
+        return
+    source.reply(plugin.meta.detail)
 
 
 @ensure_cache_loaded
 @ensure_plugin_id
+@new_thread('MPMCommand')
 def install(source: CommandSource, plugin_ids: List[str]):
+    from mcdreforged_plugin_manager.task.install_task import PluginInstaller
     installer = PluginInstaller(plugin_ids, source, upgrade=False)
     task_manager.manage_task(installer)
 
 
 @ensure_cache_loaded
 @ensure_plugin_installed
-@ensure_plugin_id
+@ensure_plugin_id(fallback=False)
+@new_thread('MPMCommand')
 def upgrade(source: CommandSource, plugin_ids: List[str]):
+    from mcdreforged_plugin_manager.task.install_task import PluginInstaller
     installer = PluginInstaller(plugin_ids, source, upgrade=True)
     task_manager.manage_task(installer)
 
 
 @ensure_cache_loaded
 @ensure_plugin_installed
+@new_thread('MPMCommand')
 def uninstall(source: CommandSource, plugin_ids: List[str]):
+    from mcdreforged_plugin_manager.task.uninstall_task import PluginUninstaller
+    for spec in plugin_ids:
+        if parse_plugin_spec(spec)[1] is not None:
+            source.reply(tr('uninstall.version_not_allowed', spec))
+            return
     uninstaller = PluginUninstaller(plugin_ids, source)
     task_manager.manage_task(uninstaller)
 
 
 @ensure_cache_loaded
+@new_thread('MPMCommand')
 def check_update(source: CommandSource):
+    from mcdreforged_plugin_manager.util.upgrade_helper import show_check_update_result
     show_check_update_result(source.reply)
+
+
+def refresh(source: CommandSource, cache_clock: Optional[CacheClock]):
+    """
+    :param cache_clock: the running cache clock, None if MPM is still starting
+    """
+    if cache_clock is None:
+        source.reply(tr('cache.not_loaded'))
+        return
+
+    def format_time(value: Optional[float]):
+        return timestamp(value) if value is not None else tr('cache.refresh.never')
+
+    def callback(success: bool):
+        if success:
+            source.reply(tr('cache.refresh.success', round(cache_clock.last_duration, 2)))
+        else:
+            source.reply(tr('cache.refresh.failed'))
+
+    source.reply(tr(
+        'cache.refresh.status',
+        format_time(cache_clock.last_success_time),
+        format_time(cache_clock.last_failure_time),
+        round(cache_clock.last_duration, 2) if cache_clock.last_duration is not None else '-'
+    ))
+    source.reply(tr('cache.refresh.triggered'))
+    cache_clock.trigger(callback)
+
+
+def show_changes(source: CommandSource, amount: int = 5):
+    history = cache.changes.get_history()
+    if len(history) == 0:
+        source.reply(tr('changes.empty'))
+        return
+    source.reply(tr('changes.title', min(amount, len(history)), len(history)))
+    for diff in reversed(history[-amount:]):
+        source.reply(tr(
+            'changes.summary', timestamp(diff.time), len(diff.added), len(diff.removed), len(diff.updated),
+            len(diff.changed)
+        ))
+        lines = [
+            ('changes.added', diff.added),
+            ('changes.removed', diff.removed),
+            ('changes.updated', [
+                '{} {} -> {}'.format(plugin_id, *versions) for plugin_id, versions in diff.updated.items()
+            ]),
+            ('changes.changed', diff.changed),
+        ]
+        for key, items in lines:
+            if len(items) > 0:
+                source.reply(indented(tr(key, ', '.join(items))))
+
+
+@new_thread('MPMCommand')
+def export_lock(source: CommandSource, path: Optional[str] = None):
+    from mcdreforged_plugin_manager.storage.lock import LockFile
+    path = path if path is not None else LockFile.DEFAULT_PATH
+    lock = LockFile.create()
+    lock.save(path)
+    source.reply(tr('lock.exported', len(lock.plugins), path))
+
+
+@ensure_cache_loaded
+@new_thread('MPMCommand')
+def apply_lock(source: CommandSource, path: Optional[str] = None):
+    from mcdreforged_plugin_manager.storage.lock import LockFile
+    from mcdreforged_plugin_manager.task.lock_task import LockApplier
+    path = path if path is not None else LockFile.DEFAULT_PATH
+    if not os.path.isfile(path):
+        source.reply(tr('lock.not_found', path))
+        return
+    try:
+        lock = LockFile.load(path)
+    except (ValueError, TypeError) as e:
+        source.reply(tr('lock.invalid', path, e))
+        return
+    task_manager.manage_task(LockApplier(lock, source))
+
+
+@new_thread('MPMDoctor')
+def doctor(source: CommandSource):
+    from mcdreforged_plugin_manager.storage.file_index import file_index
+    report = file_index.diagnose()
+    source.reply(tr('doctor.summary', report.files, report.hashed, round(report.duration, 2)))
+    if report.is_healthy():
+        source.reply(tr('doctor.healthy'))
+        return
+    if len(report.drift) > 0:
+        source.reply(tr('doctor.drift'))
+        for plugin_id, reason, args in report.drift:
+            source.reply(indented(tr('doctor.' + reason, plugin_id, *args)))
+    if len(report.temp_files) > 0:
+        source.reply(tr('doctor.temp_files'))
+        for path, size in sorted(report.temp_files.items()):
+            source.reply(indented(tr('doctor.temp_file', path, round(size / 1024, 1))))
+    if len(report.duplicates) > 0:
+        source.reply(tr('doctor.duplicates'))
+        for plugin_id, files in sorted(report.duplicates.items()):
+            source.reply(indented(tr('doctor.duplicate', plugin_id, ', '.join(
+                '{} ({})'.format(path, version) for path, version in sorted(files)
+            ))))
+
+
+def show_auto_upgrade(source: CommandSource, auto_upgrader):
+    """
+    :param auto_upgrader: the running AutoUpgrader
+    """
+    settings = config.auto_upgrade
+    state = tr('auto_upgrade.status.enabled' if settings.enabled else 'auto_upgrade.status.disabled')
+    source.reply(tr('auto_upgrade.status.settings', state, ', '.join(settings.windows), settings.idle_minutes))
+    idle = auto_upgrader.players.get_idle_duration()
+    if idle is not None:
+        source.reply(tr('auto_upgrade.status.idle', round(idle / 60, 1)))
+    elif auto_upgrader.players.known:
+        source.reply(tr('auto_upgrade.status.players', len(auto_upgrader.players.players)))
+    else:
+        source.reply(tr('auto_upgrade.status.unknown'))
+    result = auto_upgrader.last_result
+    if result is None:
+        source.reply(tr('auto_upgrade.status.never'))
+    else:
+        source.reply(tr(
+            'auto_upgrade.status.last', timestamp(result.time),
+            tr('auto_upgrade.status.success' if result.success else 'auto_upgrade.status.failed'),
+            ', '.join(result.plugins), round(result.download_duration, 2), round(result.reload_duration, 2)
+        ))
+
+
+@ensure_stats_enabled
+def show_stats(source: CommandSource):
+    data = stats.serialize()
+    source.reply(tr('stats.title', timestamp(data['since'])))
+    for name, value in sorted(data['counters'].items()):
+        source.reply(tr('stats.counter', name, round(value, 2)))
+    for name, histogram in sorted(data['histograms'].items()):
+        source.reply(tr(
+            'stats.histogram', name, histogram['count'],
+            *[round(histogram[key] * 1000, 2) for key in ('average', 'p50', 'p95', 'max')]
+        ))
+    if data['histograms'].get('download', {}).get('total', 0) > 0:
+        throughput = data['counters'].get('download.bytes', 0) / 1024 / data['histograms']['download']['total']
+        source.reply(tr('stats.throughput', round(throughput, 1)))
+    if len(data['counters']) == 0 and len(data['histograms']) == 0:
+        source.reply(tr('stats.empty'))
+
+
+@ensure_stats_enabled
+def export_stats(source: CommandSource):
+    path = os.path.join(psi.get_data_folder(), 'stats.json')
+    with open(path, 'w', encoding='utf8') as f:
+        f.write(stats.to_json())
+    source.reply(tr('stats.exported', path))
+
+
+@ensure_stats_enabled
+def reset_stats(source: CommandSource):
+    stats.reset()
+    source.reply(tr('stats.reset'))
@@ -1,8 +1,8 @@
 import os
-from typing import Optional
+from threading import Lock
+from typing import Optional, List
 
 from mcdreforged.api.all import *
-from ruamel.yaml import YAML, CommentedMap
 
 from mcdreforged_plugin_manager.constants import psi
 
@@ -12,18 +12,67 @@ class ProxyConfig(Serializable):
     https: Optional[str] = None
 
 
+class StatsConfig(Serializable):
+    enabled: bool = False
+    log: bool = False
+
+
+class PrefetchConfig(Serializable):
+    enabled: bool = False
+    bandwidth_limit: Optional[int] = 512
+    max_size: int = 100
+
+
+class ShardedSourceConfig(Serializable):
+    enabled: bool = False
+    index: str = 'https://raw.githubusercontent.com/MCDReforged/PluginCatalogue/meta/everything_slim.json'
+    plugin: str = 'https://raw.githubusercontent.com/MCDReforged/PluginCatalogue/meta/{id}/{file}.json'
+
+
+class WheelhouseConfig(Serializable):
+    enabled: bool = False
+    max_size: int = 500
+
+
+class AutoUpgradeConfig(Serializable):
+    enabled: bool = False
+    windows: List[str] = ['03:00-06:00']
+    idle_minutes: int = 10
+    allow: List[str] = []
+    deny: List[str] = []
+
+
+class ThrottleConfig(Serializable):
+    bandwidth_limit: Optional[int] = None
+    max_connections: int = 4
+    pip_niceness: int = 10
+    pip_idle_io: bool = True
+
+
 class Configure(Serializable):
     CONFIG_PATH = os.path.join(psi.get_data_folder(), 'config.yml')
     DEFAULT_CONFIG = psi.open_bundled_file('resources/default_config.yml')
 
     permission: int = PermissionLevel.PHYSICAL_SERVER_CONTROL_LEVEL
     source: str = 'https://raw.githubusercontent.com/MCDReforged/PluginCatalogue/meta/everything.json'
+    sharded_source: ShardedSourceConfig = ShardedSourceConfig.get_default()
     timeout: int = 15
     cache_interval: int = 30
+    cache_jitter: int = 30
+    cache_max_backoff: int = 30
+    compress_cache: bool = True
+    shared_cache: Optional[str] = None
     check_update: bool = True
     install_path: str = 'plugins'
+    download_threads: int = 4
     proxy: ProxyConfig = ProxyConfig.get_default()
     release_download_url_template: str = '{url}'
+    fuzzy_fallback: bool = True
+    throttle: ThrottleConfig = ThrottleConfig.get_default()
+    prefetch: PrefetchConfig = PrefetchConfig.get_default()
+    wheelhouse: WheelhouseConfig = WheelhouseConfig.get_default()
+    auto_upgrade: AutoUpgradeConfig = AutoUpgradeConfig.get_default()
+    stats: StatsConfig = StatsConfig.get_default()
 
     @property
     def request_proxy(self) -> dict:
@@ -39,14 +88,17 @@ class Configure(Serializable):
 
     @classmethod
     def load(cls) -> 'Configure':
+        from ruamel.yaml import YAML
         if not os.path.isfile(cls.CONFIG_PATH):
             cls.__save_default()
         with open(cls.CONFIG_PATH, 'r', encoding='utf8') as f:
-            data = YAML().load(f)
+            # the safe loader is faster and returns plain python types
+            data = YAML(typ='safe').load(f)
         return cls.deserialize(data)
 
     @classmethod
     def __save_default(cls):
+        from ruamel.yaml import YAML, CommentedMap
         if not os.path.isdir(os.path.dirname(cls.CONFIG_PATH)):
             os.makedirs(os.path.dirname(cls.CONFIG_PATH))
         with open(cls.CONFIG_PATH, 'w+', encoding='utf8') as file:
@@ -54,4 +106,26 @@ class Configure(Serializable):
             YAML().dump(data, file)
 
 
-config = Configure.load()
+class ConfigureProxy:
+    """
+    Load the config on first attribute access instead of at import time, so importing MPM stays cheap
+    """
+    def __init__(self):
+        object.__setattr__(self, '_ConfigureProxy__instance', None)
+        object.__setattr__(self, '_ConfigureProxy__lock', Lock())
+
+    def get(self) -> Configure:
+        if self.__instance is None:
+            with self.__lock:
+                if self.__instance is None:
+                    object.__setattr__(self, '_ConfigureProxy__instance', Configure.load())
+        return self.__instance
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self.get(), name, value)
+
+
+config: Configure = ConfigureProxy()  # type: ignore
@@ -7,3 +7,5 @@ meta = psi.get_self_metadata()
 PREFIX = '!!mpm'
 
 PLUGIN_LABELS = ['information', 'tool', 'management', 'api']
+
+SORT_ORDERS = ['downloads', 'updated', 'name']
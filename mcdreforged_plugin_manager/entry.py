@@ -1,30 +1,72 @@
+from threading import Event
+from typing import Callable, Optional, List
+
 from mcdreforged.api.all import *
 
 from mcdreforged_plugin_manager import constants
 from mcdreforged_plugin_manager.commands import show_help_message, info, list_plugins, search, install, uninstall, \
-    upgrade, check_update
+    upgrade, check_update, refresh, show_stats, export_stats, reset_stats, export_lock, apply_lock, show_changes, \
+    doctor, show_auto_upgrade
 from mcdreforged_plugin_manager.config import config
-from mcdreforged_plugin_manager.constants import PLUGIN_LABELS, psi, meta
-from mcdreforged_plugin_manager.storage.cache import cache, cache_clock
+from mcdreforged_plugin_manager.constants import PLUGIN_LABELS, SORT_ORDERS
+from mcdreforged_plugin_manager.storage.cache import cache, CacheClock, create_cache_clock
+from mcdreforged_plugin_manager.storage.changes import ChangeFeed
+from mcdreforged_plugin_manager.storage.suggestion import SuggestionIndex, PrefixTrie
+from mcdreforged_plugin_manager.task.auto_upgrade import AutoUpgrader
 from mcdreforged_plugin_manager.task.task_manager import task_manager
 from mcdreforged_plugin_manager.util.translation_util import tr
 
 
+cache_clock: Optional[CacheClock] = None  # created by the startup thread
+auto_upgrader: Optional[AutoUpgrader] = None
+unloaded = Event()
+
+
+def get_argument_text(ctx: CommandContext) -> str:
+    """
+    Return the text typed after '!!mpm <subcommand> '
+    """
+    parts = ctx.command.split(' ', 2)
+    return parts[2] if len(parts) == 3 else ''
+
+
+def suggest_catalogue(trie_getter: Callable[[], PrefixTrie], multiple: bool = False):
+    return lambda src, ctx: SuggestionIndex.suggest(trie_getter(), get_argument_text(ctx), multiple)
+
+
+def suggest_installed(trie_getter: Callable[[], PrefixTrie], multiple: bool = False):
+    def suggestion(src: CommandSource, ctx: CommandContext):
+        # plugins can be loaded or unloaded outside MPM, this only rebuilds when the plugin list changes
+        cache.update_installed_suggestions()
+        return SuggestionIndex.suggest(trie_getter(), get_argument_text(ctx), multiple)
+
+    return suggestion
+
+
 def register_commands(server: PluginServerInterface):
     def get_literal(literal: str):
         return Literal(literal).requires(lambda src, ctx: src.has_permission(config.permission),
                                          lambda: tr('permission_denied'))
 
+    def get_sort_node(labels_getter: Callable[[CommandContext], Optional[List[str]]]):
+        return Literal('--sort').then(
+            Text('sort')
+            .suggests(lambda: SORT_ORDERS)
+            .runs(lambda src, ctx: list_plugins(src, labels_getter(ctx), ctx['sort']))
+        )
+
     server.register_command(
         Literal(constants.PREFIX)
         .runs(show_help_message)
         .then(
             get_literal('list')
             .runs(lambda src: list_plugins(src))
+            .then(get_sort_node(lambda ctx: None))
             .then(
                 Text('labels')
                 .suggests(lambda: PLUGIN_LABELS)
                 .runs(lambda src, ctx: list_plugins(src, ctx['labels'].split(',')))
+                .then(get_sort_node(lambda ctx: ctx['labels'].split(',')))
             )
         )
         .then(
@@ -38,7 +80,7 @@ def register_commands(server: PluginServerInterface):
             get_literal('info')
             .then(
                 Text('plugin_id')
-                .suggests(cache.get_plugin_ids)
+                .suggests(suggest_catalogue(lambda: cache.suggestions.catalogue))
                 .runs(lambda src, ctx: info(src, ctx['plugin_id']))
             )
         )
@@ -46,7 +88,7 @@ def register_commands(server: PluginServerInterface):
             get_literal('install')
             .then(
                 GreedyText('plugin_ids')
-                .suggests(lambda: [plugin_id for plugin_id in cache.get_plugin_ids() if plugin_id != meta.id])
+                .suggests(suggest_catalogue(lambda: cache.suggestions.installable, multiple=True))
                 .runs(lambda src, ctx: install(src, ctx['plugin_ids'].split(' ')))
             )
         )
@@ -54,7 +96,7 @@ def register_commands(server: PluginServerInterface):
             get_literal('upgrade')
             .then(
                 GreedyText('plugin_ids')
-                .suggests(lambda: [plugin_id for plugin_id in psi.get_plugin_list() if plugin_id != meta.id])
+                .suggests(suggest_installed(lambda: cache.suggestions.upgradable, multiple=True))
                 .runs(lambda src, ctx: upgrade(src, ctx['plugin_ids'].split(' ')))
             )
         )
@@ -62,7 +104,7 @@ def register_commands(server: PluginServerInterface):
             get_literal('uninstall')
             .then(
                 GreedyText('plugin_ids')
-                .suggests(lambda: [plugin_id for plugin_id in psi.get_plugin_list() if plugin_id != meta.id])
+                .suggests(suggest_installed(lambda: cache.suggestions.installed, multiple=True))
                 .runs(lambda src, ctx: uninstall(src, ctx['plugin_ids'].split(' ')))
             )
         )
@@ -74,17 +116,103 @@ def register_commands(server: PluginServerInterface):
             get_literal('checkupdate')
             .runs(check_update)
         )
+        .then(
+            get_literal('refresh')
+            .runs(lambda src: refresh(src, cache_clock))
+        )
+        .then(
+            get_literal('changes')
+            .runs(lambda src: show_changes(src))
+            .then(Integer('amount').at_min(1).runs(lambda src, ctx: show_changes(src, ctx['amount'])))
+        )
+        .then(
+            get_literal('lock')
+            .then(
+                Literal('export')
+                .runs(lambda src: export_lock(src))
+                .then(GreedyText('path').runs(lambda src, ctx: export_lock(src, ctx['path'])))
+            )
+            .then(
+                Literal('apply')
+                .runs(lambda src: apply_lock(src))
+                .then(GreedyText('path').runs(lambda src, ctx: apply_lock(src, ctx['path'])))
+            )
+        )
+        .then(
+            get_literal('stats')
+            .runs(show_stats)
+            .then(Literal('export').runs(export_stats))
+            .then(Literal('reset').runs(reset_stats))
+        )
+        .then(
+            get_literal('doctor')
+            .runs(doctor)
+        )
+        .then(
+            get_literal('autoupgrade')
+            .runs(lambda src: show_auto_upgrade(src, auto_upgrader))
+        )
     )
 
 
+@new_thread('MPMStartup')
+def start(old_clock: Optional[CacheClock], old_changes: Optional[ChangeFeed], upgrader: AutoUpgrader,
+          inherited: bool):
+    """
+    Load the config and the catalogue, then start the cache clock and the auto upgrader, outside the MCDR thread
+    :param inherited: whether the auto upgrader inherited the player set from the previous plugin instance
+    """
+    global cache_clock
+    clock = create_cache_clock()
+    if old_clock is not None:
+        clock.inherit(old_clock)
+    if old_changes is not None:
+        cache.changes.inherit(old_changes)
+    if not cache.load_local():
+        cache.refresh()
+    if unloaded.is_set():
+        return
+    clock.start()
+    cache_clock = clock
+    if config.auto_upgrade.enabled:
+        if not inherited:
+            upgrader.players.reset()  # asks rcon for the online players
+        upgrader.start()
+
+
 def on_load(server: PluginServerInterface, old):
-    if hasattr(old, 'cache_clock'):
-        cache_clock.last_update_time = old.cache_clock.last_update_time
-    cache_clock.start()
-    cache.cache()
+    global auto_upgrader
     register_commands(server)
     server.register_help_message(constants.PREFIX, tr('help_summary'))
+    # created here, so the player events are tracked while starting up
+    auto_upgrader = AutoUpgrader()
+    old_upgrader = getattr(old, 'auto_upgrader', None)
+    if old_upgrader is not None:
+        auto_upgrader.inherit(old_upgrader)
+    old_cache = getattr(old, 'cache', None)
+    start(getattr(old, 'cache_clock', None), getattr(old_cache, 'changes', None), auto_upgrader,
+          old_upgrader is not None)
 
 
 def on_unload(server: PluginServerInterface):
-    cache_clock.stop()
+    unloaded.set()
+    if cache_clock is not None:
+        cache_clock.stop()
+    if auto_upgrader is not None:
+        auto_upgrader.stop()
+
+
+def on_server_start(server: PluginServerInterface):
+    auto_upgrader.players.reset(empty=True)
+
+
+def on_server_stop(server: PluginServerInterface, return_code: int):
+    auto_upgrader.players.reset(empty=True)
+
+
+def on_player_joined(server: PluginServerInterface, player: str, info: Info):
+    auto_upgrader.players.on_joined(player)
+
+
+def on_player_left(server: PluginServerInterface, player: str):
+    auto_upgrader.players.on_left(player)
@@ -1,104 +1,443 @@
-import json
 import os
+import random
+import tempfile
 import time
-from threading import Event, Thread
-from typing import Callable
+from threading import Event, Thread, Lock
+from typing import Callable, Optional, List, Any, Tuple, Iterable, Union
 
-from mcdreforged.api.all import *
+from mcdreforged.plugin.meta.version import Version, VersionParsingError
 
 from mcdreforged_plugin_manager.config import config
-from mcdreforged_plugin_manager.constants import psi
-from mcdreforged_plugin_manager.storage.plugin import PluginStorage, Plugin
-from mcdreforged_plugin_manager.util.file_util import unzip
+from mcdreforged_plugin_manager.constants import psi, meta
+from mcdreforged_plugin_manager.storage.changes import CatalogueDiff, ChangeFeed, CATALOGUE_CHANGED_EVENT
+from mcdreforged_plugin_manager.storage.plugin import PluginStorage, Plugin, PluginGeneration
+from mcdreforged_plugin_manager.storage.shard import shards, get_index_version
+from mcdreforged_plugin_manager.storage.suggestion import SuggestionIndex
+from mcdreforged_plugin_manager.util.file_util import unzip, get_compression, open_text, gzip_file, FileLock
+from mcdreforged_plugin_manager.util.json_util import iter_object_items
 from mcdreforged_plugin_manager.util.network_util import download_file
+from mcdreforged_plugin_manager.util.stats_util import stats
 from mcdreforged_plugin_manager.util.translation_util import tr
 
 
 class CacheClock(Thread):
-    def __init__(self, interval: int, event: Callable) -> None:
+    """
+    A scheduler that calls the event every interval, with random jitter, and exponential backoff on failure
+    """
+    RETRY_INTERVAL = 30  # the delay before the first retry after a failure (unit: second)
+
+    def __init__(self, interval: int, event: Callable[[], bool], jitter: int = 0,
+                 max_backoff: Optional[int] = None) -> None:
+        """
+        :param interval: the interval between each successful event (unit: second)
+        :param event: the event to call, should return whether the event is successful
+        :param jitter: the upper bound of the random delay added to each interval (unit: second)
+        :param max_backoff: the upper bound of the retry delay after failures (unit: second)
+        """
         super().__init__()
         self.setDaemon(True)
         self.setName('MPMCacheClock')
         self.interval = interval
+        self.jitter = jitter
+        self.max_backoff = max_backoff if max_backoff is not None else interval
         self.event = event
+        self.failures = 0
+        self.last_success_time: Optional[float] = None  # timestamp of the last successful event
+        self.last_failure_time: Optional[float] = None  # timestamp of the last failed event
+        self.last_duration: Optional[float] = None  # duration of the last event (unit: second)
         self.last_update_time = time.monotonic()
+        self.next_update_time = self.last_update_time + self.__get_delay()
+        self.__callbacks: List[Callable[[bool], Any]] = []
+        self.__callbacks_lock = Lock()
         self.__stop_event = Event()
+        self.__wake_event = Event()
+
+    def __get_delay(self) -> float:
+        if self.failures == 0:
+            delay = self.interval
+        else:
+            delay = min(self.RETRY_INTERVAL * 2 ** (self.failures - 1), self.max_backoff)
+        return delay + random.uniform(0, self.jitter)
 
     def reset_timer(self):
         self.last_update_time = time.monotonic()
+        self.next_update_time = self.last_update_time + self.__get_delay()
+
+    def inherit(self, old: 'CacheClock'):
+        """
+        Inherit the schedule and stats from the clock of the previous plugin instance
+        """
+        self.last_update_time = old.last_update_time
+        self.next_update_time = getattr(old, 'next_update_time', self.last_update_time + self.__get_delay())
+        for key in ('failures', 'last_success_time', 'last_failure_time', 'last_duration'):
+            if hasattr(old, key):
+                setattr(self, key, getattr(old, key))
+
+    def trigger(self, callback: Optional[Callable[[bool], Any]] = None):
+        """
+        Call the event as soon as possible in the clock thread
+        :param callback: called with whether the event is successful after the event
+        """
+        if callback is not None:
+            with self.__callbacks_lock:
+                self.__callbacks.append(callback)
+        self.__wake_event.set()
+
+    def __tick(self):
+        with self.__callbacks_lock:
+            callbacks, self.__callbacks = self.__callbacks, []
+        start = time.monotonic()
+        try:
+            success = self.event()
+        except Exception as e:
+            psi.logger.exception(tr('cache.exception', e))
+            success = False
+        self.last_duration = time.monotonic() - start
+        stats.record('cache.refresh', self.last_duration)
+        if success:
+            self.failures = 0
+            self.last_success_time = time.time()
+        else:
+            self.failures += 1
+            self.last_failure_time = time.time()
+        self.reset_timer()
+        for callback in callbacks:
+            callback(success)
 
     def run(self):
         self.__stop_event.clear()
         psi.logger.info(tr('cache.clock.started', self.interval))
-        while True:
-            while True:
-                if self.__stop_event.wait(1):
-                    return
-                if time.monotonic() - self.last_update_time > self.interval:
-                    break
-            self.event()
-            self.reset_timer()
+        while not self.__stop_event.is_set():
+            delay = self.next_update_time - time.monotonic()
+            if delay > 0 and not self.__wake_event.wait(delay):
+                continue
+            if self.__stop_event.is_set():
+                return
+            self.__wake_event.clear()
+            self.__tick()
 
     def stop(self):
         self.__stop_event.set()
+        self.__wake_event.set()
+
+
+class RefreshFlight:
+    """
+    A catalogue refresh in progress, which concurrent refresh requests join instead of downloading again
+    """
+    def __init__(self):
+        self.result: Optional[bool] = None
+        self.__done = Event()
+
+    def finish(self, result: bool):
+        self.result = result
+        self.__done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[bool]:
+        """
+        :param timeout: the upper bound of waiting (unit: second), None to wait until the refresh finishes
+        :return: whether the catalogue is successfully updated, None if the refresh doesn't finish within the timeout
+        """
+        self.__done.wait(timeout)
+        return self.result
 
 
 class Cache(PluginStorage):
-    CACHE_PATH = os.path.join(psi.get_data_folder(), 'everything.json')
-    TMP_CACHE_PATH = os.path.join(psi.get_data_folder(), 'everything.json.tmp')
+    CACHE_PATH = os.path.join(psi.get_data_folder(), 'everything.json')  # with .gz or .xz suffix if compressed
+    INDEX_PATH = os.path.join(psi.get_data_folder(), 'index.json')  # the index of the sharded source
+    CACHE_SUFFIXES = ('', '.gz', '.xz')
 
     def __init__(self):
+        super().__init__()
         self.loaded = False
+        self.suggestions = SuggestionIndex()
+        self.changes = ChangeFeed()
+        self.__flight: Optional[RefreshFlight] = None
+        self.__flight_lock = Lock()
+        self.__stamp: Optional[Tuple[str, int, int]] = None  # the stamp of the loaded catalogue file
+        self.__fetch_lock = Lock()
+        self.__publish_lock = Lock()
+
+    def refresh(self, timeout: Optional[float] = None) -> bool:
+        """
+        Refresh the plugin catalogue in the current thread, or wait for the refresh in progress and take its result
+        :param timeout: the upper bound of waiting for the refresh in progress (unit: second), None for no limit
+        :return: whether the catalogue is successfully updated, False if the refresh doesn't finish within the timeout
+        """
+        flight, leader = self.__join_flight()
+        if leader:
+            self.__fly(flight)
+        return flight.wait(timeout) is True
 
-    @new_thread('MPMCache')
-    def cache(self):
-        before = self.plugin_amount
+    def __join_flight(self) -> Tuple[RefreshFlight, bool]:
+        """
+        :return: the refresh in progress or a new one, and whether the caller should do the new refresh
+        """
+        with self.__flight_lock:
+            if self.__flight is not None:
+                stats.increase('cache.refresh.joined')
+                return self.__flight, False
+            self.__flight = RefreshFlight()
+            return self.__flight, True
+
+    def __fly(self, flight: RefreshFlight):
+        result = False
+        try:
+            result = self.__refresh()
+        finally:
+            with self.__flight_lock:
+                self.__flight = None
+            flight.finish(result)
+        if result and config.prefetch.enabled:
+            from mcdreforged_plugin_manager.storage.staging import staging
+            staging.start_prefetch()
 
+    def __refresh(self) -> bool:
+        if config.shared_cache is None:
+            success = self.__download()
+        else:
+            with FileLock(self.get_cache_path() + '.lock'):
+                if self.__get_stamp() != self.__stamp and self.is_cache_fresh():
+                    # refreshed by another MCDR instance within the cache interval
+                    psi.logger.info(tr('cache.shared'))
+                    stats.increase('cache.shared')
+                    success = True
+                else:
+                    success = self.__download()
+        if not success:
+            return False
+
+        diff = self.__load()
+        if diff is not None:
+            psi.logger.info(tr(
+                'cache.changed', len(diff.added), len(diff.removed), len(diff.updated), len(diff.changed)
+            ))
+        elif self.loaded:
+            psi.logger.info(tr('cache.cached', self.plugin_amount))
+
+        if config.check_update:
+            from mcdreforged_plugin_manager.util import upgrade_helper
+            upgrade_helper.show_check_update_result(psi.logger.info)
+
+        if stats.enabled and config.stats.log:
+            psi.logger.info(tr('stats.log', stats.summary()))
+        return self.loaded
+
+    def __download(self) -> bool:
+        """
+        Download the catalogue and replace the one on disk
+        :return: whether the catalogue is successfully downloaded
+        """
         psi.logger.info(tr('cache.cache'))
 
+        # a unique temp file, in case a refresh of the previous plugin instance is still running
+        folder, file_name = os.path.split(self.get_cache_path())
+        os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=file_name + '.', suffix='.tmp', dir=folder)
+        os.close(fd)
+        source = config.sharded_source.index if config.sharded_source.enabled else config.source
         try:
-            download_file(config.source, self.TMP_CACHE_PATH)
+            download_file(source, temp_path, keep_encoding=True)
         except Exception as e:
+            os.remove(temp_path)
             psi.say(tr('cache.exception_ingame'))
             psi.logger.warning(tr('cache.exception', e))
-        else:
-            # remove cache if exist
-            if os.path.exists(self.CACHE_PATH) and os.path.isfile(self.CACHE_PATH):
-                os.remove(self.CACHE_PATH)
-            os.rename(self.TMP_CACHE_PATH, self.CACHE_PATH)
+            return False
+        self.__store(temp_path)
+        return True
+
+    def get_cache_path(self) -> str:
+        """
+        :return: the path of the catalogue without the compression suffix, in the shared cache directory if configured,
+        which is the index with a sharded source
+        """
+        path = self.INDEX_PATH if config.sharded_source.enabled else self.CACHE_PATH
+        if config.shared_cache is not None:
+            return os.path.join(config.shared_cache, os.path.basename(path))
+        return path
+
+    def get_cache_file(self) -> Optional[str]:
+        """
+        :return: the path of the catalogue on disk, None if absent
+        """
+        path = self.get_cache_path()
+        for suffix in self.CACHE_SUFFIXES:
+            if os.path.isfile(path + suffix):
+                return path + suffix
+        return None
+
+    def __get_stamp(self) -> Optional[Tuple[str, int, int]]:
+        """
+        :return: the path, modification time and size of the catalogue on disk, which changes with each download
+        """
+        path = self.get_cache_file()
+        if path is None:
+            return None
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
 
-            self.__load()
-            psi.logger.info(tr('cache.cached', self.plugin_amount - before))
+    def is_cache_fresh(self) -> bool:
+        """
+        :return: whether the catalogue on disk is downloaded within the cache interval
+        """
+        path = self.get_cache_file()
+        return path is not None and time.time() - os.path.getmtime(path) <= config.cache_interval * 60
 
-            if config.check_update:
-                from mcdreforged_plugin_manager.util import upgrade_helper
-                upgrade_helper.show_check_update_result(psi.logger.info)
+    def __store(self, path: str):
+        """
+        Replace the catalogue on disk with the downloaded file, which is kept as transferred if it's compressed
+        (gzip transfer encoding, or a .json.gz / .json.xz source), otherwise compressed if config.compress_cache is set
+        """
+        compression = get_compression(path)
+        if compression is None and config.compress_cache:
+            gzip_file(path, path + '.gz')
+            os.remove(path)
+            path, compression = path + '.gz', 'gz'
+        cache_path = self.get_cache_path()
+        target = cache_path + ('.' + compression if compression is not None else '')
+        for suffix in self.CACHE_SUFFIXES:
+            if cache_path + suffix != target and os.path.isfile(cache_path + suffix):
+                os.remove(cache_path + suffix)
+        os.replace(path, target)
 
-    def __load(self):
-        self.plugin_amount = 0
-        self.plugins.clear()
+    def load_local(self) -> bool:
+        """
+        Load the catalogue on disk if it is downloaded within the cache interval, e.g. by the previous plugin instance
+        or another MCDR instance sharing the cache directory, so reloading MPM doesn't need to download it again
+        :return: whether the catalogue is loaded
+        """
+        if not self.is_cache_fresh():
+            return False
+        self.__load()
+        return self.loaded
 
+    @stats.timed('cache.load')
+    def __load(self) -> Optional[CatalogueDiff]:
+        """
+        Load the catalogue on disk as a new generation of plugins
+        :return: the changes from the previous generation, None if there's no previous generation or loading failed
+        """
+        plugins = {}
+        pending = {}
+        sharded = config.sharded_source.enabled
         try:
-            with open(self.CACHE_PATH, 'r', encoding='utf8') as f:
-                data = json.load(f)
-            
-            for plugin in data['plugins'].values():
-                plugin = Plugin.create(plugin)
-                plugin_id = plugin.meta.id
-                self.plugins[plugin_id] = plugin
-                self.plugin_amount += 1
+            stamp = self.__get_stamp()
+            # raw plugin entries are decoded one by one and dropped once converted, instead of decoding the whole
+            # document first, so the peak memory stays close to the size of the loaded catalogue
+            with open_text(stamp[0]) as f:
+                for plugin_id, entry in iter_object_items(f, 'plugins'):
+                    if sharded:
+                        pending[plugin_id] = get_index_version(entry)
+                    else:
+                        plugin = Plugin.create(entry)
+                        plugins[plugin.meta.id] = plugin
         except Exception as e:
             psi.logger.warn(tr('cache.load_failed'))
             self.loaded = False
-        else:
+            return None
+
+        with self.__publish_lock:
+            previous = self.generation
+            if sharded:
+                # plugins fetched before keep their metadata until the index lists a new version
+                plugins = {
+                    plugin_id: plugin for plugin_id, plugin in previous.plugins.items()
+                    if pending.get(plugin_id) == plugin.meta.version
+                }
+            generation = PluginGeneration(plugins, pending, previous)
+            diff = None
+            if self.loaded:
+                with stats.timer('cache.load.diff'):
+                    diff = CatalogueDiff.compute(previous, generation)
+            # suggestions are immutable tries as well, rebuilt before the swap so they never lag behind the plugins
+            # names of pending plugins are unknown, their ids are suggested and fuzzily matched by id only
+            self.suggestions.rebuild_catalogue([
+                (plugin_id, generation.plugins[plugin_id].meta.name if plugin_id in generation.plugins else plugin_id)
+                for plugin_id in generation.plugin_ids
+            ], meta.id)
+            self.generation = generation
             self.loaded = True
+            self.__stamp = stamp
+        if sharded:
+            shards.clean(pending)
+        self.update_installed_suggestions(force=True)
+        if diff is not None and not diff.is_empty():
+            self.changes.append(diff)
+            psi.dispatch_event(CATALOGUE_CHANGED_EVENT, (diff,))
+        return diff
+
+    def update_installed_suggestions(self, force: bool = False):
+        """
+        Rebuild the suggestions of installed and upgradable plugins if the installed plugin list has changed
+        Never fetches, since it's called from suggestion callbacks: pending plugins are compared by their index version
+        :param force: rebuild even if the plugin list is unchanged, e.g. plugin versions have changed
+        """
+        plugin_list = tuple(psi.get_plugin_list())
+        if not force and plugin_list == self.suggestions.installed_key:
+            return
+        generation = self.generation
+        upgradable = []
+        for plugin_id in plugin_list:
+            version = generation.get_version(plugin_id)
+            if version is None:
+                continue
+            try:
+                if Version(version) > psi.get_plugin_metadata(plugin_id).version:
+                    upgradable.append(plugin_id)
+            except VersionParsingError:
+                continue  # a malformed version in the catalogue
+        self.suggestions.rebuild_installed(plugin_list, upgradable, meta.id)
+
+    def fetch_plugins(self, plugin_ids: Iterable[str]):
+        """
+        Fetch the pending plugins among the ids in parallel and publish them, so the following lookups are local
+        Does nothing if the source isn't sharded, since all plugins are loaded with the catalogue then
+        """
+        with self.__fetch_lock:
+            pending = self.generation.pending
+            versions = {plugin_id: pending[plugin_id] for plugin_id in plugin_ids if plugin_id in pending}
+            if len(versions) == 0:
+                return
+            with stats.timer('cache.shard.fetch'):
+                fetched = shards.fetch(versions)
+            with self.__publish_lock:
+                # a refresh may have published a new generation meanwhile, in which the versions may differ
+                generation = self.generation
+                fetched = {
+                    plugin_id: plugin for plugin_id, plugin in fetched.items()
+                    if generation.pending.get(plugin_id) == versions[plugin_id]
+                }
+                self.generation = generation.resolve(fetched)
+
+    def fetch_all_plugins(self):
+        self.fetch_plugins(self.generation.pending)
+
+    def get_plugin_by_id(self, plugin_id: str) -> Optional[Plugin]:
+        self.fetch_plugins([plugin_id])
+        return super().get_plugin_by_id(plugin_id)
+
+    def get_plugins_by_labels(self, labels: Optional[Union[None, str, List[str]]] = None,
+                              sort: Optional[str] = None) -> Iterable[Plugin]:
+        # labels, downloads and release dates are only known once fetched
+        self.fetch_all_plugins()
+        return super().get_plugins_by_labels(labels, sort)
+
+    def search(self, query: str) -> Iterable[Plugin]:
+        self.fetch_all_plugins()
+        return super().search(query)
 
 
 cache = Cache()
 
 
-def clock_callback():
-    cache.cache()
+def clock_callback() -> bool:
+    return cache.refresh()
 
 
-cache_clock = CacheClock(config.cache_interval * 60, event=clock_callback)
+def create_cache_clock() -> CacheClock:
+    return CacheClock(
+        config.cache_interval * 60,
+        event=clock_callback,
+        jitter=config.cache_jitter,
+        max_backoff=config.cache_max_backoff * 60
+    )
@@ -0,0 +1,75 @@
+import time
+from collections import deque
+from threading import Lock
+from typing import List, Dict, Deque
+
+from mcdreforged.api.all import *
+
+from mcdreforged_plugin_manager.storage.plugin import PluginGeneration
+
+# dispatched with the CatalogueDiff as the only argument after each refresh that changes the catalogue
+# other plugins can subscribe with server.register_event_listener(CATALOGUE_CHANGED_EVENT, callback)
+CATALOGUE_CHANGED_EVENT = LiteralEvent('mcdreforged_plugin_manager.catalogue_changed')
+
+
+class CatalogueDiff(Serializable):
+    """
+    The changes between two generations of the plugin catalogue
+    """
+    time: float = 0
+    added: List[str] = []  # plugin ids
+    removed: List[str] = []  # plugin ids
+    updated: Dict[str, List[str]] = {}  # plugin id -> [old version, new version]
+    changed: List[str] = []  # plugin ids whose metadata changed without a version bump
+
+    @classmethod
+    def compute(cls, old: PluginGeneration, new: PluginGeneration) -> 'CatalogueDiff':
+        """
+        Compare two generations, in a single pass over the new one
+        Plugins pending in either generation are compared by version only
+        """
+        diff = cls(time=time.time())
+        for plugin_id in new.plugin_ids:
+            previous_version = old.get_version(plugin_id)
+            version = new.get_version(plugin_id)
+            if previous_version is None:
+                diff.added.append(plugin_id)
+            elif previous_version != version:
+                diff.updated[plugin_id] = [previous_version, version]
+            else:
+                previous, plugin = old.plugins.get(plugin_id), new.plugins.get(plugin_id)
+                if previous is not None and plugin is not None and vars(previous.meta) != vars(plugin.meta):
+                    diff.changed.append(plugin_id)
+        if len(old) + len(diff.added) != len(new):  # otherwise nothing is removed
+            diff.removed = [plugin_id for plugin_id in old.plugin_ids if plugin_id not in new]
+        return diff
+
+    def is_empty(self) -> bool:
+        return len(self.added) == 0 and len(self.removed) == 0 and len(self.updated) == 0 and len(self.changed) == 0
+
+
+class ChangeFeed:
+    """
+    A bounded history of catalogue diffs, newest last
+    """
+    MAX_HISTORY = 20
+
+    def __init__(self):
+        self.__history: Deque[CatalogueDiff] = deque(maxlen=self.MAX_HISTORY)
+        self.__lock = Lock()
+
+    def append(self, diff: CatalogueDiff):
+        with self.__lock:
+            self.__history.append(diff)
+
+    def get_history(self) -> List[CatalogueDiff]:
+        with self.__lock:
+            return list(self.__history)
+
+    def inherit(self, old: 'ChangeFeed'):
+        """
+        Inherit the history from the feed of the previous plugin instance
+        """
+        history = [CatalogueDiff.deserialize(diff.serialize()) for diff in old.get_history()]
+        with self.__lock:
+            self.__history = deque([*history, *self.__history], maxlen=self.MAX_HISTORY)
@@ -0,0 +1,212 @@
+import ast
+import json
+import os
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, Optional, List, Tuple, Set
+
+from mcdreforged.api.all import *
+
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.constants import psi
+from mcdreforged_plugin_manager.util.file_util import get_file_sha256, read_zip_member
+
+PLUGIN_SUFFIXES = ('.mcdr', '.pyz', '.zip', '.py')
+TEMP_SUFFIXES = ('.temp', '.tmp')
+PLUGIN_META_FILE = 'mcdreforged.plugin.json'
+
+
+class IndexedFile(Serializable):
+    size: int = 0
+    mtime: int = 0  # unit: nanosecond
+    sha256: Optional[str] = None  # None for directory plugins
+    plugin_id: Optional[str] = None  # None if the plugin metadata cannot be read
+    version: Optional[str] = None
+
+
+class InstallRecord(Serializable):
+    path: str
+    version: str  # the catalogue version installed
+    sha256: str
+    time: float = 0
+
+
+class PluginFileIndexData(Serializable):
+    files: Dict[str, IndexedFile] = {}  # normalized absolute path -> file
+    installs: Dict[str, InstallRecord] = {}  # plugin id -> the file installed by MPM
+
+
+@dataclass
+class DoctorReport:
+    files: int  # amount of plugin files scanned
+    hashed: int  # amount of plugin files hashed, i.e. new or changed since the last scan
+    duration: float  # unit: second
+    drift: List[Tuple[str, str, tuple]] = field(default_factory=list)  # (plugin id, reason, arguments)
+    temp_files: Dict[str, int] = field(default_factory=dict)  # path -> size
+    duplicates: Dict[str, List[Tuple[str, Optional[str]]]] = field(default_factory=dict)  # id -> [(path, version)]
+
+    def is_healthy(self) -> bool:
+        return len(self.drift) == 0 and len(self.temp_files) == 0 and len(self.duplicates) == 0
+
+
+def normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def read_plugin_meta(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Read the id and the version of a plugin file or directory without loading it
+    :return: (None, None) if the metadata cannot be read
+    """
+    try:
+        if os.path.isdir(path):
+            with open(os.path.join(path, PLUGIN_META_FILE), 'r', encoding='utf8') as f:
+                plugin_meta = json.load(f)
+        elif path.endswith('.py'):
+            # a solo plugin, with the metadata in a PLUGIN_METADATA dict literal
+            with open(path, 'r', encoding='utf8') as f:
+                tree = ast.parse(f.read())
+            plugin_meta = next(
+                ast.literal_eval(node.value) for node in tree.body if isinstance(node, ast.Assign)
+                and any(isinstance(target, ast.Name) and target.id == 'PLUGIN_METADATA' for target in node.targets)
+            )
+        else:
+            plugin_meta = json.loads(read_zip_member(path, PLUGIN_META_FILE).decode('utf8'))
+        plugin_id, version = plugin_meta.get('id'), plugin_meta.get('version')
+    except (OSError, ValueError, KeyError, SyntaxError, StopIteration, AttributeError, zipfile.BadZipFile):
+        return None, None
+    return (str(plugin_id) if plugin_id is not None else None), (str(version) if version is not None else None)
+
+
+class PluginFileIndex:
+    """
+    A persistent index of the plugin files in the plugin directories, with their hashes and plugin versions,
+    and the files installed by MPM
+
+    Each scan only rehashes the files whose size or modification time changed since the last scan,
+    so checking a large plugin directory costs little more than listing it
+    """
+    INDEX_PATH = os.path.join(psi.get_data_folder(), 'plugin_files.json')
+
+    def __init__(self):
+        self.__data: Optional[PluginFileIndexData] = None
+        self.__lock = Lock()
+
+    def __get_data(self) -> PluginFileIndexData:
+        if self.__data is None:
+            try:
+                with open(self.INDEX_PATH, 'r', encoding='utf8') as f:
+                    self.__data = PluginFileIndexData.deserialize(json.load(f))
+            except (OSError, ValueError, TypeError):
+                self.__data = PluginFileIndexData()
+        return self.__data
+
+    def __save(self):
+        folder = os.path.dirname(self.INDEX_PATH)
+        os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='plugin_files.json.', suffix='.tmp', dir=folder)
+        with os.fdopen(fd, 'w', encoding='utf8') as f:
+            json.dump(self.__data.serialize(), f, ensure_ascii=False)
+        os.replace(temp_path, self.INDEX_PATH)
+
+    @staticmethod
+    def __index_file(path: str, stat: os.stat_result) -> IndexedFile:
+        plugin_id, version = read_plugin_meta(path)
+        return IndexedFile(
+            size=stat.st_size, mtime=stat.st_mtime_ns, sha256=get_file_sha256(path) if os.path.isfile(path) else None,
+            plugin_id=plugin_id, version=version
+        )
+
+    @staticmethod
+    def get_plugin_directories() -> Set[str]:
+        """
+        :return: the install path, and the directories of the loaded plugin files
+        """
+        folders = {normalize_path(config.install_path)}
+        for plugin_id in psi.get_plugin_list():
+            path = psi.get_plugin_file_path(plugin_id)
+            if path is not None:
+                folders.add(normalize_path(os.path.dirname(path)))
+        return {folder for folder in folders if os.path.isdir(folder)}
+
+    def record_install(self, plugin_id: str, path: str, version: str):
+        """
+        Record a plugin file just installed by MPM, which is indexed right away instead of hashed by the next scan
+        """
+        with self.__lock:
+            data = self.__get_data()
+            path = normalize_path(path)
+            indexed = IndexedFile(
+                size=os.path.getsize(path), mtime=os.stat(path).st_mtime_ns, sha256=get_file_sha256(path),
+                plugin_id=plugin_id, version=version
+            )
+            data.files[path] = indexed
+            data.installs[plugin_id] = InstallRecord(path=path, version=version, sha256=indexed.sha256,
+                                                     time=time.time())
+            self.__save()
+
+    def forget_install(self, plugin_id: str):
+        with self.__lock:
+            if self.__get_data().installs.pop(plugin_id, None) is not None:
+                self.__save()
+
+    def diagnose(self) -> DoctorReport:
+        """
+        Update the index and report drift from what MPM installed and what MCDR loaded,
+        orphaned temp files left by interrupted downloads, and plugins present in more than one file
+        """
+        start = time.monotonic()
+        temp_files: Dict[str, int] = {}
+        hashed = 0
+        with self.__lock:
+            data = self.__get_data()
+            files: Dict[str, IndexedFile] = {}
+            for folder in self.get_plugin_directories():
+                for entry in os.scandir(folder):
+                    if entry.is_file() and entry.name.endswith(TEMP_SUFFIXES):
+                        temp_files[entry.path] = entry.stat().st_size
+                        continue
+                    if entry.is_file() and entry.name.endswith(PLUGIN_SUFFIXES):
+                        stat = entry.stat()
+                    elif entry.is_dir() and os.path.isfile(os.path.join(entry.path, PLUGIN_META_FILE)):
+                        stat = os.stat(os.path.join(entry.path, PLUGIN_META_FILE))
+                    else:
+                        continue
+                    path = normalize_path(entry.path)
+                    indexed = data.files.get(path)
+                    if indexed is None or indexed.size != stat.st_size or indexed.mtime != stat.st_mtime_ns:
+                        indexed = self.__index_file(path, stat)
+                        hashed += 1
+                    files[path] = indexed
+            changed = hashed > 0 or files.keys() != data.files.keys()
+            data.files = files
+            if changed:
+                self.__save()
+            installs = dict(data.installs)
+
+        report = DoctorReport(files=len(files), hashed=hashed, duration=0, temp_files=temp_files)
+        for plugin_id, record in installs.items():
+            indexed = files.get(record.path)
+            if indexed is None:
+                report.drift.append((plugin_id, 'missing', (record.path,)))
+            elif indexed.sha256 != record.sha256:
+                report.drift.append((plugin_id, 'modified', (record.path, record.version)))
+        for plugin_id in psi.get_plugin_list():
+            path = psi.get_plugin_file_path(plugin_id)
+            indexed = files.get(normalize_path(path)) if path is not None else None
+            loaded_version = str(psi.get_plugin_metadata(plugin_id).version)
+            if indexed is not None and indexed.version is not None and indexed.version != loaded_version:
+                report.drift.append((plugin_id, 'not_reloaded', (loaded_version, indexed.version)))
+        by_id: Dict[str, List[Tuple[str, Optional[str]]]] = {}
+        for path, indexed in files.items():
+            if indexed.plugin_id is not None:
+                by_id.setdefault(indexed.plugin_id, []).append((path, indexed.version))
+        report.duplicates = {plugin_id: paths for plugin_id, paths in by_id.items() if len(paths) > 1}
+        report.duration = time.monotonic() - start
+        return report
+
+
+file_index = PluginFileIndex()
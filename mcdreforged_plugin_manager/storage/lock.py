@@ -0,0 +1,81 @@
+import json
+import os
+import time
+from typing import Dict, Optional, List
+
+from mcdreforged.api.all import *
+
+from mcdreforged_plugin_manager.constants import psi
+from mcdreforged_plugin_manager.storage.cache import cache
+from mcdreforged_plugin_manager.util.file_util import get_file_sha256
+from mcdreforged_plugin_manager.util.misc_util import parse_python_requirement, get_package_version
+
+
+class LockedPlugin(Serializable):
+    version: str
+    file_name: Optional[str] = None  # None if the plugin is not a single file, e.g. a directory plugin
+    sha256: Optional[str] = None
+
+
+class LockFile(Serializable):
+    """
+    A snapshot of the installed plugins, their exact versions and file hashes, and the installed versions of
+    the python packages they require, so the same plugin set can be reproduced on other servers
+    """
+    DEFAULT_PATH = os.path.join(psi.get_data_folder(), 'plugins.lock.json')
+
+    schema_version: int = 1
+    created_at: int = 0
+    mcdreforged: Optional[str] = None
+    plugins: Dict[str, LockedPlugin] = {}
+    packages: Dict[str, str] = {}  # package name -> installed version
+
+    @classmethod
+    def create(cls) -> 'LockFile':
+        """
+        Create a lockfile from the current state of the server
+        """
+        plugins: Dict[str, LockedPlugin] = {}
+        requirements: List[str] = []
+        plugin_list = psi.get_plugin_list()
+        cache.fetch_plugins(plugin_list)
+        for plugin_id in plugin_list:
+            version = str(psi.get_plugin_metadata(plugin_id).version)
+            path = psi.get_plugin_file_path(plugin_id)
+            if path is not None and os.path.isfile(path):
+                plugins[plugin_id] = LockedPlugin(
+                    version=version, file_name=os.path.basename(path), sha256=get_file_sha256(path)
+                )
+            else:
+                plugins[plugin_id] = LockedPlugin(version=version)
+            plugin = cache.get_plugin_by_id(plugin_id) if cache.is_plugin_present(plugin_id) else None
+            if plugin is not None:
+                release = plugin.release.get_release(version)
+                meta = release.meta if release is not None and release.meta is not None else plugin.meta
+                requirements.extend(meta.requirements)
+
+        packages: Dict[str, str] = {}
+        for line in requirements:
+            package = parse_python_requirement(line)[0].strip()
+            version = get_package_version(package)
+            if version is not None and not package.startswith('mcdreforged'):
+                packages[package] = str(version)
+
+        mcdr = psi.get_plugin_metadata('mcdreforged')
+        return cls(
+            created_at=int(time.time()),
+            mcdreforged=str(mcdr.version) if mcdr is not None else None,
+            plugins=plugins,
+            packages=packages
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'LockFile':
+        with open(path, 'r', encoding='utf8') as f:
+            return cls.deserialize(json.load(f))
+
+    def save(self, path: str):
+        if os.path.dirname(path) and not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(self.serialize(), f, indent=4, ensure_ascii=False)
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import List, Dict, Optional, Union, Iterable, TypeVar, Type, Callable
+from types import MappingProxyType
+from typing import List, Dict, Optional, Union, Iterable, TypeVar, Type, Callable, Mapping, Tuple
 
 from mcdreforged.minecraft.rtext.style import RColor
 from mcdreforged.minecraft.rtext.text import RText, RTextList, RTextBase
@@ -13,8 +14,9 @@ from mcdreforged_plugin_manager.dependency_checker import DependencyChecker, Dep
 from mcdreforged_plugin_manager.storage.release import ReleaseSummary
 from mcdreforged_plugin_manager.util.mcdr_util import is_plugin_loaded
 from mcdreforged_plugin_manager.util.misc_util import parse_python_requirement
+from mcdreforged_plugin_manager.util.stats_util import stats
 from mcdreforged_plugin_manager.util.text_util import command_run, link, new_line, parse_markdown, insert_new_lines, \
-    bold
+    bold, parse_time
 from mcdreforged_plugin_manager.util.translation_util import tr
 
 
@@ -97,6 +99,7 @@ class MetaInfo(Serializable):
         )
 
     @property
+    @stats.timed('render.brief')
     def brief(self) -> RTextList:
         """
         Get brief plugin info (used in !!mpm list)
@@ -108,6 +111,7 @@ class MetaInfo(Serializable):
         )
 
     @property
+    @stats.timed('render.detail')
     def detail(self) -> RTextBase:
         """
         Get detailed plugin info (used in !!mpm info)
@@ -241,29 +245,145 @@ class Plugin(Serializable):
         return cls(meta=meta, release=release)
 
 
-class PluginStorage(Serializable):
-    plugin_amount: int = 0
-    plugins: Dict[str, Plugin] = {}  # plugin id -> plugin
+@dataclass(frozen=True)
+class PluginSortKey:
+    downloads: int  # total downloads of all releases
+    updated: float  # timestamp of the latest release, 0 if there's no release
+    name: str  # case folded plugin name
 
-    def get_plugins_by_labels(self, labels: Optional[Union[None, str, List[str]]] = None) -> Iterable[Plugin]:
+    @classmethod
+    def of(cls, plugin: Plugin) -> 'PluginSortKey':
+        releases = plugin.release.releases
+        return cls(
+            downloads=sum(release.asset.download_count for release in releases),
+            updated=max((parse_time(release.created_at) for release in releases), default=0),
+            name=plugin.meta.name.casefold()
+        )
+
+
+class PluginGeneration:
+    """
+    An immutable snapshot of the plugin catalogue and its derived indexes
+
+    A refresh builds a new generation and publishes it with a single reference assignment, so readers never lock,
+    and a reader holding a generation always sees a complete catalogue, whatever refreshes happen meanwhile
+
+    With a sharded source, plugins only known by id and version from the index are pending until fetched.
+    Fetching publishes a new generation with the fetched plugins resolved, see resolve
+
+    The sorted views of !!mpm list are built here too, so listing never sorts, and release dates are parsed once
+    per plugin instead of on each comparison
+    """
+    __slots__ = ('plugins', 'pending', 'plugin_ids', 'label_index', 'sort_keys', 'sorted_views')
+
+    def __init__(self, plugins: Optional[Dict[str, Plugin]] = None, pending: Optional[Dict[str, str]] = None,
+                 previous: Optional['PluginGeneration'] = None):
+        """
+        :param plugins: plugin id -> plugin, copied so later changes to the dict don't leak into the generation
+        :param pending: plugin id -> version of the plugins not fetched yet
+        :param previous: the generation this one is derived from, whose sort keys are reused for the same plugins
+        """
+        plugins = dict(plugins) if plugins is not None else {}
+        pending = {plugin_id: version for plugin_id, version in (pending or {}).items() if plugin_id not in plugins}
+        label_index: Dict[str, List[Plugin]] = {}
+        for plugin in plugins.values():
+            for label in plugin.meta.labels:
+                label_index.setdefault(label, []).append(plugin)
+        self.plugins: Mapping[str, Plugin] = MappingProxyType(plugins)
+        self.pending: Mapping[str, str] = MappingProxyType(pending)
+        self.plugin_ids: Tuple[str, ...] = (*plugins.keys(), *pending.keys())
+        self.label_index: Mapping[str, Tuple[Plugin, ...]] = MappingProxyType({
+            label: tuple(label_plugins) for label, label_plugins in label_index.items()
+        })
+        sort_keys: Dict[str, PluginSortKey] = {}
+        for plugin_id, plugin in plugins.items():
+            if previous is not None and previous.plugins.get(plugin_id) is plugin:
+                sort_keys[plugin_id] = previous.sort_keys[plugin_id]
+            else:
+                sort_keys[plugin_id] = PluginSortKey.of(plugin)
+        self.sort_keys: Mapping[str, PluginSortKey] = MappingProxyType(sort_keys)
+        # stable sorts, so plugins with equal keys stay in the order of the catalogue
+        self.sorted_views: Mapping[str, Tuple[Plugin, ...]] = MappingProxyType({
+            'downloads': tuple(sorted(plugins.values(), key=lambda p: sort_keys[p.meta.id].downloads, reverse=True)),
+            'updated': tuple(sorted(plugins.values(), key=lambda p: sort_keys[p.meta.id].updated, reverse=True)),
+            'name': tuple(sorted(plugins.values(), key=lambda p: (sort_keys[p.meta.id].name, p.meta.id))),
+        })
+
+    def __len__(self):
+        return len(self.plugin_ids)
+
+    def __contains__(self, plugin_id: str) -> bool:
+        return plugin_id in self.plugins or plugin_id in self.pending
+
+    def get_version(self, plugin_id: str) -> Optional[str]:
+        """
+        :return: the catalogue version of the plugin, fetched or not, None if absent
+        """
+        plugin = self.plugins.get(plugin_id)
+        return plugin.meta.version if plugin is not None else self.pending.get(plugin_id)
+
+    def resolve(self, fetched: Dict[str, Plugin]) -> 'PluginGeneration':
+        """
+        :param fetched: plugin id -> plugin fetched for a pending plugin of this generation
+        :return: a new generation with the fetched plugins no longer pending
+        """
+        fetched = {plugin_id: plugin for plugin_id, plugin in fetched.items() if plugin_id in self.pending}
+        if len(fetched) == 0:
+            return self
+        plugins = {
+            plugin_id: fetched[plugin_id] if plugin_id in fetched else self.plugins[plugin_id]
+            for plugin_id in self.plugin_ids if plugin_id in fetched or plugin_id in self.plugins
+        }  # in the order of the index, whatever order the plugins are fetched in
+        return PluginGeneration(plugins, self.pending, self)
+
+
+class PluginStorage:
+    def __init__(self):
+        self.generation = PluginGeneration()
+
+    @property
+    def plugins(self) -> Mapping[str, Plugin]:
+        """
+        plugin id -> plugin of the current generation, read-only
+        """
+        return self.generation.plugins
+
+    @property
+    def plugin_amount(self) -> int:
+        return len(self.generation)
+
+    def get_plugins_by_labels(self, labels: Optional[Union[None, str, List[str]]] = None,
+                              sort: Optional[str] = None) -> Iterable[Plugin]:
+        """
+        :param sort: one of SORT_ORDERS, None for the catalogue order
+        """
         if labels is None:
             labels = PLUGIN_LABELS
         if isinstance(labels, str):
             labels = [labels]
-        for plugin in self.plugins.values():
+        generation = self.generation
+        if sort is not None:
+            for plugin in generation.sorted_views[sort]:
+                if any([label in labels for label in plugin.meta.labels]):
+                    yield plugin
+            return
+        if len(labels) == 1:
+            yield from generation.label_index.get(labels[0], ())
+            return
+        for plugin in generation.plugins.values():
             if any([label in labels for label in plugin.meta.labels]):
                 yield plugin
 
     def search(self, query: str) -> Iterable[Plugin]:
-        for plugin in self.plugins.values():
+        for plugin in self.generation.plugins.values():
             if query in plugin.meta.name or query in plugin.meta.id or query in plugin.meta.description:
                 yield plugin
 
     def is_plugin_present(self, plugin_id: str) -> bool:
-        return plugin_id in self.plugins.keys()
+        return plugin_id in self.generation
 
     def get_plugin_by_id(self, plugin_id: str) -> Optional[Plugin]:
-        return self.plugins.get(plugin_id)
+        return self.generation.plugins.get(plugin_id)
 
     def get_plugin_ids(self) -> List[str]:
-        return list(self.plugins.keys())
+        return list(self.generation.plugin_ids)
@@ -1,9 +1,8 @@
-from typing import List, Optional
+import bisect
+from typing import List, Optional, Tuple, Iterable, Callable, Dict
 
-import requests
 from mcdreforged.api.all import *
-
-from mcdreforged_plugin_manager.config import config
+from mcdreforged.plugin.meta.version import Version, VersionRequirement, VersionParsingError
 
 
 class AssetInfo(Serializable):
@@ -14,6 +13,16 @@ class AssetInfo(Serializable):
     browser_download_url: str
 
 
+class ReleaseMetaInfo(Serializable):
+    """
+    The plugin meta of a specific release
+    """
+    id: str
+    version: str
+    dependencies: Dict[str, str] = {}
+    requirements: List[str] = []
+
+
 class ReleaseInfo(Serializable):
     url: str
     name: str
@@ -22,6 +31,18 @@ class ReleaseInfo(Serializable):
     asset: AssetInfo
     description: Optional[str]
     prerelease: bool
+    meta: Optional[ReleaseMetaInfo] = None
+
+    def get_version(self) -> Optional[Version]:
+        """
+        Parse the version from the release meta, or from the tag name (e.g. v1.2.0) if the meta is absent
+        :return: None if the version cannot be parsed
+        """
+        text = self.meta.version if self.meta is not None else self.tag_name.lstrip('vV')
+        try:
+            return Version(text, allow_wildcard=False)
+        except VersionParsingError:
+            return None
 
 
 class ReleaseSummary(Serializable):
@@ -33,3 +54,94 @@ class ReleaseSummary(Serializable):
         if self.latest_version_index is not None:
             return self.releases[self.latest_version_index]
         return None
+
+    def __get_index(self) -> Tuple[List[Version], List[ReleaseInfo]]:
+        """
+        Releases with parsable versions sorted by version in ascending order, built on first use
+        :return: the sorted versions and the releases at the same positions
+        """
+        index = getattr(self, '_ReleaseSummary__index', None)
+        if index is None:
+            pairs = []
+            for release in self.releases:
+                version = release.get_version()
+                if version is not None:
+                    pairs.append((version, release))
+            pairs.sort(key=lambda pair: pair[0])
+            index = self.__index = ([version for version, _ in pairs], [release for _, release in pairs])
+        return index
+
+    def get_release(self, version: str) -> Optional[ReleaseInfo]:
+        """
+        Find the release of the exact version with binary search
+        """
+        versions, releases = self.__get_index()
+        try:
+            target = Version(version, allow_wildcard=False)
+        except VersionParsingError:
+            return None
+        position = bisect.bisect_left(versions, target)
+        if position < len(versions) and versions[position] == target:
+            return releases[position]
+        return None
+
+    @staticmethod
+    def __get_bounds(versions: List[Version], requirement: str) -> Tuple[int, int]:
+        """
+        Narrow down the range of candidates with binary search from the comparison criteria in the requirement
+        Criteria without a simple bound (e.g. ^, ~ and wildcards) are left to VersionRequirement.accept
+        :return: the range [lower, upper) of indexes in versions
+        """
+        lower, upper = 0, len(versions)
+        for criterion in requirement.split(' '):
+            for operator in ('>=', '<=', '==', '>', '<', '='):
+                if criterion.startswith(operator):
+                    break
+            else:
+                continue
+            try:
+                version = Version(criterion[len(operator):], allow_wildcard=False)
+            except VersionParsingError:
+                continue
+            if operator == '>=':
+                lower = max(lower, bisect.bisect_left(versions, version))
+            elif operator == '>':
+                lower = max(lower, bisect.bisect_right(versions, version))
+            elif operator == '<':
+                upper = min(upper, bisect.bisect_left(versions, version))
+            elif operator == '<=':
+                upper = min(upper, bisect.bisect_right(versions, version))
+            else:
+                lower = max(lower, bisect.bisect_left(versions, version))
+                upper = min(upper, bisect.bisect_right(versions, version))
+        return lower, upper
+
+    def get_newest_release(self, requirements: Iterable[str] = (),
+                           predicate: Optional[Callable[[ReleaseInfo], bool]] = None,
+                           allow_prerelease: bool = False) -> Optional[ReleaseInfo]:
+        """
+        Find the newest release satisfying all version requirements and the predicate
+        :param requirements: version requirements like '>=1.0.0 <2.0.0'
+        :param predicate: an extra check of each candidate, e.g. the required MCDR version
+        :param allow_prerelease: whether prereleases can be selected
+        """
+        versions, releases = self.__get_index()
+        requirements = [requirement for requirement in requirements if requirement]
+        try:
+            checkers = [VersionRequirement(requirement) for requirement in requirements]
+        except VersionParsingError:
+            return None
+        lower, upper = 0, len(versions)
+        for requirement in requirements:
+            bounds = self.__get_bounds(versions, requirement)
+            lower, upper = max(lower, bounds[0]), min(upper, bounds[1])
+        for position in range(upper - 1, lower - 1, -1):
+            release = releases[position]
+            if release.prerelease and not allow_prerelease:
+                continue
+            if not all(checker.accept(versions[position]) for checker in checkers):
+                continue
+            if predicate is not None and not predicate(release):
+                continue
+            return release
+        return None
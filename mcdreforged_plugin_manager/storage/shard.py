@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Iterable, Tuple
+
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.constants import psi
+from mcdreforged_plugin_manager.storage.plugin import Plugin
+from mcdreforged_plugin_manager.util.network_util import get_json
+from mcdreforged_plugin_manager.util.stats_util import stats
+from mcdreforged_plugin_manager.util.translation_util import tr
+
+# the files of a plugin in the sharded source, which together form a AllOfAPlugin object
+SHARD_FILES = ('meta', 'plugin', 'release', 'repository')
+
+
+def get_index_version(entry) -> str:
+    """
+    :param entry: the entry of a plugin in the index, which is the version, or an object with the version in
+    version or meta.version
+    """
+    if isinstance(entry, str):
+        return entry
+    if 'version' in entry:
+        return str(entry['version'])
+    return str(entry['meta']['version'])
+
+
+class ShardStore:
+    """
+    Per-plugin metadata of the sharded source, fetched on demand and cached on disk as {plugin id}.json,
+    which is reused as long as the index lists the same version of the plugin
+    """
+    SHARD_PATH = os.path.join(psi.get_data_folder(), 'shards')
+
+    def get_folder(self) -> str:
+        if config.shared_cache is not None:
+            return os.path.join(config.shared_cache, 'shards')
+        return self.SHARD_PATH
+
+    def __get_path(self, plugin_id: str) -> str:
+        return os.path.join(self.get_folder(), plugin_id + '.json')
+
+    def load(self, plugin_id: str, version: str) -> Optional[Plugin]:
+        """
+        :return: the plugin cached on disk, None if absent, unreadable or of another version
+        """
+        try:
+            with open(self.__get_path(plugin_id), 'r', encoding='utf8') as f:
+                data = json.load(f)
+            if data['version'] != version:
+                return None
+            return Plugin.create(data['plugin'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def __store(self, plugin_id: str, version: str, all_of_a_plugin: dict):
+        folder = self.get_folder()
+        os.makedirs(folder, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=plugin_id + '.json.', suffix='.tmp', dir=folder)
+        with os.fdopen(fd, 'w', encoding='utf8') as f:
+            json.dump({'version': version, 'plugin': all_of_a_plugin}, f)
+        os.replace(temp_path, self.__get_path(plugin_id))
+
+    def __fetch_one(self, plugin_id: str, version: str) -> Tuple[str, Optional[Plugin]]:
+        plugin = self.load(plugin_id, version)
+        if plugin is not None:
+            stats.increase('cache.shard.hits')
+            return plugin_id, plugin
+        try:
+            all_of_a_plugin = {
+                file: get_json(config.sharded_source.plugin.format(id=plugin_id, file=file)) for file in SHARD_FILES
+            }
+            plugin = Plugin.create(all_of_a_plugin)
+        except Exception as e:
+            psi.logger.warning(tr('cache.shard.exception', plugin_id, e))
+            return plugin_id, None
+        stats.increase('cache.shard.fetches')
+        try:
+            self.__store(plugin_id, version, all_of_a_plugin)
+        except OSError as e:
+            psi.logger.warning(tr('cache.shard.exception', plugin_id, e))
+        return plugin_id, plugin
+
+    def fetch(self, versions: Dict[str, str]) -> Dict[str, Plugin]:
+        """
+        Get the plugins from the disk cache, or fetch them in parallel, with config.download_threads threads
+        :param versions: plugin id -> version listed in the index
+        :return: plugin id -> plugin, without the plugins failed to fetch
+        """
+        results: Iterable[Tuple[str, Optional[Plugin]]]
+        if len(versions) <= 1:
+            results = [self.__fetch_one(plugin_id, version) for plugin_id, version in versions.items()]
+        else:
+            with ThreadPoolExecutor(max(1, config.download_threads), thread_name_prefix='MPMShard') as executor:
+                results = list(executor.map(lambda item: self.__fetch_one(*item), versions.items()))
+        return {plugin_id: plugin for plugin_id, plugin in results if plugin is not None}
+
+    def clean(self, versions: Dict[str, str]):
+        """
+        Remove the cached plugins absent from the index
+        """
+        folder = self.get_folder()
+        if not os.path.isdir(folder):
+            return
+        for file_name in os.listdir(folder):
+            plugin_id, ext = os.path.splitext(file_name)
+            if ext == '.json' and plugin_id not in versions:
+                try:
+                    os.remove(os.path.join(folder, file_name))
+                except OSError:
+                    pass
+
+
+shards = ShardStore()
@@ -0,0 +1,142 @@
+import os
+import shutil
+import time
+from threading import Lock
+from typing import Dict
+
+from mcdreforged.api.decorator import new_thread
+
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.constants import psi
+from mcdreforged_plugin_manager.storage.release import ReleaseInfo
+from mcdreforged_plugin_manager.util.network_util import download_file
+from mcdreforged_plugin_manager.util.translation_util import tr
+
+
+class Staging:
+    """
+    A staging area of pre-fetched plugin assets, so confirming an upgrade is only a local file move and a reload
+
+    Assets are stored as {plugin id}/{tag name}/{asset name}, since releases may reuse asset names.
+    Each prefetch keeps exactly the assets of the pending upgrades, so staged assets of upgraded plugins and of outdated
+    versions are removed once a newer version appears
+    """
+    STAGING_PATH = os.path.join(psi.get_data_folder(), 'staging')
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.__prefetch_lock = Lock()
+
+    def __get_path(self, plugin_id: str, release: ReleaseInfo) -> str:
+        return os.path.join(self.STAGING_PATH, plugin_id, release.tag_name, release.asset.name)
+
+    def get_staged_files(self) -> Dict[str, int]:
+        """
+        :return: path -> size of all staged files, including incomplete ones
+        """
+        result = {}
+        for folder, _, file_names in os.walk(self.STAGING_PATH):
+            for file_name in file_names:
+                path = os.path.join(folder, file_name)
+                result[path] = os.path.getsize(path)
+        return result
+
+    def is_staged(self, plugin_id: str, release: ReleaseInfo) -> bool:
+        return os.path.isfile(self.__get_path(plugin_id, release))
+
+    def take(self, plugin_id: str, release: ReleaseInfo, target: str) -> bool:
+        """
+        Move the staged asset of the release to the target path
+        :return: whether the asset is staged
+        """
+        with self.__lock:
+            path = self.__get_path(plugin_id, release)
+            if not os.path.isfile(path):
+                return False
+            shutil.move(path, target)
+            return True
+
+    def __clean(self, keep: Dict[str, ReleaseInfo]):
+        """
+        Remove staged files which are not the assets to keep
+        :param keep: path -> release
+        """
+        with self.__lock:
+            for path in self.get_staged_files().keys():
+                if path not in keep:
+                    os.remove(path)
+            for folder, _, _ in os.walk(self.STAGING_PATH, topdown=False):
+                if folder != self.STAGING_PATH and len(os.listdir(folder)) == 0:
+                    os.rmdir(folder)
+
+    @new_thread('MPMPrefetch')
+    def start_prefetch(self):
+        """
+        Prefetch in a worker thread, so the catalogue refresh triggering it doesn't wait for the throttled downloads
+        Does nothing if the previous prefetch is still running
+        """
+        if not self.__prefetch_lock.acquire(blocking=False):
+            return
+        try:
+            self.prefetch()
+        except Exception as e:
+            psi.logger.exception(tr('staging.failed', e))
+        finally:
+            self.__prefetch_lock.release()
+
+    def prefetch(self):
+        """
+        Download the assets of all pending upgrades into the staging area in the current thread,
+        within config.prefetch.max_size and at most config.prefetch.bandwidth_limit
+        """
+        import requests
+        from mcdreforged_plugin_manager.task.install_task import select_release, NoMatchingRelease
+        from mcdreforged_plugin_manager.util.upgrade_helper import get_all_non_latest_plugins
+
+        wanted: Dict[str, ReleaseInfo] = {}
+        for plugin_id, _, _ in get_all_non_latest_plugins():
+            try:
+                release = select_release(plugin_id, [])
+            except NoMatchingRelease:
+                continue
+            wanted[self.__get_path(plugin_id, release)] = release
+        self.__clean(wanted)
+
+        budget = config.prefetch.max_size * 1024 * 1024
+        rate_limit = config.prefetch.bandwidth_limit * 1024 if config.prefetch.bandwidth_limit else None
+        fetched, fetched_size, duration = 0, 0, 0.0
+        for path, release in wanted.items():
+            if os.path.isfile(path):
+                with self.__lock:
+                    if os.path.isfile(path):
+                        if os.path.getsize(path) > budget:
+                            os.remove(path)
+                        else:
+                            budget -= os.path.getsize(path)
+                continue
+            if release.asset.size > budget:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            url = config.release_download_url_template.format(url=release.asset.browser_download_url)
+            start = time.monotonic()
+            try:
+                download_file(url, path + '.temp', rate_limit=rate_limit)
+            except requests.RequestException as e:
+                psi.logger.warning(tr('staging.exception', release.asset.name, e))
+                if os.path.isfile(path + '.temp'):
+                    os.remove(path + '.temp')
+                continue
+            duration += time.monotonic() - start
+            os.replace(path + '.temp', path)
+            size = os.path.getsize(path)
+            budget -= size
+            fetched += 1
+            fetched_size += size
+        if fetched > 0:
+            psi.logger.info(tr(
+                'staging.prefetched', fetched, round(fetched_size / 1024 / 1024, 2),
+                round(fetched_size / 1024 / max(duration, 0.001), 1)
+            ))
+
+
+staging = Staging()
@@ -0,0 +1,159 @@
+import re
+from typing import Iterable, Tuple, Dict, List, Sequence, Optional, Set
+
+
+class _TrieNode:
+    __slots__ = ('children', 'words')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.words: Sequence[str] = []
+
+
+class PrefixTrie:
+    """
+    An immutable prefix tree. Each node keeps a sorted tuple of all words below it,
+    so a lookup costs O(len(prefix)) and returns a shared tuple without allocating
+    """
+    def __init__(self, words: Iterable[str] = ()):
+        self.__root = _TrieNode()
+        nodes: List[_TrieNode] = [self.__root]
+        for word in sorted(set(words)):
+            node = self.__root
+            node.words.append(word)
+            for char in word:
+                child = node.children.get(char)
+                if child is None:
+                    child = node.children[char] = _TrieNode()
+                    nodes.append(child)
+                node = child
+                node.words.append(word)
+        for node in nodes:
+            node.words = tuple(node.words)
+
+    def complete(self, prefix: str) -> Tuple[str, ...]:
+        """
+        Return all words starting with the prefix, in alphabetical order
+        """
+        node = self.__root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.words
+
+    def __len__(self):
+        return len(self.__root.words)
+
+
+class FuzzyIndex:
+    """
+    A trigram index over plugin ids and names for approximate plugin id lookups
+    """
+    NORMALIZE_PATTERN = re.compile(r'[^0-9a-z]+')
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        """
+        :param entries: tuples of (plugin id, text to match), e.g. the id and the name of each plugin
+        """
+        self.__keys: List[str] = []  # key index -> plugin id
+        self.__gram_amounts: List[int] = []  # key index -> amount of trigrams of the key
+        self.__postings: Dict[str, List[int]] = {}  # trigram -> key indexes
+        seen: Set[Tuple[str, str]] = set()
+        for plugin_id, text in entries:
+            grams = self.get_grams(text)
+            key = (plugin_id, self.normalize(text))
+            if len(grams) == 0 or key in seen:
+                continue
+            seen.add(key)
+            index = len(self.__keys)
+            self.__keys.append(plugin_id)
+            self.__gram_amounts.append(len(grams))
+            for gram in grams:
+                self.__postings.setdefault(gram, []).append(index)
+
+    @classmethod
+    def normalize(cls, text: str) -> str:
+        return cls.NORMALIZE_PATTERN.sub('', text.lower())
+
+    @classmethod
+    def get_grams(cls, text: str) -> Set[str]:
+        text = '^{}$'.format(cls.normalize(text))
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def search(self, query: str, limit: int = 5, threshold: float = 0.3) -> List[Tuple[str, float]]:
+        """
+        Return at most {limit} (plugin id, similarity) pairs sorted by the similarity in descending order
+        The similarity is the Dice coefficient of the trigram sets, in range [0, 1]
+        """
+        grams = self.get_grams(query)
+        if len(grams) == 0:
+            return []
+        hits: Dict[int, int] = {}
+        for gram in grams:
+            for index in self.__postings.get(gram, ()):
+                hits[index] = hits.get(index, 0) + 1
+        scores: Dict[str, float] = {}
+        for index, common in hits.items():
+            score = 2 * common / (len(grams) + self.__gram_amounts[index])
+            plugin_id = self.__keys[index]
+            if score >= threshold and score > scores.get(plugin_id, 0):
+                scores[plugin_id] = score
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def resolve(self, query: str, threshold: float = 0.6, margin: float = 0.15) -> Optional[str]:
+        """
+        Return the plugin id if the best match is similar enough and clearly better than the others, otherwise None
+        """
+        candidates = self.search(query, limit=2)
+        if len(candidates) == 0 or candidates[0][1] < threshold:
+            return None
+        if len(candidates) > 1 and candidates[0][1] - candidates[1][1] < margin:
+            return None
+        return candidates[0][0]
+
+
+class SuggestionIndex:
+    """
+    Precomputed command suggestions of plugin ids. Rebuilt when the cache is loaded or plugins are changed,
+    instead of on each keystroke
+    """
+    def __init__(self):
+        self.catalogue = PrefixTrie()  # all plugin ids in the catalogue
+        self.installable = PrefixTrie()  # plugin ids in the catalogue, except MPM itself
+        self.installed = PrefixTrie()  # installed plugin ids, except MPM itself
+        self.upgradable = PrefixTrie()  # installed plugin ids with newer versions in the catalogue
+        self.fuzzy = FuzzyIndex()  # plugin ids and names in the catalogue
+        self.installed_key: Tuple[str, ...] = ()  # the plugin list the installed indexes are built from
+
+    def rebuild_catalogue(self, plugins: Iterable[Tuple[str, str]], self_id: str):
+        """
+        :param plugins: tuples of (plugin id, plugin name)
+        :param self_id: the id of MPM itself
+        """
+        plugins = list(plugins)
+        plugin_ids = [plugin_id for plugin_id, _ in plugins]
+        catalogue = PrefixTrie(plugin_ids)
+        installable = PrefixTrie(plugin_id for plugin_id in plugin_ids if plugin_id != self_id)
+        fuzzy = FuzzyIndex([*plugins, *((plugin_id, plugin_id) for plugin_id in plugin_ids)])
+        # built before assigning, so readers keep the previous tries instead of waiting for the rebuild
+        self.catalogue, self.installable, self.fuzzy = catalogue, installable, fuzzy
+
+    def rebuild_installed(self, plugin_list: Iterable[str], upgradable_ids: Iterable[str], self_id: str):
+        self.installed_key = tuple(plugin_list)
+        self.installed = PrefixTrie(plugin_id for plugin_id in self.installed_key if plugin_id != self_id)
+        self.upgradable = PrefixTrie(plugin_id for plugin_id in upgradable_ids if plugin_id != self_id)
+
+    @staticmethod
+    def suggest(trie: PrefixTrie, text: str, multiple: bool = False) -> Sequence[str]:
+        """
+        :param trie: the index to look up
+        :param text: the text already typed in the argument
+        :param multiple: if the argument is a space separated list of ids, only complete the last one
+        """
+        if not multiple:
+            return trie.complete(text)
+        head, divider, last = text.rpartition(' ')
+        if divider == '':
+            return trie.complete(last)
+        return ['{} {}'.format(head, plugin_id) for plugin_id in trie.complete(last)]
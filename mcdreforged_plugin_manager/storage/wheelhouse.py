@@ -0,0 +1,141 @@
+import importlib
+import os
+import re
+import subprocess
+import sys
+from typing import List, Dict, Set
+
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.constants import psi
+from mcdreforged_plugin_manager.util.file_util import FileLock
+from mcdreforged_plugin_manager.util.misc_util import get_pip_process_options
+from mcdreforged_plugin_manager.util.stats_util import stats
+
+
+def normalize_package_name(requirement: str) -> str:
+    """
+    :param requirement: a package name or a requirement line like package==1.0
+    :return: the normalized distribution name, as in wheel file names
+    """
+    name = re.split(r'[\s<>=!~;\[(@]', requirement.strip(), 1)[0]
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def get_installed_closure(requirement: str) -> Set[str]:
+    """
+    :return: the normalized names of the requirement and of the installed distributions it depends on, recursively
+    """
+    from importlib import metadata
+    importlib.invalidate_caches()  # pip has just changed the installed distributions in another process
+    names: Set[str] = set()
+    queue = [normalize_package_name(requirement)]
+    while len(queue) > 0:
+        name = queue.pop()
+        if name in names:
+            continue
+        names.add(name)
+        try:
+            requires = metadata.distribution(name).requires or []
+        except metadata.PackageNotFoundError:
+            continue
+        # dependencies of extras are only installed when the extra is asked for
+        queue.extend(normalize_package_name(line) for line in requires if 'extra' not in line.partition(';')[2])
+    return names
+
+
+class Wheelhouse:
+    """
+    A local wheelhouse of python packages, so each requirement is downloaded or built once, and installing it again,
+    on this or another MCDR instance sharing the cache directory, is a local operation that works offline
+
+    Wheels are evicted least recently used first once their total size exceeds config.wheelhouse.max_size.
+    The modification time of a wheel is its last use, updated whenever its package or a package depending on it is
+    installed
+    """
+    WHEELHOUSE_PATH = os.path.join(psi.get_data_folder(), 'wheelhouse')
+
+    def get_folder(self) -> str:
+        if config.shared_cache is not None:
+            return os.path.join(config.shared_cache, 'wheelhouse')
+        return self.WHEELHOUSE_PATH
+
+    def get_wheels(self) -> Dict[str, os.stat_result]:
+        """
+        :return: path -> stat of all wheels in the wheelhouse
+        """
+        folder = self.get_folder()
+        if not os.path.isdir(folder):
+            return {}
+        return {
+            os.path.join(folder, file_name): os.stat(os.path.join(folder, file_name))
+            for file_name in os.listdir(folder) if file_name.endswith('.whl')
+        }
+
+    @staticmethod
+    def __pip(args: List[str], quiet: bool = False):
+        """
+        :param quiet: drop the output, for attempts whose failure is expected
+        :raise subprocess.CalledProcessError: if pip fails
+        """
+        params, options = get_pip_process_options([sys.executable, '-m', 'pip', *args])
+        if quiet:
+            options.update(stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        subprocess.check_call(params, **options)
+
+    def __touch(self, requirement: str):
+        """
+        Mark the wheels of the requirement and of all its installed dependencies as used, so the wheels of dependencies
+        aren't evicted while the package depending on them is still in use
+        """
+        names = get_installed_closure(requirement)
+        for path in self.get_wheels().keys():
+            if normalize_package_name(os.path.basename(path).split('-')[0]) in names:
+                os.utime(path)
+
+    def __evict(self):
+        budget = config.wheelhouse.max_size * 1024 * 1024
+        wheels = sorted(self.get_wheels().items(), key=lambda item: item[1].st_mtime, reverse=True)
+        for path, stat in wheels:
+            if stat.st_size <= budget:
+                budget -= stat.st_size
+            else:
+                os.remove(path)
+                stats.increase('wheelhouse.evicted')
+
+    def install(self, requirement: str, upgrade: bool = False) -> bool:
+        """
+        Install a requirement from the wheelhouse, downloading or building the wheels of it and its dependencies
+        into the wheelhouse first if absent. An upgrade without a pinned version always checks the package index
+        Falls back to installing from the package index directly if the wheels can't be built
+        :return: whether the requirement is installed without the network
+        :raise subprocess.CalledProcessError: if pip fails to install the requirement
+        """
+        folder = self.get_folder()
+        os.makedirs(folder, exist_ok=True)
+        install = ['install', '--no-index', '--find-links', folder, *(['-U'] if upgrade else []), requirement]
+        pinned = re.search(r'[<>=!~@]', requirement) is not None
+        # held while pip runs, so other MCDR instances don't evict wheels in use or build the same wheels again
+        with FileLock(folder + '.lock'):
+            if not upgrade or pinned:
+                try:
+                    self.__pip(install, quiet=True)
+                except subprocess.CalledProcessError:
+                    pass
+                else:
+                    self.__touch(requirement)
+                    stats.increase('wheelhouse.hits')
+                    return True
+            stats.increase('wheelhouse.misses')
+            try:
+                self.__pip(['wheel', '--find-links', folder, '--wheel-dir', folder, requirement])
+            except subprocess.CalledProcessError:
+                # e.g. a package that can't be built into a wheel, install it as before
+                self.__pip(['install', *(['-U'] if upgrade else []), requirement])
+            else:
+                self.__pip(install)
+                self.__touch(requirement)
+            self.__evict()
+        return False
+
+
+wheelhouse = Wheelhouse()
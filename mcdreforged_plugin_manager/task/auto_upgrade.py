@@ -0,0 +1,217 @@
+import re
+import time
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+from typing import Optional, List, Tuple, Set
+
+from mcdreforged.api.all import *
+
+from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.constants import psi, meta
+from mcdreforged_plugin_manager.storage.cache import cache
+from mcdreforged_plugin_manager.task.task_manager import task_manager
+from mcdreforged_plugin_manager.util.stats_util import stats
+from mcdreforged_plugin_manager.util.translation_util import tr
+
+WINDOW_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$')
+RCON_LIST_PATTERN = re.compile(r'There are (\d+)')
+
+
+def parse_window(text: str) -> Tuple[int, int]:
+    """
+    :param text: a daily time range in local time like 03:00-06:00, which may wrap past midnight like 23:00-02:00
+    :return: the start and the end in minutes since midnight
+    :raise ValueError: if the text is not a valid time range
+    """
+    match = WINDOW_PATTERN.match(text)
+    if match is None:
+        raise ValueError(text)
+    start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+    if max(start_hour, end_hour) > 23 or max(start_minute, end_minute) > 59:
+        raise ValueError(text)
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+def get_active_window(windows: List[str], now: datetime) -> Optional[datetime]:
+    """
+    :return: the start time of the window now is in, None if now is outside all windows. Invalid windows are ignored
+    """
+    minute = now.hour * 60 + now.minute
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    for window in windows:
+        try:
+            start, end = parse_window(window)
+        except ValueError:
+            continue
+        if start <= end and start <= minute < end:
+            return midnight + timedelta(minutes=start)
+        if start > end and minute >= start:
+            return midnight + timedelta(minutes=start)
+        if start > end and minute < end:
+            return midnight - timedelta(days=1) + timedelta(minutes=start)
+    return None
+
+
+class PlayerTracker:
+    """
+    Tracks the online players from the player events, so the server counts as idle once the last player leaves
+    """
+    def __init__(self):
+        self.players: Set[str] = set()
+        self.known = False  # whether the player set is accurate, e.g. not if MPM is loaded with players online
+        self.idle_since: Optional[float] = None  # timestamp since when no player is online
+        self.__lock = Lock()
+
+    def inherit(self, old: 'PlayerTracker'):
+        """
+        Inherit the player set from the tracker of the previous plugin instance
+        """
+        with self.__lock:
+            self.players = set(old.players)
+            self.known = old.known
+            self.idle_since = old.idle_since
+
+    def reset(self, empty: bool = False):
+        """
+        Clear the player set, which is known to be empty if the server is not running,
+        otherwise only known if rcon reports no player online
+        :param empty: whether no player can be online, e.g. the server is just started or stopped
+        """
+        with self.__lock:
+            self.players.clear()
+            self.known = empty or not psi.is_server_running()
+            if not self.known and psi.is_rcon_running():
+                match = RCON_LIST_PATTERN.search(psi.rcon_query('list') or '')
+                self.known = match is not None and match.group(1) == '0'
+            self.idle_since = time.time() if self.known else None
+
+    def on_joined(self, player: str):
+        with self.__lock:
+            self.players.add(player)
+            self.idle_since = None
+
+    def on_left(self, player: str):
+        with self.__lock:
+            self.players.discard(player)
+            if self.known and len(self.players) == 0:
+                self.idle_since = time.time()
+
+    def get_idle_duration(self) -> Optional[float]:
+        """
+        :return: how long no player has been online (unit: second), None if players are online or it's unknown
+        """
+        if not self.known or self.idle_since is None:
+            return None
+        return time.time() - self.idle_since
+
+
+class LoggerSource:
+    """
+    Replies of the auto upgrade go to the console
+    """
+    def reply(self, text):
+        psi.logger.info(text)
+
+
+class AutoUpgradeResult(Serializable):
+    time: float = 0
+    plugins: List[str] = []
+    success: bool = False
+    download_duration: float = 0  # unit: second
+    reload_duration: float = 0  # unit: second, the duration of reloading the changed plugins
+
+
+class AutoUpgrader(Thread):
+    """
+    Applies all pending upgrades as one batch in the configured maintenance windows, once the server is idle
+
+    Assets are downloaded first and the idleness is checked again, so the server is only affected by the file moves
+    and a single reload. Each window occurrence gets at most one attempt, unless a player joins during the download
+    """
+    CHECK_INTERVAL = 60  # unit: second
+
+    def __init__(self):
+        super().__init__()
+        self.setDaemon(True)
+        self.setName('MPMAutoUpgrade')
+        self.players = PlayerTracker()
+        self.last_result: Optional[AutoUpgradeResult] = None
+        self.last_window: Optional[float] = None  # timestamp of the start of the last attempted window
+        self.__stop_event = Event()
+
+    def inherit(self, old: 'AutoUpgrader'):
+        self.players.inherit(old.players)
+        self.last_result = getattr(old, 'last_result', None)
+        self.last_window = getattr(old, 'last_window', None)
+
+    @staticmethod
+    def get_upgradable_plugins() -> List[str]:
+        from mcdreforged_plugin_manager.util.upgrade_helper import get_all_non_latest_plugins
+        settings = config.auto_upgrade
+        return [
+            plugin_id for plugin_id, _, _ in get_all_non_latest_plugins()
+            if plugin_id != meta.id and plugin_id not in settings.deny
+            and (len(settings.allow) == 0 or plugin_id in settings.allow)
+        ]
+
+    def is_idle(self) -> bool:
+        idle = self.players.get_idle_duration()
+        return idle is not None and idle >= config.auto_upgrade.idle_minutes * 60
+
+    def tick(self, now: Optional[datetime] = None) -> Optional[AutoUpgradeResult]:
+        """
+        Apply the pending upgrades if now is in a maintenance window not attempted yet and the server is idle
+        :return: the result if upgrades are applied
+        """
+        window = get_active_window(config.auto_upgrade.windows, now or datetime.now())
+        if window is None or window.timestamp() == self.last_window or not cache.loaded or not self.is_idle():
+            return None
+        if task_manager.pending_task is not None:
+            return None  # an operation waiting for confirmation, whose plan may conflict
+        self.last_window = window.timestamp()
+        plugin_ids = self.get_upgradable_plugins()
+        if len(plugin_ids) == 0:
+            return None
+        return self.upgrade(plugin_ids)
+
+    def upgrade(self, plugin_ids: List[str]) -> AutoUpgradeResult:
+        from mcdreforged_plugin_manager.task.install_task import PluginInstaller
+        psi.logger.info(tr('auto_upgrade.started', len(plugin_ids), ', '.join(plugin_ids)))
+        result = AutoUpgradeResult(time=time.time(), plugins=plugin_ids)
+        installer = PluginInstaller(list(plugin_ids), LoggerSource(), upgrade=True)
+        start = time.monotonic()
+        if not installer.plan() or not installer.download_plugins():
+            psi.logger.warning(tr('auto_upgrade.failed'))
+            self.last_result = result
+            return result
+        result.download_duration = time.monotonic() - start
+        if not self.is_idle():
+            installer.discard_downloads()
+            psi.logger.info(tr('auto_upgrade.cancelled'))
+            self.last_window = None  # a player joined meanwhile, try again once idle within the window
+            self.last_result = result
+            return result
+        result.success = installer.execute()
+        start = time.monotonic()
+        psi.refresh_changed_plugins()
+        result.reload_duration = time.monotonic() - start
+        stats.record('auto_upgrade.reload', result.reload_duration)
+        cache.update_installed_suggestions(force=True)
+        psi.logger.info(tr(
+            'auto_upgrade.done' if result.success else 'auto_upgrade.failed_partially', len(plugin_ids),
+            round(result.download_duration, 2), round(result.reload_duration, 2)
+        ))
+        self.last_result = result
+        return result
+
+    def run(self):
+        while not self.__stop_event.wait(self.CHECK_INTERVAL):
+            if not config.auto_upgrade.enabled:
+                continue
+            try:
+                self.tick()
+            except Exception as e:
+                psi.logger.exception(tr('auto_upgrade.exception', e))
+
+    def stop(self):
+        self.__stop_event.set()
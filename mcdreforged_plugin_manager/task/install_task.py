@@ -1,26 +1,160 @@
+import json
 import os
 import subprocess
 import sys
+import time
 from abc import ABC
-from typing import List, Optional
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Dict
 
-import requests
 from mcdreforged.api.all import *
+from mcdreforged.plugin.meta.version import Version, VersionRequirement, VersionParsingError
 
 from mcdreforged_plugin_manager.config import config
 from mcdreforged_plugin_manager.constants import psi, meta
 from mcdreforged_plugin_manager.dependency_checker import DependencyOperation, PackageDependencyChecker, \
     DependencyError, PluginDependencyChecker
 from mcdreforged_plugin_manager.storage.cache import cache
+from mcdreforged_plugin_manager.storage.file_index import file_index
+from mcdreforged_plugin_manager.storage.plugin import Plugin
+from mcdreforged_plugin_manager.storage.release import ReleaseInfo
+from mcdreforged_plugin_manager.storage.staging import staging
+from mcdreforged_plugin_manager.storage.wheelhouse import wheelhouse
 from mcdreforged_plugin_manager.task.task_manager import Task, task_manager
 from mcdreforged_plugin_manager.texts import CONFIRM_COMMAND_TEXT
+from mcdreforged_plugin_manager.util.file_util import get_file_sha256, read_zip_member
 from mcdreforged_plugin_manager.util.mcdr_util import is_plugin_loaded, remove_plugin_file
-from mcdreforged_plugin_manager.util.misc_util import parse_python_requirement
-from mcdreforged_plugin_manager.util.network_util import download_file
-from mcdreforged_plugin_manager.util.text_util import indented, new_line, insert_between
+from mcdreforged_plugin_manager.util.misc_util import parse_python_requirement, parse_plugin_spec, \
+    get_pip_process_options
+from mcdreforged_plugin_manager.util.network_util import download_file, download_shared_file, throughput
+from mcdreforged_plugin_manager.util.stats_util import stats
+from mcdreforged_plugin_manager.util.text_util import indented, new_line, insert_between, size
 from mcdreforged_plugin_manager.util.translation_util import tr
 
 
+class NoMatchingRelease(Exception):
+    pass
+
+
+class PluginUnavailable(NoMatchingRelease):
+    """
+    The plugin is in the sharded index, but fetching its metadata failed
+    """
+    pass
+
+
+class InvalidPluginArchive(Exception):
+    pass
+
+
+PACKED_PLUGIN_SUFFIXES = ('.mcdr', '.pyz', '.zip')
+
+
+def validate_plugin_archive(path: str, plugin_id: str, release: ReleaseInfo):
+    """
+    Check the metadata in a downloaded packed plugin against the catalogue without extracting it,
+    so a broken asset is rejected before MCDR is reloaded. Solo plugins (.py) are not checked
+    :raise InvalidPluginArchive: with the translated reason
+    """
+    if not release.asset.name.endswith(PACKED_PLUGIN_SUFFIXES):
+        return
+    try:
+        plugin_meta = json.loads(read_zip_member(path, 'mcdreforged.plugin.json').decode('utf8'))
+    except zipfile.BadZipFile as e:
+        raise InvalidPluginArchive(tr('install.archive.bad_zip', e))
+    except KeyError:
+        raise InvalidPluginArchive(tr('install.archive.meta_not_found'))
+    except ValueError as e:
+        raise InvalidPluginArchive(tr('install.archive.invalid_meta', e))
+    if not isinstance(plugin_meta, dict):
+        raise InvalidPluginArchive(tr('install.archive.invalid_meta', type(plugin_meta).__name__))
+
+    if plugin_meta.get('id') != plugin_id:
+        raise InvalidPluginArchive(tr('install.archive.id_mismatch', plugin_meta.get('id'), plugin_id))
+    expected_version = release.get_version()
+    if expected_version is not None:
+        try:
+            version = Version(str(plugin_meta.get('version')))
+        except VersionParsingError:
+            version = None
+        if version != expected_version:
+            raise InvalidPluginArchive(tr(
+                'install.archive.version_mismatch', plugin_meta.get('version'), expected_version
+            ))
+    if release.meta is not None:
+        dependencies = plugin_meta.get('dependencies') or {}
+        if not isinstance(dependencies, dict) or dependencies != release.meta.dependencies:
+            raise InvalidPluginArchive(tr(
+                'install.archive.dependency_mismatch', dependencies, release.meta.dependencies
+            ))
+
+
+def is_mcdr_compatible(release: ReleaseInfo) -> bool:
+    """
+    Whether the MCDR requirement in the release meta accepts the running MCDR
+    """
+    if release.meta is None or 'mcdreforged' not in release.meta.dependencies:
+        return True
+    mcdr = psi.get_plugin_metadata('mcdreforged')
+    if mcdr is None:
+        return True
+    try:
+        return VersionRequirement(release.meta.dependencies['mcdreforged']).accept(mcdr.version)
+    except VersionParsingError:
+        return True
+
+
+def get_available_plugin(plugin_id: str) -> Plugin:
+    """
+    :raise PluginUnavailable: if the plugin is pending in the sharded index and cannot be fetched
+    """
+    plugin = cache.get_plugin_by_id(plugin_id)
+    if plugin is None:
+        raise PluginUnavailable(tr('cache.shard.unavailable', plugin_id))
+    return plugin
+
+
+def select_release(plugin_id: str, requirements: List[str]) -> ReleaseInfo:
+    """
+    Select the newest release of the plugin that satisfies all the requirements and the running MCDR
+    Prereleases are only selected when pinned with an exact version, or when the catalogue lists one as the latest
+    release, which check_update reports as the upgrade
+    :param requirements: the version requirements of the plugin collected from the plan
+    """
+    summary = get_available_plugin(plugin_id).release
+    latest = summary.get_latest_release()
+    pinned = any(requirement.startswith('=') for requirement in requirements)
+    release = summary.get_newest_release(
+        requirements, allow_prerelease=True,
+        predicate=lambda r: (not r.prerelease or pinned or r is latest) and is_mcdr_compatible(r)
+    )
+    if release is None and len(requirements) == 0:
+        # versions of the releases cannot be parsed, trust the catalogue
+        release = summary.get_latest_release()
+    if release is None:
+        raise NoMatchingRelease(tr('install.no_matching_release', plugin_id, ' '.join(requirements) or '*'))
+    return release
+
+
+def get_shared_asset_path(plugin_id: str, release: ReleaseInfo) -> Optional[str]:
+    """
+    :return: the path of the asset in the shared cache directory, None if the directory is not configured
+    """
+    if config.shared_cache is None:
+        return None
+    return os.path.join(config.shared_cache, 'assets', plugin_id, release.tag_name, release.asset.name)
+
+
+@dataclass
+class DownloadEstimate:
+    files: int  # amount of assets to install
+    total: int  # size of all assets (unit: byte)
+    cached: int  # size of the assets staged or in the shared cache directory, which are not downloaded
+    duration: Optional[float]  # estimated download time (unit: second), None if no download is measured yet
+
+
 class InstallerOperation(ABC):
     def __init__(self, name: str, operation: DependencyOperation):
         self.operation = operation
@@ -35,46 +169,111 @@ class InstallerOperation(ABC):
 
 
 class InstallPluginOperation(InstallerOperation):
-    def __init__(self, name: str, operation: DependencyOperation):
+    def __init__(self, name: str, operation: DependencyOperation, release: Optional[ReleaseInfo] = None,
+                 checksum: Optional[str] = None):
+        """
+        :param release: the release to install, the latest release will be installed if not specified
+        :param checksum: the expected sha256 of the asset, not verified if not specified
+        """
         super().__init__(name, operation)
         self.operation = operation
         self.name = name
+        self.release = release
+        self.checksum = checksum
         self.install_path = config.install_path
+        self.temp_path: Optional[str] = None
 
-    def operate(self, installer: 'PluginInstaller') -> bool:
+    def is_cached(self) -> bool:
+        """
+        :return: whether the asset of the release is available locally, i.e. staged or in the shared cache directory
+        """
+        if self.temp_path is not None or staging.is_staged(self.name, self.release):
+            return True
+        shared_path = get_shared_asset_path(self.name, self.release)
+        return shared_path is not None and os.path.isfile(shared_path)
+
+    def download(self, installer: 'PluginInstaller') -> bool:
+        """
+        Download the asset next to the destination as a temp file, so nothing is replaced until operate
+        :return: whether the download is successful
+        """
+        import requests
         if self.operation == DependencyOperation.UPGRADE:
             self.install_path = os.path.dirname(psi.get_plugin_file_path(self.name))
-        if self.operation in [DependencyOperation.INSTALL, DependencyOperation.UPGRADE]:
-            summary = cache.get_plugin_by_id(self.name).release
-            release = summary.get_latest_release()
-            url = config.release_download_url_template.format(url=release.asset.browser_download_url)
-            filename = release.asset.name
-            temp_filename = filename + '.temp'
-            download_filename = temp_filename if self.operation == DependencyOperation.UPGRADE else filename
-            download_path = os.path.join(self.install_path, download_filename)
-            installer.reply(indented(tr('install.operation.plugin.downloading', filename)))
+        release = self.release
+        if release is None:
+            release = self.release = cache.get_plugin_by_id(self.name).release.get_latest_release()
+        url = config.release_download_url_template.format(url=release.asset.browser_download_url)
+        temp_path = os.path.join(self.install_path, release.asset.name + '.temp')
+        shared_path = get_shared_asset_path(self.name, release)
+        if staging.take(self.name, release, temp_path):
+            installer.reply(indented(tr('install.operation.plugin.staged', release.asset.name)))
+        else:
+            if shared_path is not None and os.path.isfile(shared_path):
+                installer.reply(indented(tr('install.operation.plugin.shared', release.asset.name)))
+            else:
+                installer.reply(indented(tr('install.operation.plugin.downloading', release.asset.name)))
+            start = time.monotonic()
             try:
-                download_file(url, download_path)
+                if shared_path is not None:
+                    lock_path = os.path.join(config.shared_cache, 'assets', self.name + '.lock')
+                    downloaded = download_shared_file(url, shared_path, temp_path, lock_path, record=True)
+                else:
+                    downloaded = download_file(url, temp_path, record=True)
             except requests.RequestException as e:
                 installer.reply(indented(
                     tr('install.operation.plugin.exception', e), 2
                 ))
                 return False
-            else:
-                if self.operation == DependencyOperation.UPGRADE:
-                    installer.reply(indented(
-                        tr('install.operation.plugin.removing', psi.get_plugin_file_path(self.name))
-                    ))
-                    remove_plugin_file(self.name)
-                    os.rename(download_path, os.path.join(self.install_path, filename))
+            duration = max(time.monotonic() - start, 0.001)
+            if downloaded > 0:
+                installer.reply(indented(tr(
+                    'install.operation.plugin.downloaded', release.asset.name,
+                    round(downloaded / 1024, 1), round(duration, 2), round(downloaded / 1024 / duration, 1)
+                ), 2))
+        if self.checksum is not None and get_file_sha256(temp_path) != self.checksum:
+            installer.reply(indented(tr('install.operation.plugin.checksum_mismatch', release.asset.name), 2))
+            os.remove(temp_path)
+            return False
+        try:
+            validate_plugin_archive(temp_path, self.name, release)
+        except InvalidPluginArchive as e:
+            installer.reply(indented(tr('install.operation.plugin.invalid_archive', release.asset.name, e), 2))
+            os.remove(temp_path)
+            if shared_path is not None and os.path.isfile(shared_path):
+                # don't let other instances reuse the broken file
+                os.remove(shared_path)
+            return False
+        self.temp_path = temp_path
+        return True
+
+    def operate(self, installer: 'PluginInstaller') -> bool:
+        if self.operation not in [DependencyOperation.INSTALL, DependencyOperation.UPGRADE]:
+            return True
+        if self.temp_path is None and not self.download(installer):
+            return False
+        if self.operation == DependencyOperation.UPGRADE:
+            installer.reply(indented(
+                tr('install.operation.plugin.removing', psi.get_plugin_file_path(self.name))
+            ))
+            remove_plugin_file(self.name)
+        path = os.path.join(self.install_path, self.release.asset.name)
+        os.replace(self.temp_path, path)
+        self.temp_path = None
+        version = self.release.get_version()
+        file_index.record_install(self.name, path, str(version) if version is not None else self.release.tag_name)
         return True
 
 
 class InstallPackageOperation(InstallerOperation):
-    def __init__(self, name: str, operation: DependencyOperation):
+    def __init__(self, name: str, operation: DependencyOperation, requirement: Optional[str] = None):
+        """
+        :param requirement: the requirement line with the version specifier, the name if None
+        """
         super().__init__(name, operation)
         self.operation = operation
         self.name = name
+        self.requirement = requirement if requirement is not None else name
 
     def operate(self, installer: 'PluginInstaller') -> bool:
         installer.reply(
@@ -82,13 +281,18 @@ class InstallPackageOperation(InstallerOperation):
                 tr('install.operation.package.operating_with_pip', tr(self.operation.value), self.name)
             )
         )
-        params = []
-        if self.operation == DependencyOperation.INSTALL:
-            params = [sys.executable, '-m', 'pip', 'install', self.name]
-        elif self.operation == DependencyOperation.UPGRADE:
-            params = [sys.executable, '-m', 'pip', 'install', '-U', self.name]
+        upgrade = self.operation == DependencyOperation.UPGRADE
         try:
-            subprocess.check_call(params)
+            with stats.timer('pip'):
+                if config.wheelhouse.enabled:
+                    # with the specifier, or a stale wheel satisfying only the name would be installed
+                    if wheelhouse.install(self.requirement, upgrade=upgrade):
+                        installer.reply(indented(tr('install.operation.package.wheelhouse', self.name), 2))
+                else:
+                    params, options = get_pip_process_options(
+                        [sys.executable, '-m', 'pip', 'install', *(['-U'] if upgrade else []), self.name]
+                    )
+                    subprocess.check_call(params, **options)
         except subprocess.CalledProcessError as e:
             installer.reply(indented(
                 tr('install.operation.package.exception', e), 2
@@ -114,31 +318,41 @@ def get_operate_packages(requirements: List[str]) -> List[InstallPackageOperatio
             dependency_checker.check()
         except DependencyError:
             if dependency_checker.get_operation() != DependencyOperation.IGNORE:
-                result.append(InstallPackageOperation(package, dependency_checker.get_operation()))
+                result.append(InstallPackageOperation(package, dependency_checker.get_operation(), line.strip()))
     return result
 
 
-def get_operations(plugin_id: str, dependency_operation: DependencyOperation) -> List[InstallerOperation]:
+def get_operations(plugin_id: str, dependency_operation: DependencyOperation,
+                   requirements: Optional[Dict[str, List[str]]] = None) -> List[InstallerOperation]:
     """
     Generate installer operations from plugin_id and dependency_operation
+    :param requirements: plugin id -> version requirements collected from the plan,
+    the dependency requirements of the selected releases will be added to it
     """
+    if requirements is None:
+        requirements = {}
     operations: List[InstallerOperation] = []
-    plugin = cache.get_plugin_by_id(plugin_id)
-    operations.append(InstallPluginOperation(plugin_id, dependency_operation))
-    operations = [*operations, *get_operate_packages(plugin.meta.requirements)]
+    plugin = get_available_plugin(plugin_id)
+    release = select_release(plugin_id, requirements.get(plugin_id, []))
+    release_meta = release.meta if release.meta is not None else plugin.meta
+    operations.append(InstallPluginOperation(plugin_id, dependency_operation, release))
+    operations = [*operations, *get_operate_packages(release_meta.requirements)]
 
-    for dep_id, requirement in plugin.meta.dependencies.items():
+    # fetch the dependencies in one parallel batch instead of one by one while recursing
+    cache.fetch_plugins(release_meta.dependencies.keys())
+    for dep_id, requirement in release_meta.dependencies.items():
         if dep_id.lstrip().startswith('mcdreforged'):
             # skip mcdreforged dependency
             # TODO: warn user here
             continue
+        requirements.setdefault(dep_id, []).append(requirement)
         plugin_checker = PluginDependencyChecker(dep_id, requirement)
         try:
             # the dependency is satisfied, ignore further dependency checking
             plugin_checker.check()
         except DependencyError:
             # the dependency is not satisfied, add its dependency then
-            operations = [*operations, *get_operations(dep_id, plugin_checker.get_operation())]
+            operations = [*operations, *get_operations(dep_id, plugin_checker.get_operation(), requirements)]
 
     return operations
 
@@ -156,48 +370,85 @@ class PluginInstaller(Task):
         self.operations: List[InstallerOperation] = []
 
     def init(self):
-        # don't operate on self (mcdreforged_plugin_manager)
-        if meta.id in self.plugin_ids:
-            if len(self.plugin_ids) == 1:  # ['mcdreforged_plugin_manager']
+        # don't operate on self (mcdreforged_plugin_manager), with a specified version as well
+        plugin_ids = [spec for spec in self.plugin_ids if parse_plugin_spec(spec)[0] != meta.id]
+        if len(plugin_ids) != len(self.plugin_ids):
+            if len(plugin_ids) == 0:  # ['mcdreforged_plugin_manager@1.2.0']
                 self.reply(tr('install.cannot_install_self'))
                 task_manager.clear_task()
                 return
             else:
-                self.plugin_ids.remove(meta.id)
+                self.plugin_ids = plugin_ids
 
-        if self.__init_operations():
+        if self.plan():
             self.__show_confirm()
         else:
             task_manager.clear_task()
 
+    def plan(self) -> bool:
+        """
+        Generate the operations without asking for confirmation
+        :return: whether there's anything to do
+        """
+        try:
+            return self.__init_operations()
+        except NoMatchingRelease as e:
+            self.reply(e.args[0])
+            return False
+
     def __reply_if_present(self, text: Optional[RTextBase]):
         if text is not None:
             self.reply(text)
 
+    @stats.timed('install.planning')
     def __init_operations(self):
         """
-        Generate all operations from self.plugin_ids
+        Generate all operations from self.plugin_ids, which may contain specified versions like plugin_id@1.2.0
         """
-        for plugin_id in self.plugin_ids:
+        requirements: Dict[str, List[str]] = {}
+        for plugin_id, version in map(parse_plugin_spec, self.plugin_ids):
+            if version is not None:
+                try:
+                    Version(version)
+                except VersionParsingError:
+                    raise NoMatchingRelease(tr('install.invalid_version', plugin_id, version))
+                requirements[plugin_id] = ['={}'.format(version)]
+        cache.fetch_plugins(plugin_id for plugin_id, _ in map(parse_plugin_spec, self.plugin_ids))
+        for plugin_id, version in map(parse_plugin_spec, self.plugin_ids):
             if is_plugin_loaded(plugin_id):
-                if not self.upgrade:
-                    self.reply(tr('install.already_installed', plugin_id))
-                result = cache.get_plugin_by_id(plugin_id).meta.check_update()
-                if not result.is_latest:
-                    self.reply(tr(
-                        'install.newer_version_available',
-                        plugin_id,
-                        result.latest_version
-                    ))
+                local_version = psi.get_plugin_metadata(plugin_id).version
+                if version is not None:
+                    if Version(version) == local_version:
+                        self.reply(tr('install.already_installed_version', plugin_id, version))
+                        continue
                     self.upgrade = True
                 else:
-                    self.reply(tr('install.already_up_to_date', plugin_id))
-                    continue
-            for operation in get_operations(
-                    plugin_id, DependencyOperation.UPGRADE if self.upgrade else DependencyOperation.INSTALL
-            ):
+                    if not self.upgrade:
+                        self.reply(tr('install.already_installed', plugin_id))
+                    result = get_available_plugin(plugin_id).meta.check_update()
+                    if not result.is_latest:
+                        self.reply(tr(
+                            'install.newer_version_available',
+                            plugin_id,
+                            result.latest_version
+                        ))
+                        self.upgrade = True
+                    else:
+                        self.reply(tr('install.already_up_to_date', plugin_id))
+                        continue
+            operation = DependencyOperation.UPGRADE if is_plugin_loaded(plugin_id) else DependencyOperation.INSTALL
+            for operation in get_operations(plugin_id, operation, requirements):
                 if operation.name not in [op.name for op in self.operations]:
                     self.operations.append(operation)
+        # requirements from plugins planned later may constrain plugins planned earlier
+        for operation in list(self.operations):
+            if isinstance(operation, InstallPluginOperation):
+                operation.release = select_release(operation.name, requirements.get(operation.name, []))
+                if operation.operation == DependencyOperation.UPGRADE and \
+                        operation.release.get_version() == psi.get_plugin_metadata(operation.name).version:
+                    # e.g. the newest release selectable is the installed one
+                    self.reply(tr('install.already_up_to_date', operation.name))
+                    self.operations.remove(operation)
         return len(self.operations) != 0
 
     def __format_plugins_confirm(self) -> Optional[RTextBase]:
@@ -230,6 +481,48 @@ class PluginInstaller(Task):
             )
         )
 
+    def estimate_download(self) -> DownloadEstimate:
+        """
+        Estimate the transfer of the plugin assets from the asset sizes in the catalogue and the recent throughput,
+        with as many parallel downloads as download_plugins uses. Python packages are not included
+        """
+        ops = [
+            op for op in self.operations if isinstance(op, InstallPluginOperation)
+            and op.operation in [DependencyOperation.INSTALL, DependencyOperation.UPGRADE] and op.release is not None
+        ]
+        total, cached, missing = 0, 0, 0
+        for op in ops:
+            total += op.release.asset.size
+            if op.is_cached():
+                cached += op.release.asset.size
+            else:
+                missing += 1
+        duration: Optional[float] = 0
+        if missing > 0:
+            speed = throughput.get_throughput()
+            if speed is None:
+                duration = None
+            else:
+                speed *= min(missing, max(1, config.download_threads), max(1, config.throttle.max_connections))
+                if config.throttle.bandwidth_limit:
+                    speed = min(speed, config.throttle.bandwidth_limit * 1024)
+                duration = (total - cached) / speed
+        return DownloadEstimate(files=len(ops), total=total, cached=cached, duration=duration)
+
+    def format_download_estimate(self) -> Optional[RTextBase]:
+        estimate = self.estimate_download()
+        if estimate.files == 0:
+            return None
+        text = RTextList(tr('install.confirm.download_size', size(estimate.total), estimate.files))
+        if estimate.cached > 0:
+            text.append(tr('install.confirm.download_cached', size(estimate.cached)))
+        text.append(new_line())
+        if estimate.duration is None:
+            text.append(tr('install.confirm.download_eta_unknown'))
+        else:
+            text.append(tr('install.confirm.download_eta', round(estimate.duration, 1)))
+        return text
+
     def __show_confirm(self):
         self.reply(tr(
             'install.confirm.title',
@@ -238,18 +531,50 @@ class PluginInstaller(Task):
 
         self.__reply_if_present(self.__format_plugins_confirm())
         self.__reply_if_present(self.__format_packages_confirm())
+        self.__reply_if_present(self.format_download_estimate())
 
         self.reply(tr('install.confirm.footer', CONFIRM_COMMAND_TEXT))
 
-    @new_thread('MPMInstall')
-    def run(self):
+    def download_plugins(self) -> bool:
+        """
+        Download all plugin assets in parallel before any file is replaced
+        :return: whether all downloads are successful
+        """
+        ops = [op for op in self.operations if isinstance(op, InstallPluginOperation) and op.temp_path is None]
+        if len(ops) == 0:
+            return True
+        with ThreadPoolExecutor(max(1, config.download_threads), thread_name_prefix='MPMDownload') as executor:
+            results = list(executor.map(lambda op: op.download(self), ops))
+        if not all(results):
+            self.discard_downloads()
+        return all(results)
+
+    def discard_downloads(self):
+        for op in self.operations:
+            if isinstance(op, InstallPluginOperation) and op.temp_path is not None:
+                if os.path.isfile(op.temp_path):
+                    os.remove(op.temp_path)
+                op.temp_path = None
+
+    def execute(self) -> bool:
+        """
+        Download all plugins, then do all operations, without reloading MCDR
+        :return: whether all operations are successful
+        """
+        if not self.download_plugins():
+            return False
         results = []
         for operation in self.operations:
             self.reply(tr('install.operating', tr(operation.operation.value), operation.name))
             results.append(operation.operate(self))
-        if all(results):
+        return all(results)
+
+    @new_thread('MPMInstall')
+    def run(self):
+        if self.execute():
             self.reply(tr('install.operation.reload_mcdr'))
             psi.refresh_changed_plugins()
+            cache.update_installed_suggestions(force=True)
             self.reply(tr('install.result.success'))
         else:
             self.reply(tr('install.result.failed'))
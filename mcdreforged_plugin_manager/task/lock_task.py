@@ -0,0 +1,135 @@
+import os
+from typing import List
+
+from mcdreforged.api.all import *
+
+from mcdreforged_plugin_manager.constants import psi, meta
+from mcdreforged_plugin_manager.dependency_checker import DependencyOperation
+from mcdreforged_plugin_manager.storage.cache import cache
+from mcdreforged_plugin_manager.storage.lock import LockFile
+from mcdreforged_plugin_manager.task.install_task import PluginInstaller, InstallPluginOperation, \
+    InstallPackageOperation
+from mcdreforged_plugin_manager.task.task_manager import Task, task_manager
+from mcdreforged_plugin_manager.task.uninstall_task import PluginUninstaller
+from mcdreforged_plugin_manager.texts import CONFIRM_COMMAND_TEXT
+from mcdreforged_plugin_manager.util.file_util import get_file_sha256
+from mcdreforged_plugin_manager.util.mcdr_util import is_plugin_loaded
+from mcdreforged_plugin_manager.util.misc_util import get_package_version
+from mcdreforged_plugin_manager.util.text_util import indented
+from mcdreforged_plugin_manager.util.translation_util import tr
+
+
+class LockApplier(Task):
+    """
+    Bring the server to the state in a lockfile with the minimal set of operations:
+    download all plugins in parallel, remove the plugins not in the lockfile, replace the plugins, then reload once
+    """
+    def __init__(self, lock: LockFile, source: CommandSource):
+        self.lock = lock
+        self.reply = source.reply
+        self.installer = PluginInstaller([], source)
+        self.uninstaller = PluginUninstaller([], source)
+        self.skipped: List[str] = []  # locked plugins that can't be installed, the others are applied still
+
+    def init(self):
+        if self.__init_operations():
+            self.__show_confirm()
+        else:
+            task_manager.clear_task()
+
+    def __is_up_to_date(self, plugin_id: str) -> bool:
+        locked = self.lock.plugins[plugin_id]
+        if str(psi.get_plugin_metadata(plugin_id).version) != locked.version:
+            return False
+        path = psi.get_plugin_file_path(plugin_id)
+        if locked.sha256 is None or path is None or not os.path.isfile(path):
+            return True
+        return get_file_sha256(path) == locked.sha256
+
+    def __init_operations(self) -> bool:
+        mcdr = psi.get_plugin_metadata('mcdreforged')
+        if self.lock.mcdreforged is not None and mcdr is not None and str(mcdr.version) != self.lock.mcdreforged:
+            self.reply(tr('lock.apply.mcdr_mismatch', self.lock.mcdreforged, mcdr.version))
+
+        cache.fetch_plugins(self.lock.plugins.keys())
+        for plugin_id, locked in self.lock.plugins.items():
+            if plugin_id == meta.id or (is_plugin_loaded(plugin_id) and self.__is_up_to_date(plugin_id)):
+                continue
+            if not cache.is_plugin_present(plugin_id):
+                self.reply(tr('lock.apply.plugin_not_found', plugin_id))
+                self.skipped.append(plugin_id)
+                continue
+            plugin = cache.get_plugin_by_id(plugin_id)
+            if plugin is None:
+                self.reply(tr('cache.shard.unavailable', plugin_id))
+                self.skipped.append(plugin_id)
+                continue
+            release = plugin.release.get_release(locked.version)
+            if release is None:
+                self.reply(tr('lock.apply.release_not_found', plugin_id, locked.version))
+                self.skipped.append(plugin_id)
+                continue
+            self.installer.operations.append(InstallPluginOperation(
+                plugin_id,
+                DependencyOperation.UPGRADE if is_plugin_loaded(plugin_id) else DependencyOperation.INSTALL,
+                release,
+                checksum=locked.sha256
+            ))
+
+        self.uninstaller.plugin_ids = [
+            plugin_id for plugin_id in psi.get_plugin_list()
+            if plugin_id not in self.lock.plugins and plugin_id != meta.id
+        ]
+
+        for package, version in self.lock.packages.items():
+            local_version = get_package_version(package)
+            if local_version is None or str(local_version) != version:
+                self.installer.operations.append(InstallPackageOperation(
+                    '{}=={}'.format(package, version),
+                    DependencyOperation.INSTALL if local_version is None else DependencyOperation.UPGRADE
+                ))
+
+        if len(self.installer.operations) == 0 and len(self.uninstaller.plugin_ids) == 0:
+            if len(self.skipped) == 0:
+                self.reply(tr('lock.apply.up_to_date'))
+            return False
+        return True
+
+    def __format_plugins(self, operation: DependencyOperation) -> List[str]:
+        return [
+            '{}@{}'.format(op.name, self.lock.plugins[op.name].version) for op in self.installer.operations
+            if isinstance(op, InstallPluginOperation) and op.operation == operation
+        ]
+
+    def __show_confirm(self):
+        self.reply(tr('lock.apply.title'))
+        lines = [
+            ('lock.apply.install', self.__format_plugins(DependencyOperation.INSTALL)),
+            ('lock.apply.upgrade', self.__format_plugins(DependencyOperation.UPGRADE)),
+            ('lock.apply.uninstall', self.uninstaller.plugin_ids),
+            ('lock.apply.package', [
+                op.name for op in self.installer.operations if isinstance(op, InstallPackageOperation)
+            ]),
+            ('lock.apply.skipped', ['{}@{}'.format(plugin_id, self.lock.plugins[plugin_id].version)
+                                    for plugin_id in self.skipped]),
+        ]
+        for key, names in lines:
+            if len(names) > 0:
+                self.reply(indented(tr(key, ', '.join(names))))
+        estimate = self.installer.format_download_estimate()
+        if estimate is not None:
+            self.reply(estimate)
+        self.reply(tr('install.confirm.footer', CONFIRM_COMMAND_TEXT))
+
+    @new_thread('MPMLockApply')
+    def run(self):
+        # download first, so the server is left untouched if any download fails
+        if not self.installer.download_plugins():
+            self.reply(tr('install.result.failed'))
+            return
+        self.uninstaller.remove()
+        success = self.installer.execute()
+        self.reply(tr('install.operation.reload_mcdr'))
+        psi.refresh_changed_plugins()
+        cache.update_installed_suggestions(force=True)
+        self.reply(tr('install.result.success') if success else tr('install.result.failed'))
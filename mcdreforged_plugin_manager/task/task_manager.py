@@ -23,10 +23,16 @@ class Task(ABC):
 class TaskManager:
     def __init__(self):
         self.pending_task: Optional[Task] = None
+        self.planning_task: Optional[Task] = None
 
     def manage_task(self, task: Task):
-        self.pending_task = task
-        self.pending_task.init()
+        # tasks are initialized in command worker threads, a confirm meanwhile must not run a half-planned task
+        self.pending_task = None
+        self.planning_task = task
+        task.init()
+        if self.planning_task is task:
+            self.pending_task = task
+            self.planning_task = None
 
     def on_confirm(self, source: CommandSource):
         if self.pending_task is None:
@@ -37,6 +43,7 @@ class TaskManager:
 
     def clear_task(self):
         self.pending_task = None
+        self.planning_task = None
 
 
 task_manager = TaskManager()
@@ -7,6 +7,7 @@ from mcdreforged.command.command_source import CommandSource
 
 from mcdreforged_plugin_manager.constants import psi, meta
 from mcdreforged_plugin_manager.storage.cache import cache
+from mcdreforged_plugin_manager.storage.file_index import file_index
 from mcdreforged_plugin_manager.task.task_manager import Task, task_manager
 from mcdreforged_plugin_manager.texts import CONFIRM_COMMAND_TEXT
 from mcdreforged_plugin_manager.util.mcdr_util import unload_plugin
@@ -14,7 +15,9 @@ from mcdreforged_plugin_manager.util.translation_util import tr
 
 
 def get_plugins_depend_on(plugin_id: str) -> Iterable[str]:
-    for other_id in psi.get_plugin_list():
+    plugin_list = psi.get_plugin_list()
+    cache.fetch_plugins(plugin_list)
+    for other_id in plugin_list:
         try:
             other = cache.get_plugin_by_id(other_id)
         except KeyError:
@@ -32,18 +35,26 @@ class PluginUninstaller(Task):
         self.plugin_ids = plugin_ids
         super().__init__()
 
-    @new_thread('MPMUninstall')
-    def run(self):
-        success = True
+    def remove(self):
+        """
+        Unload the plugins and remove their files, without reloading MCDR
+        """
         for plugin_id in self.plugin_ids:
             path = psi.get_plugin_file_path(plugin_id)
             self.reply(tr('uninstall.step.unload_plugin', plugin_id))
             unload_plugin(plugin_id)
             self.reply(tr('uninstall.step.remove_file', path))
             os.remove(path)
+            file_index.forget_install(plugin_id)
+
+    @new_thread('MPMUninstall')
+    def run(self):
+        success = True
+        self.remove()
 
         self.reply(tr('uninstall.step.reload_mcdr'))
         psi.refresh_changed_plugins()
+        cache.update_installed_suggestions()
         if success:
             self.reply(tr('uninstall.result.success'))
         else:
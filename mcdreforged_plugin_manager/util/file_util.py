@@ -1,6 +1,107 @@
+import gzip
+import hashlib
+import lzma
+import os
+import shutil
+import sys
+import time
 import zipfile
+from typing import Optional, TextIO
+
+COMPRESSION_MAGIC = {
+    'gz': b'\x1f\x8b',
+    'xz': b'\xfd7zXZ\x00',
+}
+
+
+class FileLock:
+    """
+    An exclusive lock between processes on a lock file, which is created if absent. Blocks until acquired
+
+    Each acquisition opens the file again, so it's exclusive between threads as well,
+    but an instance must not be entered by multiple threads at the same time
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.__file = None
+
+    def __enter__(self) -> 'FileLock':
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.__file = open(self.path, 'a+b')
+        if sys.platform == 'win32':
+            import msvcrt
+            while True:
+                try:
+                    self.__file.seek(0)
+                    msvcrt.locking(self.__file.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        else:
+            import fcntl
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if sys.platform == 'win32':
+            import msvcrt
+            self.__file.seek(0)
+            msvcrt.locking(self.__file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(self.__file.fileno(), fcntl.LOCK_UN)
+        self.__file.close()
+        self.__file = None
 
 
 def unzip(file: str, path: str):
     with zipfile.ZipFile(file) as zip_file:
         zip_file.extractall(path)
+
+
+def read_zip_member(file: str, name: str) -> bytes:
+    """
+    Read a member of a zip file in memory, locating it from the central directory without extracting anything
+    :raise zipfile.BadZipFile: if the file is not a valid zip file, or the member is corrupted
+    :raise KeyError: if the member doesn't exist
+    """
+    with zipfile.ZipFile(file) as zip_file:
+        return zip_file.read(name)
+
+
+def get_file_sha256(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_compression(path: str) -> Optional[str]:
+    """
+    Detect the compression of a file from its magic number
+    :return: 'gz', 'xz', or None if the file is not compressed
+    """
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    for compression, magic in COMPRESSION_MAGIC.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_text(path: str) -> TextIO:
+    """
+    Open a utf8 text file for reading, which is decompressed while reading if it's compressed
+    """
+    compression = get_compression(path)
+    if compression == 'gz':
+        return gzip.open(path, 'rt', encoding='utf8')
+    if compression == 'xz':
+        return lzma.open(path, 'rt', encoding='utf8')
+    return open(path, 'r', encoding='utf8')
+
+
+def gzip_file(source: str, target: str):
+    with open(source, 'rb') as src, gzip.open(target, 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst)
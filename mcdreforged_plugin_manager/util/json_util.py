@@ -0,0 +1,104 @@
+import json
+import re
+from typing import TextIO, Iterator, Tuple, Any
+
+DECODER = json.JSONDecoder()
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+
+
+class JsonStreamReader:
+    """
+    Decodes json values one at a time from a text stream, keeping only the undecoded part of the stream in memory
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size: int = CHUNK_SIZE) -> bool:
+        """
+        Drop the consumed part of the buffer and read more text
+        :return: False if the stream is exhausted
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespaces and return the next character without consuming it, '' at the end of the stream
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise json.JSONDecodeError('Expecting {!r}'.format(char), self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:
+        """
+        Decode the next value
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # incomplete, read at least as much as buffered, so a large value is decoded in O(log n) attempts
+                if not self.fill(max(self.CHUNK_SIZE, len(self.buffer) - self.pos)):
+                    raise
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                    NUMBER_TAIL.match(self.buffer, end).end() == len(self.buffer) and self.fill():
+                continue  # a number may continue in the next chunk, e.g. '0.' then '1'
+            self.pos = end
+            return value
+
+
+def iter_object_items(stream: TextIO, key: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the items of the object under a top-level key of a json document, decoding one item at a time,
+    so the whole document is never in memory at once. Other top-level values are decoded and dropped
+    :raise KeyError: if the key is absent
+    :raise ValueError: if the document is not valid json
+    """
+    reader = JsonStreamReader(stream)
+    found = False
+    reader.expect('{')
+    while reader.peek() != '}':
+        name = reader.value()
+        reader.expect(':')
+        if name != key:
+            reader.value()
+        else:
+            found = True
+            reader.expect('{')
+            while reader.peek() != '}':
+                item_key = reader.value()
+                reader.expect(':')
+                yield item_key, reader.value()
+                if reader.peek() != ',':
+                    break
+                reader.pos += 1
+            reader.expect('}')
+        if reader.peek() != ',':
+            break
+        reader.pos += 1
+    reader.expect('}')
+    if not found:
+        raise KeyError(key)
@@ -1,6 +1,11 @@
 import importlib
 import re
-from typing import Tuple, Optional
+import shutil
+import subprocess
+import sys
+from typing import Tuple, Optional, List, Dict, Any
+
+from mcdreforged_plugin_manager.config import config
 
 
 def get_package_version(package_name: str) -> Optional[str]:
@@ -15,6 +20,15 @@ def get_package_version(package_name: str) -> Optional[str]:
         return None
 
 
+def parse_plugin_spec(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a plugin spec like 'plugin_id@1.2.0' into the plugin id and the version
+    :return: the plugin id and the version, the version is None if not specified
+    """
+    plugin_id, _, version = text.partition('@')
+    return plugin_id, version if version != '' else None
+
+
 class RequirementParsingError(Exception):
     pass
 
@@ -34,6 +48,26 @@ def parse_python_requirement(line: str) -> Tuple[str, str]:
     return package, requirement
 
 
+def get_pip_process_options(params: List[str]) -> Tuple[List[str], Dict[str, Any]]:
+    """
+    Lower the CPU and IO priority of a pip process according to config.throttle
+    :return: the command and the keyword arguments for subprocess
+    """
+    options: Dict[str, Any] = {}
+    niceness = config.throttle.pip_niceness
+    if sys.platform == 'win32':
+        if niceness > 0:
+            options['creationflags'] = subprocess.BELOW_NORMAL_PRIORITY_CLASS
+        return params, options
+    # prefixed commands instead of preexec_fn, which is unsafe in a threaded process like MCDR
+    if niceness > 0 and shutil.which('nice') is not None:
+        params = ['nice', '-n', str(niceness), *params]
+    if config.throttle.pip_idle_io and shutil.which('ionice') is not None:
+        # the lowest best-effort priority, the idle class could starve pip next to a busy server forever
+        params = ['ionice', '-c', '2', '-n', '7', *params]
+    return params, options
+
+
 if __name__ == '__main__':
     print(parse_python_requirement('mcdreforged>=2.0.1'))
     print(parse_python_requirement('mcdreforged~=2.0.1'))
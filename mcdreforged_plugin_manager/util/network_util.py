@@ -1,11 +1,179 @@
-import requests
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Optional, Tuple, Iterator, Any, Deque
 
 from mcdreforged_plugin_manager.config import config
+from mcdreforged_plugin_manager.util.file_util import FileLock
+from mcdreforged_plugin_manager.util.stats_util import stats
 
+CHUNK_SIZE = 16 * 1024
 
-def download_file(url: str, path: str):
-    data = requests.get(url, timeout=config.timeout, proxies=config.request_proxy)
-    with open(path, 'wb') as f:
-        for chunk in data.iter_content():
-            if chunk is not None:
-                f.write(chunk)
+
+class TokenBucket:
+    """
+    A token bucket rate limiter that can be shared between threads. A consumer may overdraw the bucket,
+    and then sleeps until the debt is paid back, so large and small consumers get the same average rate
+    """
+    def __init__(self, rate: Optional[int], capacity: Optional[int] = None):
+        """
+        :param rate: tokens (bytes) added per second, None or 0 for unlimited
+        :param capacity: the maximum burst, one second of tokens by default
+        """
+        self.rate = rate if rate else None
+        self.capacity = capacity if capacity is not None else max(rate or 0, CHUNK_SIZE)
+        self.__tokens = float(self.capacity)
+        self.__last = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def consume(self, amount: int):
+        if self.rate is None:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.capacity, self.__tokens + (now - self.__last) * self.rate)
+            self.__last = now
+            self.__tokens -= amount
+            delay = -self.__tokens / self.rate if self.__tokens < 0 else 0
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ThroughputMeter:
+    """
+    The throughput of the recent plugin asset downloads, to estimate how long downloading the assets of a plan takes
+    """
+    def __init__(self, size: int = 20):
+        """
+        :param size: amount of the recent downloads kept
+        """
+        self.__samples: Deque[Tuple[int, float]] = deque(maxlen=size)  # (size, duration)
+        self.__lock = threading.Lock()
+
+    def record(self, size: int, duration: float):
+        if size > 0 and duration > 0:
+            with self.__lock:
+                self.__samples.append((size, duration))
+
+    def get_throughput(self) -> Optional[float]:
+        """
+        :return: the speed of a single download (unit: byte/s), None if nothing is downloaded yet
+        """
+        with self.__lock:
+            samples = list(self.__samples)
+        if len(samples) == 0:
+            return None
+        # weighted by size, so the latency of tiny files doesn't dominate
+        return sum(size for size, _ in samples) / sum(duration for _, duration in samples)
+
+
+throughput = ThroughputMeter()
+
+
+@functools.lru_cache(None)
+def get_throttle() -> Tuple[TokenBucket, threading.BoundedSemaphore]:
+    """
+    :return: the bandwidth limit and the connection limit shared by all downloads, created on first download
+    """
+    return (
+        TokenBucket(config.throttle.bandwidth_limit * 1024 if config.throttle.bandwidth_limit else None),
+        threading.BoundedSemaphore(max(1, config.throttle.max_connections))
+    )
+
+
+def iter_raw_content(response) -> Iterator[bytes]:
+    """
+    Iterate the response body as transferred, without decoding the content encoding
+    Errors are translated into requests exceptions like Response.iter_content does
+    """
+    import requests
+    import urllib3
+    try:
+        yield from response.raw.stream(CHUNK_SIZE, decode_content=False)
+    except urllib3.exceptions.ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except urllib3.exceptions.ReadTimeoutError as e:
+        raise requests.exceptions.ConnectionError(e)
+
+
+def download_shared_file(url: str, shared_path: str, path: str, lock_path: str, record: bool = False) -> int:
+    """
+    Copy a file from the shared cache directory to the path, downloading it into the directory first if absent,
+    so MCDR instances on the same host download each file only once
+    :param lock_path: the lock file guarding the shared file between processes
+    :param record: whether the download is measured by the throughput meter, see download_file
+    :return: the size of the downloaded file, 0 if the shared file is reused
+    """
+    size = 0
+    with FileLock(lock_path):
+        if not os.path.isfile(shared_path):
+            os.makedirs(os.path.dirname(shared_path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix='.temp', dir=os.path.dirname(shared_path))
+            os.close(fd)
+            try:
+                size = download_file(url, temp_path, record=record)
+            except Exception:
+                os.remove(temp_path)
+                raise
+            os.replace(temp_path, shared_path)
+    shutil.copyfile(shared_path, path)
+    return size
+
+
+def download_file(url: str, path: str, rate_limit: Optional[int] = None, keep_encoding: bool = False,
+                  record: bool = False) -> int:
+    """
+    Download a file, at most config.throttle.max_connections at the same time and within the shared bandwidth limit
+    :param rate_limit: an extra speed limit of this download (unit: byte/s), None for unlimited
+    :param keep_encoding: ask for gzip transfer and store the body as transferred, so it may be gzip compressed
+    :param record: whether the download is measured by the throughput meter. Only for unthrottled plugin assets,
+    which the meter estimates, not e.g. the catalogue or the rate limited prefetch
+    :return: the size of the downloaded file
+    """
+    import requests
+    bandwidth, connections = get_throttle()
+    bucket = TokenBucket(rate_limit, CHUNK_SIZE)
+    headers = {'Accept-Encoding': 'gzip'} if keep_encoding else None
+    with connections, stats.timer('download'):
+        start = time.monotonic()
+        try:
+            data = requests.get(url, timeout=config.timeout, proxies=config.request_proxy, stream=True,
+                                headers=headers)
+            data.raise_for_status()
+            downloaded = 0
+            with open(path, 'wb') as f:
+                for chunk in iter_raw_content(data) if keep_encoding else data.iter_content(CHUNK_SIZE):
+                    if chunk is not None:
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        bandwidth.consume(len(chunk))
+                        bucket.consume(len(chunk))
+        except requests.RequestException:
+            stats.increase('download.failures')
+            raise
+        stats.increase('download.bytes', downloaded)
+        if record:
+            throughput.record(downloaded, time.monotonic() - start)
+    return downloaded
+
+
+def get_json(url: str) -> Any:
+    """
+    Fetch and decode a small json document, within the same connection limit and bandwidth limit as downloads
+    """
+    import requests
+    bandwidth, connections = get_throttle()
+    with connections, stats.timer('download'):
+        try:
+            response = requests.get(url, timeout=config.timeout, proxies=config.request_proxy)
+            response.raise_for_status()
+        except requests.RequestException:
+            stats.increase('download.failures')
+            raise
+        bandwidth.consume(len(response.content))
+        stats.increase('download.bytes', len(response.content))
+    return response.json()
@@ -0,0 +1,171 @@
+import functools
+import json
+import math
+import time
+from collections import deque
+from threading import Lock
+from typing import Dict, Optional, Callable, Any
+
+from mcdreforged_plugin_manager.config import config
+
+
+class Histogram:
+    """
+    Record count, sum, min, max and a bounded window of recent samples for percentiles
+    """
+    def __init__(self, window: int = 256):
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.samples = deque(maxlen=window)
+
+    def record(self, value: float):
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.samples.append(value)
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count if self.count != 0 else 0.0
+
+    def percentile(self, percent: float) -> float:
+        """
+        :param percent: should be in range [0, 100]
+        """
+        if len(self.samples) == 0:
+            return 0.0
+        samples = sorted(self.samples)
+        index = max(0, math.ceil(len(samples) * percent / 100) - 1)
+        return samples[index]
+
+    def serialize(self) -> dict:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'average': self.average,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class _Timer:
+    def __init__(self, stats: 'Stats', name: str):
+        self.stats = stats
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stats.record(self.name, time.perf_counter() - self.start)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class Stats:
+    """
+    Counters and histograms of the hot paths. When disabled, every operation returns immediately
+    """
+    def __init__(self, enabled: Optional[bool] = None):
+        """
+        :param enabled: whether to record, follow config.stats.enabled if not specified
+        """
+        self.__enabled = enabled
+        self.since = time.time()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.__lock = Lock()
+
+    @property
+    def enabled(self) -> bool:
+        if self.__enabled is None:
+            self.__enabled = config.stats.enabled
+        return self.__enabled
+
+    @enabled.setter
+    def enabled(self, value: bool):
+        self.__enabled = value
+
+    def increase(self, name: str, amount: float = 1):
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, name: str, value: float):
+        if not self.enabled:
+            return
+        with self.__lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(value)
+
+    def timer(self, name: str):
+        """
+        A context manager that records the duration (unit: second) of the block into the histogram
+        """
+        if not self.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, name)
+
+    def timed(self, name: str):
+        """
+        A decorator that records the duration (unit: second) of each call into the histogram
+        """
+        def wrapper(func: Callable):
+            @functools.wraps(func)
+            def wrap(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+            return wrap
+        return wrapper
+
+    def reset(self):
+        with self.__lock:
+            self.since = time.time()
+            self.counters.clear()
+            self.histograms.clear()
+
+    def serialize(self) -> Dict[str, Any]:
+        with self.__lock:
+            return {
+                'since': self.since,
+                'counters': dict(self.counters),
+                'histograms': {name: histogram.serialize() for name, histogram in self.histograms.items()},
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.serialize(), indent=4)
+
+    def summary(self) -> str:
+        """
+        A one-line summary of all counters and histograms, used in the periodic log
+        """
+        data = self.serialize()
+        items = ['{}={}'.format(name, round(value, 2)) for name, value in data['counters'].items()]
+        items += ['{}={}x{}ms'.format(name, histogram['count'], round(histogram['average'] * 1000, 2))
+                  for name, histogram in data['histograms'].items()]
+        return ', '.join(items)
+
+
+stats = Stats()
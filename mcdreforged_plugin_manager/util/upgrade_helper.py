@@ -12,7 +12,9 @@ from mcdreforged_plugin_manager.util.translation_util import tr
 
 
 def get_all_non_latest_plugins() -> Iterator[Tuple[str, Version, Version]]:
-    for plugin_id in psi.get_plugin_list():
+    plugin_list = psi.get_plugin_list()
+    cache.fetch_plugins(plugin_list)
+    for plugin_id in plugin_list:
         plugin = cache.get_plugin_by_id(plugin_id)
         if plugin is None:
             continue
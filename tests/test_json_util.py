@@ -0,0 +1,54 @@
+import io
+import json
+import unittest
+
+from mcdreforged_plugin_manager.util.json_util import iter_object_items
+
+
+class ChunkedStream(io.StringIO):
+    """
+    A text stream returning at most chunk_size characters per read, like a slow file or network stream
+    """
+    def __init__(self, text: str, chunk_size: int):
+        super().__init__(text)
+        self.chunk_size = chunk_size
+
+    def read(self, size: int = -1) -> str:
+        return super().read(self.chunk_size if size < 0 else min(size, self.chunk_size))
+
+
+class IterObjectItemsTest(unittest.TestCase):
+    DOCUMENT = json.dumps({
+        'timestamp': 1700000000,
+        'plugins': {
+            'k': 0.1,
+            'negative': -12.5e+10,
+            'exponent': 1E-3,
+            'integer': 1234567,
+            'zero': 0,
+            'flags': [True, False, None],
+            'nested': {'version': '1.2.3', 'downloads': 42.0},
+        },
+        'authors': {'amount': 3},
+    })
+
+    def test_every_chunk_size(self):
+        expected = list(json.loads(self.DOCUMENT)['plugins'].items())
+        for chunk_size in range(1, len(self.DOCUMENT) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                items = list(iter_object_items(ChunkedStream(self.DOCUMENT, chunk_size), 'plugins'))
+                self.assertEqual(expected, items)
+
+    def test_number_split_after_dot(self):
+        document = '{"plugins": {"k": 0.1}}'
+        for chunk_size in range(1, len(document) + 1):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual([('k', 0.1)], list(iter_object_items(ChunkedStream(document, chunk_size), 'plugins')))
+
+    def test_missing_key(self):
+        with self.assertRaises(KeyError):
+            list(iter_object_items(ChunkedStream('{"authors": {}}', 4), 'plugins'))
+
+
+if __name__ == '__main__':
+    unittest.main()